@@ -0,0 +1,244 @@
+import hashlib
+import math
+import os
+import re
+from collections import Counter
+
+from agents.telemetry import record_prompt_budget
+
+# Context budgeting for the writer, SEO and humanizer prompts
+PROMPT_COMPACTION = os.getenv("PROMPT_COMPACTION", "true").lower() in ("true", "1", "yes")
+
+# Tokens of injected material (research notes + article) each stage may send
+STAGE_CONTEXT_BUDGETS = {
+    # Matches the research call's 10240-token cap, so by default the writer only loses duplicates
+    "writer": int(os.getenv("WRITER_CONTEXT_TOKENS", "10240")),
+    "seo": int(os.getenv("SEO_CONTEXT_TOKENS", "12000")),
+    "humanizer": int(os.getenv("HUMANIZER_CONTEXT_TOKENS", "6000")),
+}
+# Research slice each concurrently drafted section gets in sectioned writer mode
+SECTION_CONTEXT_TOKENS = int(os.getenv("WRITER_SECTION_CONTEXT_TOKENS", "1200"))
+# Research the humanizer keeps even when the article eats most of its budget
+MIN_RESEARCH_TOKENS = int(os.getenv("MIN_RESEARCH_TOKENS", "400"))
+MAX_PASSAGE_TOKENS = 120
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_WORD_RE = re.compile(r"[a-z0-9][a-z0-9'\-]+")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+_CITATION_RE = re.compile(r"\[\d+\]")
+_BLANK_RUN_RE = re.compile(r"\n{3,}")
+_TRAILING_SPACE_RE = re.compile(r"[ \t]+\n")
+_WHITESPACE_RE = re.compile(r"\s+")
+_LIST_ITEM_RE = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+")
+_HEADING_RE = re.compile(r"^#{1,6}\s+(.*)")
+
+STOPWORDS = frozenset(
+    "the and for are but not you your with this that from have has had was were will would can could "
+    "should their there they them what when where which while who how why into about over under than "
+    "then also just more most some such only other each many much very our out its it's been being".split()
+)
+
+
+def estimate_tokens(text: str) -> int:
+    # BPE-ish estimate: one token per word or symbol, plus one per 8 characters of long words
+    return sum(1 + len(piece) // 8 for piece in _TOKEN_RE.findall(text))
+
+
+def squeeze_whitespace(text: str) -> str:
+    text = _TRAILING_SPACE_RE.sub("\n", text)
+    return _BLANK_RUN_RE.sub("\n\n", text).strip()
+
+
+def _terms(text: str) -> list:
+    return [word for word in _WORD_RE.findall(text.lower()) if word not in STOPWORDS]
+
+
+def split_passages(research: str) -> list:
+    # Paragraphs and list items become passages; overlong ones are cut at sentence boundaries
+    passages = []
+    heading = ""
+    block = []
+
+    def flush():
+        text = " ".join(block).strip()
+        block.clear()
+        if not text:
+            return
+        if estimate_tokens(text) <= MAX_PASSAGE_TOKENS:
+            passages.append({"text": text, "heading": heading})
+            return
+        chunk = []
+        for sentence in _SENTENCE_RE.split(text):
+            chunk.append(sentence)
+            if estimate_tokens(" ".join(chunk)) >= MAX_PASSAGE_TOKENS:
+                passages.append({"text": " ".join(chunk), "heading": heading})
+                chunk = []
+        if chunk:
+            passages.append({"text": " ".join(chunk), "heading": heading})
+
+    for line in research.splitlines():
+        stripped = line.strip()
+        heading_match = _HEADING_RE.match(stripped)
+        if not stripped or heading_match:
+            flush()
+            if heading_match:
+                heading = heading_match.group(1)
+            continue
+        if _LIST_ITEM_RE.match(line):
+            flush()
+        block.append(stripped)
+    flush()
+    return passages
+
+
+def dedupe_passages(passages: list) -> list:
+    # Perplexity often restates the same finding; keep the first copy of each normalized passage
+    seen = set()
+    unique = []
+    for passage in passages:
+        normalized = _WHITESPACE_RE.sub(" ", _CITATION_RE.sub("", passage["text"])).strip().lower()
+        digest = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+        if digest in seen:
+            continue
+        seen.add(digest)
+        unique.append(passage)
+    return unique
+
+
+def rank_passages(passages: list, query: str) -> list:
+    # TF-IDF cosine between the query and each passage (heading words count toward the passage)
+    documents = [Counter(_terms(p["heading"] + " " + p["text"])) for p in passages]
+    document_frequency = Counter()
+    for terms in documents:
+        document_frequency.update(terms.keys())
+    total = len(documents)
+
+    def idf(term: str) -> float:
+        return math.log((1 + total) / (1 + document_frequency[term])) + 1
+
+    query_vector = {term: count * idf(term) for term, count in Counter(_terms(query)).items()}
+    query_norm = math.sqrt(sum(weight * weight for weight in query_vector.values())) or 1.0
+
+    scores = []
+    for index, terms in enumerate(documents):
+        vector = {term: count * idf(term) for term, count in terms.items()}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        dot = sum(weight * vector.get(term, 0.0) for term, weight in query_vector.items())
+        score = dot / (norm * query_norm)
+        # Stats and figures are what the prompts ask the model to cite
+        if any(ch.isdigit() for ch in passages[index]["text"]):
+            score *= 1.1
+        scores.append(score)
+    # Highest score first; ties keep document order
+    return sorted(range(total), key=lambda i: (-scores[i], i))
+
+
+def join_passages(passages: list) -> str:
+    # Re-emit each research heading once, above the first passage kept from it
+    parts = []
+    heading = ""
+    for passage in passages:
+        if passage["heading"] and passage["heading"] != heading:
+            heading = passage["heading"]
+            parts.append(f"### {heading}")
+        parts.append(passage["text"])
+    return "\n\n".join(parts)
+
+
+def select_research(research: str, queries: list, budget: int) -> str:
+    # Round-robin over the queries (one per article section) so every section gets its best passages
+    passages = dedupe_passages(split_passages(research))
+    if sum(estimate_tokens(p["text"]) for p in passages) <= budget:
+        return join_passages(passages)
+
+    rankings = [rank_passages(passages, query) for query in queries if query.strip()] or [list(range(len(passages)))]
+    chosen = set()
+    used = 0
+    for depth in range(len(passages)):
+        for ranking in rankings:
+            index = ranking[depth]
+            if index in chosen:
+                continue
+            cost = estimate_tokens(passages[index]["text"])
+            if used + cost > budget:
+                continue
+            chosen.add(index)
+            used += cost
+        if used >= budget:
+            break
+    return join_passages([passages[index] for index in sorted(chosen)])
+
+
+def brief_query(user_input: dict) -> str:
+    fields = ("topic", "subtopic", "draft_title", "keywords", "audience_pain_points",
+              "industry_vertical", "geographic_focus", "content_direction", "target_audience")
+    return " ".join(str(user_input.get(field) or "") for field in fields)
+
+
+def article_sections(article: str) -> list:
+    # H2 sections of an article, each as "heading + body" text
+    sections = []
+    current = []
+    for line in article.splitlines():
+        if line.startswith("## ") and current:
+            sections.append("\n".join(current))
+            current = []
+        current.append(line)
+    if current:
+        sections.append("\n".join(current))
+    return sections
+
+
+def compact_writer_context(user_input: dict, research: str) -> str:
+    # The legacy writer prompt pasted the full research four times
+    original = estimate_tokens(research) * 4
+    if not PROMPT_COMPACTION:
+        record_prompt_budget("writer", original, estimate_tokens(research))
+        return research
+    notes = select_research(research, [brief_query(user_input)], STAGE_CONTEXT_BUDGETS["writer"])
+    record_prompt_budget("writer", original, estimate_tokens(notes))
+    return notes
+
+
+def section_research(user_input: dict, research: str, section_query: str) -> str:
+    # Research slice for a prompt that covers one section of the article
+    if not PROMPT_COMPACTION:
+        return research
+    keywords = str(user_input.get("keywords") or "")
+    return select_research(research, [section_query + " " + keywords], SECTION_CONTEXT_TOKENS)
+
+
+def compact_section_context(user_input: dict, research: str, section_query: str) -> str:
+    # Counted against the writer stage; the legacy single prompt had no per-section copies
+    notes = section_research(user_input, research, section_query)
+    record_prompt_budget("writer", 0, estimate_tokens(notes))
+    return notes
+
+
+def compact_seo_context(draft_article: str) -> str:
+    original = estimate_tokens(draft_article)
+    if not PROMPT_COMPACTION:
+        record_prompt_budget("seo", original, original)
+        return draft_article
+    draft = squeeze_whitespace(draft_article)
+    sent = estimate_tokens(draft)
+    if sent > STAGE_CONTEXT_BUDGETS["seo"]:
+        # The draft is rewritten in full, so it is never cut; only flag the overrun
+        print(f"⚠️ SEO draft is ~{sent} tokens, over the {STAGE_CONTEXT_BUDGETS['seo']} token budget")
+    record_prompt_budget("seo", original, sent)
+    return draft
+
+
+def compact_humanizer_context(user_input: dict, seo_article: str, research: str) -> tuple:
+    original = estimate_tokens(seo_article) + estimate_tokens(research)
+    if not PROMPT_COMPACTION:
+        record_prompt_budget("humanizer", original, original)
+        return seo_article, research
+    article = squeeze_whitespace(seo_article)
+    article_tokens = estimate_tokens(article)
+    research_budget = max(MIN_RESEARCH_TOKENS, STAGE_CONTEXT_BUDGETS["humanizer"] - article_tokens)
+    base_query = brief_query(user_input)
+    queries = [base_query + " " + section for section in article_sections(article)] or [base_query]
+    notes = select_research(research, queries, research_budget)
+    record_prompt_budget("humanizer", original, article_tokens + estimate_tokens(notes))
+    return article, notes
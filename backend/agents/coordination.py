@@ -0,0 +1,382 @@
+import asyncio
+import json
+import os
+import socket
+import time
+import weakref
+from urllib.parse import unquote, urlparse
+
+# Shared state for running several workers: job registry, SSE event logs and provider rate limits.
+# "local" keeps everything in this process; a redis:// URL shares it through any Redis-protocol server.
+COORDINATION_URL = os.getenv("COORDINATION_URL", "local")
+COORDINATION_PREFIX = os.getenv("COORDINATION_PREFIX", "autoauthor")
+COORDINATION_POOL_SIZE = int(os.getenv("COORDINATION_POOL_SIZE", "16"))
+COORDINATION_TIMEOUT = float(os.getenv("COORDINATION_TIMEOUT", "5"))
+
+# Per-job event logs kept for reconnecting SSE clients
+EVENT_BUFFER_SIZE = int(os.getenv("EVENT_BUFFER_SIZE", "4096"))
+# How long a finished job's events stay available for late reconnects
+EVENT_RETENTION = float(os.getenv("EVENT_RETENTION", "300"))
+# Shared job snapshots outlive the run so any worker can serve its download
+JOB_REGISTRY_TTL = int(os.getenv("JOB_REGISTRY_TTL", str(24 * 3600)))
+# A worker that stops refreshing its key is considered dead and its running jobs interrupted
+WORKER_TTL = int(os.getenv("WORKER_TTL", "30"))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class CoordinationError(Exception):
+    pass
+
+
+class LocalCoordinator:
+    # Single-process backend: the previous in-memory behaviour
+    local = True
+
+    def __init__(self):
+        self.logs = {}
+
+    def publish_job(self, job: dict):
+        pass
+
+    async def get_job(self, job_id: str):
+        return None
+
+    async def live_jobs(self, job_ids: list) -> set:
+        # Nothing else can be running them, so every unfinished job in the store is orphaned
+        return set()
+
+    async def touch_worker(self):
+        pass
+
+    async def reserve_token(self, provider: str, bucket) -> float:
+        return bucket.reserve()
+
+    async def reset_events(self, job_id: str, run: int = 0):
+        now = time.monotonic()
+        for key, log in list(self.logs.items()):
+            if log["done"] and now - log["finished_at"] > EVENT_RETENTION:
+                del self.logs[key]
+        self.logs[job_id] = {
+            "run": run,
+            "events": [],
+            "first": 1,
+            "seq": 0,
+            "done": False,
+            "finished_at": None,
+            "changed": asyncio.Event(),
+        }
+
+    def _notify(self, log: dict):
+        # Wake every reader, then hand out a fresh event for the next wait
+        log["changed"].set()
+        log["changed"] = asyncio.Event()
+
+    async def append_event(self, job_id: str, seq: int, payload: dict):
+        log = self.logs.get(job_id)
+        if log is None or log["done"]:
+            return
+        log["events"].append(payload)
+        log["seq"] = seq
+        if len(log["events"]) > EVENT_BUFFER_SIZE + EVENT_BUFFER_SIZE // 4:
+            # Ring buffer: drop from the front in chunks so trimming stays cheap
+            drop = len(log["events"]) - EVENT_BUFFER_SIZE
+            del log["events"][:drop]
+            log["first"] += drop
+        self._notify(log)
+
+    async def end_events(self, job_id: str, seq: int):
+        log = self.logs.get(job_id)
+        if log is None or log["done"]:
+            return
+        log["done"] = True
+        log["finished_at"] = time.monotonic()
+        self._notify(log)
+
+    async def has_events(self, job_id: str) -> bool:
+        return job_id in self.logs
+
+    async def event_run(self, job_id: str):
+        log = self.logs.get(job_id)
+        return log["run"] if log is not None else None
+
+    async def read_events(self, job_id: str, after: int, timeout: float):
+        # Returns ([(seq, payload)], done), waiting up to timeout for new events; None if the log is gone
+        log = self.logs.get(job_id)
+        if log is None:
+            return None
+        if log["seq"] <= after and not log["done"]:
+            changed = log["changed"]
+            try:
+                await asyncio.wait_for(changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                return [], False
+        start = max(after + 1, log["first"])
+        events = [(seq, log["events"][seq - log["first"]]) for seq in range(start, log["seq"] + 1)]
+        return events, log["done"]
+
+    async def close(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": "local", "worker_id": WORKER_ID, "event_logs": len(self.logs)}
+
+
+def _encode(args) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, bytes):
+            data = arg
+        else:
+            data = str(arg).encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+async def _read_reply(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Coordination server closed the connection")
+    prefix, rest = line[:1], line[1:-2]
+    if prefix == b"+":
+        return rest.decode("utf-8")
+    if prefix == b"-":
+        return CoordinationError(rest.decode("utf-8"))
+    if prefix == b":":
+        return int(rest)
+    if prefix == b"$":
+        length = int(rest)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2].decode("utf-8")
+    if prefix == b"*":
+        length = int(rest)
+        if length < 0:
+            return None
+        return [await _read_reply(reader) for _ in range(length)]
+    raise CoordinationError(f"Unexpected reply from coordination server: {line[:40]!r}")
+
+
+class RedisCoordinator:
+    local = False
+
+    def __init__(self, url: str):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.display_url = f"redis://{self.host}:{self.port}/{self.db}"
+        # Connections belong to the event loop that opened them (run_sync uses throwaway loops)
+        self._idle = weakref.WeakKeyDictionary()
+        self._registry_lock = weakref.WeakKeyDictionary()
+        self._tasks = set()
+        self._stats = {"commands": 0, "errors": 0, "connections": 0, "rate_limit_fallbacks": 0}
+
+    def _key(self, *parts) -> str:
+        return ":".join((COORDINATION_PREFIX, *parts))
+
+    async def _open(self):
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), COORDINATION_TIMEOUT)
+        self._stats["connections"] += 1
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        for command in setup:
+            writer.write(_encode(command))
+            await writer.drain()
+            reply = await asyncio.wait_for(_read_reply(reader), COORDINATION_TIMEOUT)
+            if isinstance(reply, CoordinationError):
+                writer.close()
+                raise reply
+        return reader, writer
+
+    async def pipeline(self, *commands, timeout: float = None) -> list:
+        # Send several commands in one write and read their replies in order
+        idle = self._idle.setdefault(asyncio.get_running_loop(), [])
+        for attempt in range(2):
+            pooled = bool(idle)
+            connection = idle.pop() if pooled else await self._open()
+            reader, writer = connection
+            try:
+                writer.write(b"".join(_encode(command) for command in commands))
+                await writer.drain()
+                replies = []
+                for _ in commands:
+                    replies.append(await asyncio.wait_for(_read_reply(reader), timeout or COORDINATION_TIMEOUT))
+                break
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                # An idle connection may have been dropped by a server restart; retry once on a fresh one
+                if pooled and attempt == 0:
+                    continue
+                self._stats["errors"] += 1
+                raise
+            except BaseException:
+                # A half-read reply would desync the connection; never reuse it
+                writer.close()
+                self._stats["errors"] += 1
+                raise
+        if len(idle) < COORDINATION_POOL_SIZE:
+            idle.append(connection)
+        else:
+            writer.close()
+        self._stats["commands"] += len(commands)
+        for reply in replies:
+            if isinstance(reply, CoordinationError):
+                self._stats["errors"] += 1
+                raise reply
+        return replies
+
+    async def execute(self, *command, timeout: float = None):
+        return (await self.pipeline(command, timeout=timeout))[0]
+
+    def publish_job(self, job: dict):
+        # Called from synchronous job updates; writes are queued on the loop in update order
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        snapshot = json.dumps({**job, "worker": WORKER_ID}, default=str)
+        lock = self._registry_lock.setdefault(loop, asyncio.Lock())
+
+        async def write():
+            async with lock:
+                try:
+                    await self.execute("SET", self._key("job", job["id"]), snapshot, "EX", JOB_REGISTRY_TTL)
+                except (OSError, asyncio.TimeoutError, CoordinationError) as e:
+                    print(f"⚠️ Could not publish job {job['id']} to the coordination server: {e}")
+
+        task = loop.create_task(write())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def get_job(self, job_id: str):
+        value = await self.execute("GET", self._key("job", job_id))
+        if value is None:
+            return None
+        job = json.loads(value)
+        job.pop("worker", None)
+        return job
+
+    async def live_jobs(self, job_ids: list) -> set:
+        # Unfinished jobs whose owning worker is still refreshing its heartbeat key
+        live = set()
+        for job_id in job_ids:
+            value = await self.execute("GET", self._key("job", job_id))
+            if value is None:
+                continue
+            worker = json.loads(value).get("worker")
+            if worker and worker != WORKER_ID and await self.execute("EXISTS", self._key("worker", worker)):
+                live.add(job_id)
+        return live
+
+    async def touch_worker(self):
+        await self.execute("SET", self._key("worker", WORKER_ID), "1", "EX", WORKER_TTL)
+
+    async def reserve_token(self, provider: str, bucket) -> float:
+        # GCRA: one shared "theoretical arrival time" per provider, advanced atomically with INCRBYFLOAT.
+        # Restarting an idle bucket can race and let one extra call through, which is acceptable here.
+        interval = 1.0 / bucket.rate
+        tolerance = (bucket.burst - 1) * interval
+        key = self._key("rate", provider)
+        ttl = int(bucket.burst * interval) + 60
+        try:
+            now = time.time()
+            tat, _ = await self.pipeline(("INCRBYFLOAT", key, interval), ("EXPIRE", key, ttl))
+            previous = float(tat) - interval
+            if previous < now:
+                # The bucket has been idle: restart the schedule from now
+                await self.execute("SET", key, repr(now + interval), "EX", ttl)
+                return 0.0
+            return max(0.0, previous - now - tolerance)
+        except (OSError, asyncio.TimeoutError, CoordinationError) as e:
+            # Keep calling providers on the local bucket rather than failing the job
+            self._stats["rate_limit_fallbacks"] += 1
+            print(f"⚠️ Shared rate limit unavailable for {provider} ({e}), using the local bucket")
+            return bucket.reserve()
+
+    async def reset_events(self, job_id: str, run: int = 0):
+        await self.pipeline(
+            ("DEL", self._key("events", job_id)),
+            ("SET", self._key("run", job_id), run, "EX", JOB_REGISTRY_TTL),
+        )
+
+    async def append_event(self, job_id: str, seq: int, payload: dict):
+        key = self._key("events", job_id)
+        await self.pipeline(
+            ("XADD", key, "MAXLEN", "~", EVENT_BUFFER_SIZE, f"{seq}-0", "event", json.dumps(payload)),
+            ("EXPIRE", key, JOB_REGISTRY_TTL),
+        )
+
+    async def end_events(self, job_id: str, seq: int):
+        key = self._key("events", job_id)
+        await self.pipeline(
+            ("XADD", key, f"{seq}-0", "end", "1"),
+            ("EXPIRE", key, int(EVENT_RETENTION)),
+            ("EXPIRE", self._key("run", job_id), int(EVENT_RETENTION)),
+        )
+
+    async def has_events(self, job_id: str) -> bool:
+        return bool(await self.execute("EXISTS", self._key("events", job_id)))
+
+    async def event_run(self, job_id: str):
+        value = await self.execute("GET", self._key("run", job_id))
+        return int(value) if value is not None else None
+
+    async def read_events(self, job_id: str, after: int, timeout: float):
+        key = self._key("events", job_id)
+        reply = await self.execute(
+            "XREAD", "COUNT", 512, "BLOCK", int(timeout * 1000), "STREAMS", key, f"{after}-0",
+            timeout=timeout + COORDINATION_TIMEOUT,
+        )
+        if reply is None:
+            return ([], False) if await self.has_events(job_id) else None
+        events = []
+        done = False
+        for entry_id, fields in reply[0][1]:
+            values = dict(zip(fields[::2], fields[1::2]))
+            if "end" in values:
+                done = True
+                continue
+            events.append((int(entry_id.split("-")[0]), json.loads(values["event"])))
+        return events, done
+
+    async def close(self):
+        for connections in list(self._idle.values()):
+            for _, writer in connections:
+                writer.close()
+            connections.clear()
+
+    def stats(self) -> dict:
+        return {"backend": "redis", "url": self.display_url, "worker_id": WORKER_ID, **self._stats}
+
+
+_coordinator = None
+
+
+def get_coordinator():
+    global _coordinator
+    if _coordinator is None:
+        if COORDINATION_URL.startswith(("redis://", "rediss://")):
+            if COORDINATION_URL.startswith("rediss://"):
+                raise CoordinationError("TLS (rediss://) is not supported; use a local TLS proxy")
+            _coordinator = RedisCoordinator(COORDINATION_URL)
+        else:
+            _coordinator = LocalCoordinator()
+    return _coordinator
+
+
+async def worker_heartbeat_loop():
+    # Keeps this worker's key alive so other workers do not mark its jobs interrupted
+    coordinator = get_coordinator()
+    if coordinator.local:
+        return
+    while True:
+        try:
+            await coordinator.touch_worker()
+        except (OSError, asyncio.TimeoutError, CoordinationError) as e:
+            print(f"⚠️ Worker heartbeat failed: {e}")
+        await asyncio.sleep(max(1.0, WORKER_TTL / 3))
@@ -0,0 +1,184 @@
+import asyncio
+import json
+import os
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+import aiohttp
+
+from agents.resilience import call_with_retries, get_resilience_stats, get_timeout
+from agents.telemetry import extract_usage, record_call
+
+# Connection pool sizing: total sockets, and sockets kept open per provider host
+POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "200"))
+POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "50"))
+KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "60"))
+
+# Maximum in-flight calls per provider, shared by every job in the process
+PROVIDER_CONCURRENCY = {
+    "perplexity": int(os.getenv("PERPLEXITY_CONCURRENCY", "4")),
+    "anthropic": int(os.getenv("ANTHROPIC_CONCURRENCY", "4")),
+    "deepseek": int(os.getenv("DEEPSEEK_CONCURRENCY", "8")),
+}
+
+# One pooled session per event loop (the sync wrappers run their own loop)
+_sessions = {}
+_semaphores = {}
+_in_flight = {provider: 0 for provider in PROVIDER_CONCURRENCY}
+
+
+class ProviderError(Exception):
+    def __init__(self, status: int, text: str, headers: dict = None):
+        super().__init__(f"API request failed with status code {status}: {text}")
+        self.status = status
+        self.text = text
+        self.headers = headers or {}
+
+
+def get_session() -> aiohttp.ClientSession:
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=POOL_LIMIT,
+            limit_per_host=POOL_LIMIT_PER_HOST,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300,
+        )
+        session = aiohttp.ClientSession(connector=connector)
+        _sessions[loop] = session
+    return session
+
+
+async def close_session():
+    loop = asyncio.get_running_loop()
+    session = _sessions.pop(loop, None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+@asynccontextmanager
+async def provider_slot(provider: str):
+    if provider not in PROVIDER_CONCURRENCY:
+        yield
+        return
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get((loop, provider))
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(PROVIDER_CONCURRENCY[provider])
+        _semaphores[(loop, provider)] = semaphore
+    async with semaphore:
+        _in_flight[provider] += 1
+        try:
+            yield
+        finally:
+            _in_flight[provider] -= 1
+
+
+def get_provider_stats() -> dict:
+    resilience = get_resilience_stats()
+    return {
+        provider: {"in_flight": _in_flight[provider], "limit": limit, **resilience.get(provider, {})}
+        for provider, limit in PROVIDER_CONCURRENCY.items()
+    }
+
+
+async def post_json(url: str, headers: dict, payload: dict, provider: str = None, stage: str = None) -> dict:
+    session = get_session()
+    timeout = get_timeout(provider) if provider else None
+    body = json.dumps(payload).encode("utf-8")
+    call_stats = {"retries": 0}
+    started = time.perf_counter()
+
+    async def attempt():
+        async with provider_slot(provider):
+            async with session.post(url, headers=headers, data=body, timeout=timeout) as response:
+                call_stats["ttfb"] = time.perf_counter() - started
+                raw = await response.read()
+                call_stats["response_bytes"] = len(raw)
+                if response.status >= 400:
+                    raise ProviderError(response.status, raw.decode("utf-8", "replace"), dict(response.headers))
+                return json.loads(raw)
+
+    status = "error"
+    data = {}
+    try:
+        data = await call_with_retries(provider, attempt, call_stats)
+        status = "ok"
+        return data
+    finally:
+        record_call(
+            stage, provider, time.perf_counter() - started, call_stats.get("ttfb"), len(body),
+            call_stats.get("response_bytes", 0), extract_usage(data), call_stats["retries"], status,
+        )
+
+
+async def stream_sse(url: str, headers: dict, payload: dict, provider: str = None, stage: str = None):
+    # Yield each JSON "data:" event of a provider's server-sent event stream
+    session = get_session()
+    timeout = get_timeout(provider, streaming=True) if provider else None
+    body = json.dumps(payload).encode("utf-8")
+    call_stats = {"retries": 0}
+    usage = {}
+    response_bytes = 0
+    ttfb = None
+    status = "error"
+    started = time.perf_counter()
+    # Held from a successful open until the stream ends; a failed attempt gives it back before the backoff
+    slot = AsyncExitStack()
+
+    async def open_stream():
+        await slot.enter_async_context(provider_slot(provider))
+        try:
+            response = await session.post(url, headers=headers, data=body, timeout=timeout)
+            if response.status >= 400:
+                text = await response.text()
+                response.release()
+                raise ProviderError(response.status, text, dict(response.headers))
+        except BaseException:
+            await slot.aclose()
+            raise
+        return response
+
+    try:
+        async with slot:
+            # Only establishing the stream is retried; a stream that fails midway surfaces the error
+            response = await call_with_retries(provider, open_stream, call_stats)
+            try:
+                async for raw_line in response.content:
+                    response_bytes += len(raw_line)
+                    line = raw_line.decode("utf-8").strip()
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if not data or data == "[DONE]":
+                        continue
+                    event = json.loads(data)
+                    if ttfb is None:
+                        ttfb = time.perf_counter() - started
+                    # Usage arrives in the opening and/or closing events depending on the provider
+                    for key, value in extract_usage(event).items():
+                        usage[key] = max(usage.get(key, 0), value)
+                    yield event
+            finally:
+                response.release()
+        status = "ok"
+    except (asyncio.CancelledError, GeneratorExit):
+        # e.g. the losing side of a hedged request
+        status = "cancelled"
+        raise
+    finally:
+        record_call(
+            stage, provider, time.perf_counter() - started, ttfb, len(body),
+            response_bytes, usage, call_stats["retries"], status,
+        )
+
+
+def run_sync(coro_fn, *args, **kwargs):
+    # Drive an async agent from synchronous code, closing the loop's session afterwards
+    async def runner():
+        try:
+            return await coro_fn(*args, **kwargs)
+        finally:
+            await close_session()
+
+    return asyncio.run(runner())
@@ -1,14 +1,35 @@
 import os
-import requests
-import json
-import re
 from dotenv import load_dotenv
 
+from agents.context_budget import compact_humanizer_context, estimate_tokens, section_research, squeeze_whitespace
+from agents.http_client import post_json, run_sync, stream_sse
+from agents.postprocess import postprocess
+from agents.quality import (
+    CONTINUE_PROMPT,
+    MAX_CONTINUATIONS,
+    enforce_gates,
+    join_continuation,
+    section_acceptable,
+)
+from agents.sections import SECTION_PASSES, process_sections, section_key, section_outline
+from agents.telemetry import record_continuation, record_prompt_budget
+
 load_dotenv()
 
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
-
-def format_deepseek_prompt(user_input: dict, seo_article: str, research_summary: str) -> str:
+API_URL = os.getenv("DEEPSEEK_API_URL", "https://api.deepseek.com/chat/completions")
+HUMANIZER_MODEL = "deepseek-chat"
+HUMANIZER_MAX_TOKENS = int(os.getenv("HUMANIZER_MAX_TOKENS", "4096"))
+
+# Brief fields that shape the humanizer prompt; a section is reworked when any of them changes
+HUMANIZER_BRIEF_FIELDS = (
+    "draft_title", "content_direction", "industry_vertical", "target_audience", "audience_pain_points",
+    "geographic_focus", "reading_level", "tonality", "content_goal", "structure_style", "reference_brands",
+    "include_competitors", "call_to_action", "article_length",
+)
+
+def format_deepseek_prompt(user_input: dict, seo_article: str, research_summary: str, outline: str = None,
+                           missing_keywords: list = None) -> str:
     tone = user_input.get("tonality", "")
     content_direction = user_input.get("content_direction", "")
     audience = user_input.get("target_audience", "")
@@ -30,9 +51,18 @@ def format_deepseek_prompt(user_input: dict, seo_article: str, research_summary:
     }
     length_value = length_map.get(length, 2000)
 
-    # Clean up em dashes
-    seo_article = seo_article.replace("—", " - ")
-    research_summary = research_summary.replace("—", " - ")
+    if outline:
+        # Single-section pass: the rest of the article is handled by parallel calls
+        target_length = "keep this section at roughly its current length"
+        scope = f"""
+== SECTION SCOPE ==
+The article below is one section of a longer piece with this outline:
+{outline}
+Humanize only this section. Keep its heading line as is, do not add a title, and do not write other sections.
+"""
+    else:
+        target_length = f"{length} (~{length_value} words)"
+        scope = ""
 
     return f"""
 You are a human content specialist.
@@ -53,8 +83,8 @@ Your job is to humanize the following SEO-optimized article. Make it emotionally
 - Reference Brands: {brands or "N/A"}
 - Include Competitors: {"Yes" if include_competitors else "No"}
 - Suggested CTA: {call_to_action or "N/A"}
-- Target Length: {length} (~{length_value} words)
-
+- Target Length: {target_length}
+{scope}
 == CONTEXTUAL REFERENCE ==
 Use both the original research summary and the current draft article as background to guide tone, flow, and content alignment. You may draw upon ideas, examples, or narrative flow elements from either if they help humanize the content effectively.
 
@@ -65,53 +95,125 @@ Use both the original research summary and the current draft article as backgrou
 {seo_article}
 
 == HUMANIZATION RULES ==
-1. DO NOT use em dashes (—). Replace with spaced hyphens ( - ).
-2. DO NOT add summaries, prefaces, sign-offs, or meta-descriptions.
-3. DO NOT include word counts in the final output.
-4. Preserve SEO keywords and header formatting (H1, H2, H3 in markdown).
-5. Eliminate robotic transitions, filler phrases, or overly flat structure.
-6. Adjust the voice to match the tone, audience pain points, and brand inspiration.
-7. Ensure a natural flow and conversational rhythm.
-8. Keep the message focused and relevant to the audience's knowledge level and needs. 
-9. Ensure that the article aligns with the content direction
+1. DO NOT add summaries, prefaces, sign-offs, or meta-descriptions.
+2. Preserve SEO keywords and header formatting (H1, H2, H3 in markdown).
+3. Eliminate robotic transitions, filler phrases, or overly flat structure.
+4. Adjust the voice to match the tone, audience pain points, and brand inspiration.
+5. Ensure a natural flow and conversational rhythm.
+6. Keep the message focused and relevant to the audience's knowledge level and needs. 
+7. Ensure that the article aligns with the content direction
+{f"8. Work in these keywords, which the text has lost: {', '.join(missing_keywords)}" if missing_keywords else ""}
 
 == OUTPUT FORMAT ==
-Only return the humanized article using markdown-style formatting. DO NOT wrap the output in a code block (e.g., ```markdown). DO NOT include any commentary or extra explanation.
+Only return the humanized article using markdown-style formatting. DO NOT include any commentary or extra explanation.
 """
 
-def run_humanizer_agent(user_input: dict, seo_article: str, research_summary: str, output_dir: str) -> dict:
-    if not DEEPSEEK_API_KEY:
-        raise EnvironmentError("DEEPSEEK_API_KEY not set in .env")
-
-    prompt = format_deepseek_prompt(user_input, seo_article, research_summary)
-
-    url = "https://api.deepseek.com/chat/completions"
+async def _request(payload: dict, on_token=None) -> tuple:
+    # One chat completion -> (text, finish_reason)
     headers = {
         "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
         "Content-Type": "application/json"
     }
 
+    if on_token is None:
+        data = await post_json(API_URL, headers, payload, provider="deepseek", stage="humanizer")
+        return data["choices"][0]["message"]["content"], data["choices"][0].get("finish_reason")
+
+    # Stream content deltas to the caller while assembling the full article
+    payload = {**payload, "stream": True, "stream_options": {"include_usage": True}}
+    parts = []
+    finish_reason = None
+    async for chunk in stream_sse(API_URL, headers, payload, provider="deepseek", stage="humanizer"):
+        choices = chunk.get("choices") or [{}]
+        delta = choices[0].get("delta", {}).get("content")
+        if delta:
+            parts.append(delta)
+            await on_token(delta)
+        finish_reason = choices[0].get("finish_reason") or finish_reason
+    return "".join(parts), finish_reason
+
+async def _humanize(prompt: str, on_token=None) -> str:
+    messages = [
+        {"role": "user", "content": prompt.strip()}
+    ]
     payload = {
-        "model": "deepseek-chat",
-        "messages": [
-            {"role": "user", "content": prompt.strip()}
-        ],
+        "model": HUMANIZER_MODEL,
+        "messages": messages,
         "temperature": 0.7,
-        "max_tokens": 4096
+        "max_tokens": HUMANIZER_MAX_TOKENS
     }
 
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
-    response.raise_for_status()
-
-    result = response.json()["choices"][0]["message"]["content"]
-
-    # Clean up any accidental word count mentions
-    result = re.sub(r"\(?(word count|~?\s*\d+\s*words)\)?", "", result, flags=re.IGNORECASE)
+    text, finish_reason = await _request(payload, on_token)
+    for _ in range(MAX_CONTINUATIONS):
+        if finish_reason != "length":
+            break
+        # Hit max_tokens: ask for the rest only, with the partial answer as context
+        record_continuation("humanizer", "deepseek", "continued")
+        payload["messages"] = messages + [
+            {"role": "assistant", "content": text},
+            {"role": "user", "content": CONTINUE_PROMPT},
+        ]
+        more, finish_reason = await _request(payload, on_token)
+        text = join_continuation(text, more)
+    if finish_reason == "length":
+        record_continuation("humanizer", "deepseek", "truncated")
+    return text
+
+async def humanize_by_section(user_input: dict, seo_article: str, research_summary: str, on_token=None) -> str:
+    brief = {field: user_input.get(field) for field in HUMANIZER_BRIEF_FIELDS}
+    notes = {}
+    # The legacy whole-article prompt carried the research once; sections add only what they send
+    record_prompt_budget("humanizer", estimate_tokens(research_summary), 0)
+
+    def section_notes(index: int, sections: list) -> str:
+        # Each section gets the research passages that match it; the slice is part of its cache key
+        if index not in notes:
+            notes[index] = section_research(user_input, research_summary, sections[index])
+        return notes[index]
+
+    def key(index: int, sections: list) -> str:
+        return section_key("humanizer", HUMANIZER_MODEL, sections[index], brief, section_notes(index, sections))
+
+    async def humanize(index: int, sections: list, on_token=None) -> str:
+        section = squeeze_whitespace(sections[index])
+        research_notes = section_notes(index, sections)
+        record_prompt_budget(
+            "humanizer", estimate_tokens(sections[index]), estimate_tokens(section) + estimate_tokens(research_notes)
+        )
+        prompt = format_deepseek_prompt(user_input, section, research_notes, section_outline(sections))
+        return await _humanize(prompt, on_token)
+
+    return await process_sections("humanizer", seo_article, key, humanize, on_token, accept=section_acceptable)
+
+async def run_humanizer_agent_async(user_input: dict, seo_article: str, research_summary: str, output_dir: str, on_token=None) -> dict:
+    if not DEEPSEEK_API_KEY:
+        raise EnvironmentError("DEEPSEEK_API_KEY not set in .env")
 
-    # Clean up markdown code block delimiters if present
-    result = re.sub(r'^```markdown\s*\n', '', result, flags=re.MULTILINE)  # Remove starting ```markdown
-    result = re.sub(r'\n```$', '', result, flags=re.MULTILINE)  # Remove ending ```
-    result = result.strip()  # Remove any leading/trailing whitespace
+    if SECTION_PASSES:
+        # Only sections whose text, research slice or brief changed since a previous pass are sent
+        prompt = format_deepseek_prompt(user_input, "<one section at a time>", "<matching research>", "<article outline>")
+        result = await humanize_by_section(user_input, seo_article, research_summary, on_token)
+    else:
+        # Only the research passages that match the article's sections are sent along
+        article, research_notes = compact_humanizer_context(user_input, seo_article, research_summary)
+        prompt = format_deepseek_prompt(user_input, article, research_notes)
+        result = await _humanize(prompt, on_token)
+
+    # Em dashes, code fences, word counts and heading glitches are fixed locally instead of in the prompt
+    result, checks = postprocess(result, user_input.get("keywords", ""), "humanizer")
+
+    async def revise(section: str, sections: list, missing_keywords: list) -> str:
+        # Keywords the SEO pass placed and the rewrite dropped are put back into one section
+        notes = section_research(user_input, research_summary, section)
+        prompt = format_deepseek_prompt(user_input, section, notes, section_outline(sections), missing_keywords)
+        return await _humanize(prompt)
+
+    # The humanizer should keep the SEO article's length and sections (measured by the same pass as the output)
+    _, target = postprocess(seo_article)
+    result, checks = await enforce_gates(
+        "humanizer", result, checks, user_input.get("keywords", ""),
+        target_words=target["words"], min_h2=target["h2"], revise_fn=revise,
+    )
 
     # Save humanizer output to output folder
     humanizer_path = os.path.join(output_dir, "humanizer.md")
@@ -121,5 +223,9 @@ def run_humanizer_agent(user_input: dict, seo_article: str, research_summary: st
     return {
         "agent": "HumanizerAgent",
         "prompt": prompt.strip(),
-        "final_article": result.strip()
+        "final_article": result.strip(),
+        "checks": checks
     }
+
+def run_humanizer_agent(user_input: dict, seo_article: str, research_summary: str, output_dir: str) -> dict:
+    return run_sync(run_humanizer_agent_async, user_input, seo_article, research_summary, output_dir)
@@ -1,11 +1,78 @@
+import gzip
+import hashlib
+import html
+import json
+import os
 import re
+import shutil
+import threading
+import zipfile
+from collections import OrderedDict
 from io import BytesIO
 from docx import Document
+from docx.opc.constants import RELATIONSHIP_TYPE
+from docx.oxml.ns import qn
+from lxml.etree import SubElement
+from markdown_it import MarkdownIt
+from markdown_it.token import Token
+
+from agents.pdf_renderer import render_pdf
+
+# Shared, pre-configured tokenizer: CommonMark plus GFM tables and strikethrough
+MARKDOWN = MarkdownIt("commonmark").enable("table").enable("strikethrough")
+
+CODE_FONT = "Courier New"
+LINK_COLOR = "0563C1"
+MAX_LIST_DEPTH = 3
+
+# Clark-notation tag names, resolved once instead of per run
+W_R, W_T, W_BR, W_RPR = qn("w:r"), qn("w:t"), qn("w:br"), qn("w:rPr")
+W_RFONTS, W_B, W_I, W_STRIKE = qn("w:rFonts"), qn("w:b"), qn("w:i"), qn("w:strike")
+W_COLOR, W_U, W_VAL = qn("w:color"), qn("w:u"), qn("w:val")
+W_HYPERLINK, R_ID = qn("w:hyperlink"), qn("r:id")
+CODE_FONT_ATTRS = (qn("w:ascii"), qn("w:hAnsi"), qn("w:cs"))
+XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+
+# Rendered DOCX files (path, mtime, size) keyed by article hash
+RENDER_CACHE_ENTRIES = int(os.getenv("DOCX_RENDER_CACHE_ENTRIES", "64"))
+_render_cache = OrderedDict()
+
+# The parsed article, saved once per run; every output format is rendered from it
+DOCUMENT_NAME = "document.json.gz"
+# Token fields worth persisting; the rest are rebuilt with their defaults on load
+DOCUMENT_FIELDS = ("type", "tag", "nesting", "attrs", "children", "content", "markup", "info", "block", "hidden")
 
 def sanitize_filename(name: str) -> str:
     return re.sub(r'[^a-zA-Z0-9_\-]', '', name.replace(" ", "_"))
 
+def parse_document(markdown_content: str) -> list:
+    # html_block/html_inline tokens (the writer's <!-- keyword --> flags) never reach any format
+    tokens = []
+    for token in MARKDOWN.parse(markdown_content):
+        if token.type == "html_block":
+            continue
+        if token.children:
+            token.children = [child for child in token.children if child.type != "html_inline"]
+        tokens.append(token)
+    return tokens
+
+def _persisted(key: str, value) -> bool:
+    return key in ("type", "tag", "nesting") or (key in DOCUMENT_FIELDS and bool(value))
+
+def save_document(output_dir: str, tokens: list) -> str:
+    path = os.path.join(output_dir, DOCUMENT_NAME)
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        json.dump([token.as_dict(filter=_persisted) for token in tokens], f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+    return path
+
+def load_document(output_dir: str) -> list:
+    with gzip.open(os.path.join(output_dir, DOCUMENT_NAME), "rt", encoding="utf-8") as f:
+        return [Token.from_dict(data) for data in json.load(f)]
+
 def parse_markdown_to_docx(doc: Document, content: str):
+    # Legacy line-by-line converter, kept for comparison in bench/bench_docx_render.py
     lines = content.splitlines()
     i = 0
     while i < len(lines):
@@ -62,10 +129,425 @@ def parse_markdown_to_docx(doc: Document, content: str):
 
         i += 1
 
-def get_docx_stream(markdown_content: str) -> BytesIO:
-    doc = Document()
-    parse_markdown_to_docx(doc, markdown_content)
+def new_document() -> Document:
+    return Document()
+
+def _add_hyperlink(paragraph, url: str):
+    r_id = paragraph.part.relate_to(url, RELATIONSHIP_TYPE.HYPERLINK, is_external=True)
+    hyperlink = SubElement(paragraph._p, W_HYPERLINK)
+    hyperlink.set(R_ID, r_id)
+    return hyperlink
+
+def _append_run(parent, text: str, bold: bool, italic: bool, strike: bool, code: bool, link: bool):
+    # Build <w:r> directly; python-docx's Run setters re-query the XML for every property
+    run = SubElement(parent, W_R)
+    if bold or italic or strike or code or link:
+        properties = SubElement(run, W_RPR)
+        if code:
+            fonts = SubElement(properties, W_RFONTS)
+            for attribute in CODE_FONT_ATTRS:
+                fonts.set(attribute, CODE_FONT)
+        if bold:
+            SubElement(properties, W_B)
+        if italic:
+            SubElement(properties, W_I)
+        if strike:
+            SubElement(properties, W_STRIKE)
+        if link:
+            SubElement(properties, W_COLOR).set(W_VAL, LINK_COLOR)
+            SubElement(properties, W_U).set(W_VAL, "single")
+    text_element = SubElement(run, W_T)
+    text_element.text = text
+    if text[:1].isspace() or text[-1:].isspace():
+        text_element.set(XML_SPACE, "preserve")
+    return run
+
+def _add_inline_runs(paragraph, children: list, bold: int = 0):
+    # Walk inline tokens once, carrying bold/italic/strike/link state into each run
+    italic = strike = 0
+    parent = paragraph._p
+    for child in children:
+        kind = child.type
+        if kind == "text" or kind == "softbreak" or kind == "code_inline":
+            text = " " if kind == "softbreak" else child.content
+            if text:
+                _append_run(parent, text, bold, italic, strike, kind == "code_inline", parent is not paragraph._p)
+        elif kind == "strong_open":
+            bold += 1
+        elif kind == "strong_close":
+            bold -= 1
+        elif kind == "em_open":
+            italic += 1
+        elif kind == "em_close":
+            italic -= 1
+        elif kind == "s_open":
+            strike += 1
+        elif kind == "s_close":
+            strike -= 1
+        elif kind == "link_open":
+            href = child.attrs.get("href", "")
+            if href:
+                parent = _add_hyperlink(paragraph, href)
+        elif kind == "link_close":
+            parent = paragraph._p
+        elif kind == "hardbreak":
+            SubElement(SubElement(parent, W_R), W_BR)
+        # html_inline (e.g. the writer's <!-- keyword --> flags) and images are dropped
+
+def _list_style(lists: list, first_paragraph: bool) -> str:
+    depth = min(len(lists), MAX_LIST_DEPTH)
+    suffix = "" if depth == 1 else f" {depth}"
+    if not first_paragraph:
+        return f"List Continue{suffix}"
+    return ("List Number" if lists[-1] == "ordered" else "List Bullet") + suffix
+
+def render_markdown_to_docx(doc: Document, content: str):
+    render_tokens_to_docx(doc, parse_document(content))
+
+def render_tokens_to_docx(doc: Document, tokens: list):
+    # python-docx scans every style on each name lookup; resolve each name once per document
+    style_ids = {}
+
+    def add_paragraph(style: str = None):
+        paragraph = doc.add_paragraph()
+        if style:
+            if style not in style_ids:
+                style_ids[style] = doc.styles[style].style_id
+            paragraph._p.style = style_ids[style]
+        return paragraph
+
+    lists = []
+    item_paragraphs = []
+    quote_depth = 0
+    table_rows = None
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        kind = token.type
+
+        if kind == "heading_open":
+            level = int(token.tag[1])
+            paragraph = add_paragraph(f"Heading {min(level, 4)}")
+            _add_inline_runs(paragraph, tokens[i + 1].children or [])
+            i += 3
+            continue
+
+        if kind == "paragraph_open":
+            inline = tokens[i + 1]
+            if lists:
+                style = _list_style(lists, item_paragraphs[-1] == 0)
+                item_paragraphs[-1] += 1
+            elif quote_depth:
+                style = "Intense Quote"
+            else:
+                style = None
+            paragraph = add_paragraph(style)
+            _add_inline_runs(paragraph, inline.children or [])
+            i += 3
+            continue
+
+        if kind in ("bullet_list_open", "ordered_list_open"):
+            lists.append("ordered" if kind == "ordered_list_open" else "bullet")
+        elif kind in ("bullet_list_close", "ordered_list_close"):
+            lists.pop()
+        elif kind == "list_item_open":
+            item_paragraphs.append(0)
+        elif kind == "list_item_close":
+            item_paragraphs.pop()
+        elif kind == "blockquote_open":
+            quote_depth += 1
+        elif kind == "blockquote_close":
+            quote_depth -= 1
+        elif kind in ("fence", "code_block"):
+            paragraph = add_paragraph()
+            for index, line in enumerate(token.content.rstrip("\n").split("\n")):
+                if index:
+                    SubElement(SubElement(paragraph._p, W_R), W_BR)
+                if line:
+                    _append_run(paragraph._p, line, False, False, False, True, False)
+        elif kind == "hr":
+            add_paragraph()
+        elif kind == "table_open":
+            table_rows = []
+        elif kind == "tr_open":
+            table_rows.append([])
+        elif kind in ("th_open", "td_open"):
+            table_rows[-1].append((tokens[i + 1].children or [], kind == "th_open"))
+            i += 3
+            continue
+        elif kind == "table_close":
+            columns = max(len(row) for row in table_rows) if table_rows else 0
+            if columns:
+                table = doc.add_table(rows=len(table_rows), cols=columns)
+                table.style = "Table Grid"
+                for r_idx, row in enumerate(table_rows):
+                    for c_idx, (children, header) in enumerate(row):
+                        _add_inline_runs(table.cell(r_idx, c_idx).paragraphs[0], children, bold=int(header))
+            table_rows = None
+        # html_block tokens (comments) are dropped
+        i += 1
+
+def _cached_render(key: str) -> str:
+    entry = _render_cache.get(key)
+    if entry is None:
+        return None
+    path, mtime_ns, size = entry
+    # Ignore entries whose file was removed or overwritten since it was rendered
+    try:
+        stat = os.stat(path)
+    except OSError:
+        del _render_cache[key]
+        return None
+    if (stat.st_mtime_ns, stat.st_size) != (mtime_ns, size):
+        del _render_cache[key]
+        return None
+    _render_cache.move_to_end(key)
+    return path
+
+def write_docx_file(markdown_content: str, path: str, doc: Document = None, tokens: list = None) -> str:
+    # Save straight to disk; the render cache maps article hashes to files, so memory stays flat
+    key = hashlib.sha256(markdown_content.encode("utf-8")).hexdigest()
+    cached = _cached_render(key)
+    if cached is not None:
+        if os.path.abspath(cached) != os.path.abspath(path):
+            shutil.copyfile(cached, path)
+    else:
+        if doc is None:
+            doc = new_document()
+        render_tokens_to_docx(doc, tokens if tokens is not None else parse_document(markdown_content))
+        tmp_path = path + ".tmp"
+        doc.save(tmp_path)
+        os.replace(tmp_path, path)
+
+    stat = os.stat(path)
+    _render_cache[key] = (path, stat.st_mtime_ns, stat.st_size)
+    _render_cache.move_to_end(key)
+    while len(_render_cache) > RENDER_CACHE_ENTRIES:
+        _render_cache.popitem(last=False)
+    return path
+
+def get_docx_stream(markdown_content: str, doc: Document = None) -> BytesIO:
+    # In-memory variant for callers that have no output folder
+    if doc is None:
+        doc = new_document()
+    render_markdown_to_docx(doc, markdown_content)
     stream = BytesIO()
     doc.save(stream)
     stream.seek(0)
     return stream
+
+def _plain_text(children: list) -> str:
+    return "".join(
+        " " if child.type in ("softbreak", "hardbreak") else child.content
+        for child in children or []
+        if child.type in ("text", "code_inline", "softbreak", "hardbreak")
+    )
+
+def document_outline(tokens: list) -> dict:
+    headings = []
+    words = 0
+    for index, token in enumerate(tokens):
+        if token.type == "inline":
+            words += len(_plain_text(token.children).split())
+        elif token.type == "heading_open":
+            headings.append({"level": int(token.tag[1]), "text": _plain_text(tokens[index + 1].children)})
+    title = next((heading["text"] for heading in headings if heading["level"] == 1), "")
+    return {"title": title, "headings": headings, "word_count": words}
+
+HTML_STYLE = (
+    "body{max-width:46rem;margin:2rem auto;padding:0 1rem;font:17px/1.6 Georgia,serif;color:#222}"
+    "h1,h2,h3,h4{font-family:Helvetica,Arial,sans-serif;line-height:1.25}"
+    "table{border-collapse:collapse}th,td{border:1px solid #bbb;padding:.3rem .6rem}"
+    "blockquote{margin-left:0;padding-left:1rem;border-left:3px solid #ccc;font-style:italic}"
+    "pre{background:#f4f4f4;padding:.75rem;overflow-x:auto}a{color:#0563c1}"
+)
+
+def render_html(tokens: list, path: str):
+    body = MARKDOWN.renderer.render(tokens, MARKDOWN.options, {})
+    title = html.escape(document_outline(tokens)["title"])
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            '<!DOCTYPE html>\n<html lang="en">\n<head>\n<meta charset="utf-8">\n'
+            '<meta name="viewport" content="width=device-width, initial-scale=1">\n'
+            f"<title>{title}</title>\n<style>{HTML_STYLE}</style>\n</head>\n<body>\n<article>\n{body}</article>\n</body>\n</html>\n"
+        )
+
+# Characters that would otherwise turn plain text back into markup
+MARKDOWN_ESCAPE = re.compile(r"([\\`*_\[\]<])")
+MARKDOWN_LINE_START = re.compile(r"^(\s*(?:\d+)?)(#{1,6}(?=\s|$)|>|[-+*](?=\s)|(?<=\d)[.)](?=\s))", re.MULTILINE)
+
+def _inline_markdown(children: list, table: bool = False) -> str:
+    out = []
+    hrefs = []
+    for child in children or []:
+        kind = child.type
+        if kind == "text":
+            text = MARKDOWN_ESCAPE.sub(r"\\\1", child.content)
+            out.append(text.replace("|", "\\|") if table else text)
+        elif kind == "code_inline":
+            fence = "``" if "`" in child.content else "`"
+            pad = " " if fence == "``" else ""
+            out.append(f"{fence}{pad}{child.content}{pad}{fence}")
+        elif kind == "softbreak":
+            out.append(" " if table else "\n")
+        elif kind == "hardbreak":
+            out.append(" " if table else "\\\n")
+        elif kind in ("strong_open", "strong_close", "em_open", "em_close"):
+            out.append(child.markup)
+        elif kind in ("s_open", "s_close"):
+            out.append("~~")
+        elif kind == "link_open":
+            hrefs.append(child.attrs.get("href", ""))
+            out.append("[")
+        elif kind == "link_close":
+            out.append(f"]({hrefs.pop() if hrefs else ''})")
+        elif kind == "image":
+            alt = MARKDOWN_ESCAPE.sub(r"\\\1", child.content)
+            out.append(f"![{alt}]({child.attrs.get('src', '')})")
+    text = "".join(out)
+    return text if table else MARKDOWN_LINE_START.sub(lambda m: m.group(1) + "\\" + m.group(2), text)
+
+def _table_markdown(rows: list, aligns: list) -> list:
+    columns = max(len(row) for row in rows)
+    rows = [row + [""] * (columns - len(row)) for row in rows]
+    rule = {"left": ":---", "right": "---:", "center": ":---:"}
+    lines = ["| " + " | ".join(rows[0]) + " |"]
+    lines.append("| " + " | ".join(rule.get(align, "---") for align in (aligns + [None] * columns)[:columns]) + " |")
+    lines.extend("| " + " | ".join(row) + " |" for row in rows[1:])
+    return lines
+
+def render_tokens_to_markdown(tokens: list) -> str:
+    # Normalized CommonMark/GFM from the token stream; containers are tracked as [first-line prefix, continuation prefix, used]
+    out = []
+    containers = []
+    lists = []
+    table_rows = table_aligns = None
+
+    def emit(lines: list):
+        # Tight lists keep their items (and lists nested in them) together; anything else is blank-line separated
+        tight = lists and lists[-1]["tight"] and (lists[-1]["started"] or (len(lists) > 1 and lists[-2]["tight"]))
+        if lists:
+            lists[-1]["started"] = True
+        if out and not tight:
+            blank = ""
+            for container in containers:
+                if not container[2]:
+                    break
+                blank += container[1]
+            out.append(blank.rstrip())
+        for line in lines:
+            prefix = "".join(container[1] if container[2] else container[0] for container in containers)
+            out.append((prefix + line).rstrip() if line else prefix.rstrip())
+            for container in containers:
+                container[2] = True
+
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        kind = token.type
+        if kind == "heading_open":
+            emit(["#" * int(token.tag[1]) + " " + _inline_markdown(tokens[i + 1].children)])
+            i += 3
+            continue
+        if kind == "paragraph_open":
+            emit(_inline_markdown(tokens[i + 1].children).split("\n"))
+            i += 3
+            continue
+        if kind in ("bullet_list_open", "ordered_list_open"):
+            tight = i + 2 < len(tokens) and tokens[i + 2].type == "paragraph_open" and tokens[i + 2].hidden
+            lists.append({"tight": tight, "started": False, "ordered": kind == "ordered_list_open"})
+        elif kind in ("bullet_list_close", "ordered_list_close"):
+            lists.pop()
+        elif kind == "list_item_open":
+            marker = f"{token.info}{token.markup}" if lists[-1]["ordered"] else token.markup
+            containers.append([marker + " ", " " * (len(marker) + 1), False])
+        elif kind == "blockquote_open":
+            containers.append(["> ", "> ", False])
+        elif kind in ("list_item_close", "blockquote_close"):
+            if not containers[-1][2]:
+                # Empty item or quote: still emit its marker
+                emit([""])
+            containers.pop()
+        elif kind in ("fence", "code_block"):
+            fence = "~~~~" if "```" in token.content else "```"
+            emit([fence + (token.info if kind == "fence" else "")] + token.content.rstrip("\n").split("\n") + [fence])
+        elif kind == "hr":
+            emit(["---"])
+        elif kind == "table_open":
+            table_rows, table_aligns = [], []
+        elif kind == "tr_open":
+            table_rows.append([])
+        elif kind in ("th_open", "td_open"):
+            if kind == "th_open":
+                style = token.attrs.get("style", "")
+                table_aligns.append(style.split(":", 1)[1] if style.startswith("text-align:") else None)
+            table_rows[-1].append(_inline_markdown(tokens[i + 1].children, table=True))
+            i += 3
+            continue
+        elif kind == "table_close":
+            if table_rows:
+                emit(_table_markdown(table_rows, table_aligns))
+            table_rows = table_aligns = None
+        i += 1
+    return "\n".join(out) + "\n"
+
+def render_markdown_bundle(tokens: list, path: str):
+    # article.md plus metadata.json for publishing tools (CMS importers, static site generators)
+    metadata = document_outline(tokens)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as bundle:
+        bundle.writestr("article.md", render_tokens_to_markdown(tokens))
+        bundle.writestr("metadata.json", json.dumps(metadata, indent=2, ensure_ascii=False))
+
+def render_docx(tokens: list, path: str):
+    doc = new_document()
+    render_tokens_to_docx(doc, tokens)
+    doc.save(path)
+
+# Output formats: renderers take the parsed document and a path to write
+RENDERERS = {}
+
+def register_renderer(fmt: str, filename: str, media_type: str, render):
+    RENDERERS[fmt] = {"filename": filename, "media_type": media_type, "render": render}
+
+register_renderer("docx", "final.docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document", render_docx)
+register_renderer("html", "final.html", "text/html; charset=utf-8", render_html)
+register_renderer("md", "final_markdown.zip", "application/zip", render_markdown_bundle)
+register_renderer("pdf", "final.pdf", "application/pdf",
+                  lambda tokens, path: render_pdf(tokens, path, document_outline(tokens)["title"]))
+
+# path -> [lock, requests using it]; an entry is dropped once its last request finishes
+_render_locks = {}
+_render_locks_guard = threading.Lock()
+
+def rendered_formats(output_dir: str) -> list:
+    return [fmt for fmt, renderer in RENDERERS.items() if os.path.exists(os.path.join(output_dir, renderer["filename"]))]
+
+def clear_rendered_formats(output_dir: str, keep: tuple = ("docx",)):
+    # A regenerated article invalidates every lazily rendered format
+    for fmt, renderer in RENDERERS.items():
+        path = os.path.join(output_dir, renderer["filename"])
+        if fmt not in keep and os.path.exists(path):
+            os.remove(path)
+
+def render_format(output_dir: str, fmt: str) -> str:
+    # Render on first request and keep the file in the job folder; concurrent requests share one render
+    renderer = RENDERERS[fmt]
+    path = os.path.join(output_dir, renderer["filename"])
+    with _render_locks_guard:
+        entry = _render_locks.setdefault(path, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            document_mtime = os.path.getmtime(os.path.join(output_dir, DOCUMENT_NAME))
+            if os.path.exists(path) and os.path.getmtime(path) >= document_mtime:
+                return path
+            tokens = load_document(output_dir)
+            tmp_path = path + ".tmp"
+            renderer["render"](tokens, tmp_path)
+            os.replace(tmp_path, path)
+        return path
+    finally:
+        with _render_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _render_locks[path]
@@ -0,0 +1,352 @@
+import zlib
+
+# Pure-Python PDF writer for the parsed article: base-14 fonts only, so nothing is embedded
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+MARGIN = 72
+BODY_SIZE = 11
+BODY_LEADING = 15
+CODE_SIZE = 9
+CODE_LEADING = 12
+HEADING_SIZES = {1: 20, 2: 16, 3: 13}
+LIST_INDENT = 18
+LINK_RGB = (0.02, 0.39, 0.76)
+
+FONTS = {
+    "regular": ("F1", "Helvetica"),
+    "bold": ("F2", "Helvetica-Bold"),
+    "italic": ("F3", "Helvetica-Oblique"),
+    "bold_italic": ("F4", "Helvetica-BoldOblique"),
+    "code": ("F5", "Courier"),
+}
+
+# Adobe AFM advance widths (1/1000 em) for WinAnsi 32..126; the oblique faces share them
+HELVETICA_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556,
+    278, 278, 584, 584, 584, 556, 1015,
+    667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833,
+    722, 778, 667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611,
+    278, 278, 278, 469, 556, 333,
+    556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833,
+    556, 556, 556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500,
+    334, 260, 334, 584,
+]
+HELVETICA_BOLD_WIDTHS = [
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556,
+    333, 333, 584, 584, 584, 611, 975,
+    722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833,
+    722, 778, 667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611,
+    333, 278, 333, 584, 556, 333,
+    556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889,
+    611, 611, 611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500,
+    389, 280, 389, 584,
+]
+# Typographic characters LLM output is full of (regular, bold)
+EXTRA_WIDTHS = {
+    "‘": (222, 278), "’": (222, 278), "“": (333, 500), "”": (333, 500),
+    "–": (556, 556), "—": (1000, 1000), "…": (1000, 1000), "•": (350, 350),
+    " ": (278, 278),
+}
+
+
+def char_width(char: str, bold: bool) -> int:
+    code = ord(char)
+    if 32 <= code <= 126:
+        return (HELVETICA_BOLD_WIDTHS if bold else HELVETICA_WIDTHS)[code - 32]
+    return EXTRA_WIDTHS.get(char, (556, 556))[int(bold)]
+
+
+def text_width(text: str, style: str, size: float) -> float:
+    if style == "code":
+        return len(text) * 0.6 * size
+    bold = style in ("bold", "bold_italic")
+    return sum(char_width(char, bold) for char in text) * size / 1000
+
+
+def _pdf_string(text: str) -> str:
+    # WinAnsiEncoding is close to cp1252; unsupported characters become "?"
+    out = []
+    for byte in text.encode("cp1252", errors="replace"):
+        if byte in (0x28, 0x29, 0x5C):
+            out.append("\\" + chr(byte))
+        elif 32 <= byte <= 126:
+            out.append(chr(byte))
+        else:
+            out.append(f"\\{byte:03o}")
+    return "(" + "".join(out) + ")"
+
+
+def _encodable(text: str) -> str:
+    # Emoji and other characters outside WinAnsi have no glyph in the base-14 fonts; leave them out
+    return text.encode("cp1252", errors="ignore").decode("cp1252")
+
+
+def _style(bold: int, italic: int, code: bool) -> str:
+    if code:
+        return "code"
+    if bold and italic:
+        return "bold_italic"
+    if bold:
+        return "bold"
+    return "italic" if italic else "regular"
+
+
+def inline_spans(children: list, bold: int = 0, italic: int = 0) -> list:
+    # [(text, style, is_link)] from an inline token's children
+    spans = []
+    link = False
+    for child in children or []:
+        kind = child.type
+        if kind == "text":
+            spans.append((child.content, _style(bold, italic, False), link))
+        elif kind == "code_inline":
+            spans.append((child.content, "code", link))
+        elif kind == "softbreak":
+            spans.append((" ", _style(bold, italic, False), link))
+        elif kind == "hardbreak":
+            spans.append(("\n", "regular", False))
+        elif kind == "strong_open":
+            bold += 1
+        elif kind == "strong_close":
+            bold -= 1
+        elif kind == "em_open":
+            italic += 1
+        elif kind == "em_close":
+            italic -= 1
+        elif kind == "link_open":
+            link = True
+        elif kind == "link_close":
+            link = False
+        elif kind == "image":
+            spans.append((child.content or "", _style(bold, italic, False), link))
+    return spans
+
+
+def wrap_spans(spans: list, width: float, size: float) -> list:
+    # Greedy line filling; returns lines of [(text, style, is_link, x_offset)]
+    lines = []
+    line = []
+    x = 0.0
+    for text, style, link in spans:
+        text = _encodable(text)
+        if text == "\n":
+            lines.append(line)
+            line, x = [], 0.0
+            continue
+        for index, word in enumerate(text.split(" ")):
+            if index:
+                word_space = text_width(" ", style, size)
+                if line:
+                    x += word_space
+            if not word:
+                continue
+            word_width = text_width(word, style, size)
+            if line and x + word_width > width:
+                lines.append(line)
+                line, x = [], 0.0
+            while word_width > width and len(word) > 1:
+                # A single word wider than the line is broken by characters
+                cut = len(word)
+                while cut > 1 and text_width(word[:cut], style, size) > width:
+                    cut -= 1
+                lines.append(line + [(word[:cut], style, link, x)])
+                line, x = [], 0.0
+                word = word[cut:]
+                word_width = text_width(word, style, size)
+            line.append((word, style, link, x))
+            x += word_width
+    if line or not lines:
+        lines.append(line)
+    return lines
+
+
+class PdfCanvas:
+    def __init__(self):
+        self.pages = []
+        self.new_page()
+
+    def new_page(self):
+        self.ops = []
+        self.pages.append(self.ops)
+        self.y = PAGE_HEIGHT - MARGIN
+
+    def ensure(self, height: float):
+        if self.y - height < MARGIN:
+            self.new_page()
+
+    def text(self, x: float, y: float, text: str, style: str, size: float, link: bool = False):
+        color = "%.2f %.2f %.2f rg" % LINK_RGB if link else "0 g"
+        self.ops.append(f"BT {color} /{FONTS[style][0]} {size:g} Tf 1 0 0 1 {x:.2f} {y:.2f} Tm {_pdf_string(text)} Tj ET")
+
+    def line(self, x1: float, y1: float, x2: float, y2: float, gray: float = 0.6, width: float = 0.75):
+        self.ops.append(f"{gray:g} G {width:g} w {x1:.2f} {y1:.2f} m {x2:.2f} {y2:.2f} l S")
+
+    def rect(self, x: float, y: float, w: float, h: float, gray: float = 0.6):
+        self.ops.append(f"{gray:g} G 0.5 w {x:.2f} {y:.2f} {w:.2f} {h:.2f} re S")
+
+    def draw_line(self, items: list, x: float, y: float, size: float):
+        # Consecutive words in the same style are drawn as one string
+        run = None
+        for text, style, link, offset in items:
+            if run and run[1] == style and run[2] == link:
+                run[0] += " " + text
+                continue
+            if run:
+                self.text(x + run[3], y, run[0], run[1], size, run[2])
+            run = [text, style, link, offset]
+        if run:
+            self.text(x + run[3], y, run[0], run[1], size, run[2])
+
+    def paragraph(self, spans: list, x: float, width: float, size: float, leading: float, marker: str = None):
+        for index, items in enumerate(wrap_spans(spans, width, size)):
+            self.ensure(leading)
+            self.y -= leading
+            if index == 0 and marker:
+                self.text(x - LIST_INDENT + 4, self.y, marker, "regular", size)
+            self.draw_line(items, x, self.y, size)
+
+
+def _table(canvas: PdfCanvas, rows: list, x: float, width: float):
+    columns = max(len(row) for row in rows)
+    cell_width = width / columns
+    padding = 4
+    for row in rows:
+        wrapped = [wrap_spans(spans, cell_width - 2 * padding, BODY_SIZE - 1) for spans, _ in row]
+        height = max(len(lines) for lines in wrapped) * (BODY_LEADING - 1) + 2 * padding
+        canvas.ensure(height)
+        top = canvas.y
+        for column, lines in enumerate(wrapped):
+            left = x + column * cell_width
+            canvas.rect(left, top - height, cell_width, height)
+            y = top - padding
+            for items in lines:
+                y -= BODY_LEADING - 1
+                canvas.draw_line(items, left + padding, y + 3, BODY_SIZE - 1)
+        canvas.y = top - height
+    canvas.y -= 8
+
+
+def layout(tokens: list) -> PdfCanvas:
+    canvas = PdfCanvas()
+    left = MARGIN
+    content_width = PAGE_WIDTH - 2 * MARGIN
+    lists = []
+    quote_depth = 0
+    table_rows = None
+    pending_marker = None
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        kind = token.type
+        indent = LIST_INDENT * (len(lists) + quote_depth)
+
+        if kind == "heading_open":
+            level = int(token.tag[1])
+            size = HEADING_SIZES.get(level, 12)
+            canvas.ensure(size * 3)
+            canvas.y -= size * 0.6
+            canvas.paragraph(inline_spans(tokens[i + 1].children, bold=1), left, content_width, size, size * 1.3)
+            canvas.y -= 6
+            i += 3
+            continue
+
+        if kind == "paragraph_open":
+            spans = inline_spans(tokens[i + 1].children, italic=int(bool(quote_depth)))
+            canvas.paragraph(spans, left + indent, content_width - indent, BODY_SIZE, BODY_LEADING, pending_marker)
+            pending_marker = None
+            if not token.hidden:
+                canvas.y -= 8
+            i += 3
+            continue
+
+        if kind in ("bullet_list_open", "ordered_list_open"):
+            lists.append(kind)
+        elif kind in ("bullet_list_close", "ordered_list_close"):
+            lists.pop()
+            if not lists:
+                canvas.y -= 6
+        elif kind == "list_item_open":
+            pending_marker = f"{token.info}." if lists[-1] == "ordered_list_open" else "•"
+        elif kind == "blockquote_open":
+            quote_depth += 1
+        elif kind == "blockquote_close":
+            quote_depth -= 1
+        elif kind in ("fence", "code_block"):
+            for line in token.content.rstrip("\n").split("\n"):
+                spans = [(line.replace("\t", "    "), "code", False)]
+                canvas.paragraph(spans, left + indent + 12, content_width - indent - 12, CODE_SIZE, CODE_LEADING)
+            canvas.y -= 8
+        elif kind == "hr":
+            canvas.ensure(16)
+            canvas.y -= 8
+            canvas.line(left, canvas.y, left + content_width, canvas.y)
+            canvas.y -= 8
+        elif kind == "table_open":
+            table_rows = []
+        elif kind == "tr_open":
+            table_rows.append([])
+        elif kind in ("th_open", "td_open"):
+            header = kind == "th_open"
+            table_rows[-1].append((inline_spans(tokens[i + 1].children, bold=int(header)), header))
+            i += 3
+            continue
+        elif kind == "table_close":
+            if table_rows:
+                _table(canvas, table_rows, left + indent, content_width - indent)
+            table_rows = None
+        i += 1
+    return canvas
+
+
+def _info_string(text: str) -> str:
+    # Document info strings in UTF-16BE so titles keep their accents
+    return "<FEFF" + text.encode("utf-16-be").hex().upper() + ">"
+
+
+def render_pdf(tokens: list, path: str, title: str = ""):
+    canvas = layout(tokens)
+    total = len(canvas.pages)
+    for number, ops in enumerate(canvas.pages, start=1):
+        label = f"{number} / {total}"
+        ops.append(f"BT 0.4 g /F1 9 Tf 1 0 0 1 {(PAGE_WIDTH - text_width(label, 'regular', 9)) / 2:.2f} "
+                   f"{MARGIN / 2:.2f} Tm {_pdf_string(label)} Tj ET")
+
+    # Object numbers: 1 catalog, 2 page tree, 3 info, then fonts, then a (page, contents) pair per page
+    font_ids = {name: 4 + index for index, name in enumerate(FONTS)}
+    first_page = 4 + len(FONTS)
+    page_ids = [first_page + 2 * index for index in range(total)]
+    font_resources = " ".join(f"/{FONTS[name][0]} {font_ids[name]} 0 R" for name in FONTS)
+
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        2: f"<< /Type /Pages /Kids [{' '.join(f'{page} 0 R' for page in page_ids)}] /Count {total} >>".encode(),
+        3: f"<< /Title {_info_string(title)} /Producer (AutoAuthor) >>".encode(),
+    }
+    for name, (_, base_font) in FONTS.items():
+        objects[font_ids[name]] = (
+            f"<< /Type /Font /Subtype /Type1 /BaseFont /{base_font} /Encoding /WinAnsiEncoding >>".encode()
+        )
+    for page_id, ops in zip(page_ids, canvas.pages):
+        stream = zlib.compress("\n".join(ops).encode("latin-1"))
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << {font_resources} >> >> /Contents {page_id + 1} 0 R >>"
+        ).encode()
+        objects[page_id + 1] = (
+            f"<< /Length {len(stream)} /Filter /FlateDecode >>\nstream\n".encode() + stream + b"\nendstream"
+        )
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = {}
+        for number in sorted(objects):
+            offsets[number] = f.tell()
+            f.write(f"{number} 0 obj\n".encode() + objects[number] + b"\nendobj\n")
+        xref = f.tell()
+        size = max(objects) + 1
+        f.write(f"xref\n0 {size}\n0000000000 65535 f \n".encode())
+        for number in range(1, size):
+            f.write(f"{offsets[number]:010d} 00000 n \n".encode())
+        f.write(f"trailer\n<< /Size {size} /Root 1 0 R /Info 3 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
@@ -0,0 +1,209 @@
+import os
+import re
+import time
+from functools import lru_cache
+
+from agents.telemetry import record_postprocess
+
+# Deterministic clean-up and measurements run locally over each LLM stage's output in one pass over its
+# lines, so the prompts no longer carry the mechanical rules (em dashes, code fences, word counts)
+FLESCH_TARGET = float(os.getenv("FLESCH_TARGET", "60"))
+# Share of the article's words taken up by each keyword, in percent
+KEYWORD_DENSITY_MIN = float(os.getenv("KEYWORD_DENSITY_MIN", "0.5"))
+KEYWORD_DENSITY_MAX = float(os.getenv("KEYWORD_DENSITY_MAX", "3.0"))
+
+FIX_KINDS = ("em_dashes", "code_fences", "word_counts", "headings", "blank_lines")
+
+_FENCE_RE = re.compile(r"^[ \t]*(```+|~~~+)[ \t]*([\w+-]*)[ \t]*$")
+_WRAPPER_LANGUAGES = ("", "markdown", "md")
+_DASH_RE = re.compile(r"[ \t]*—[ \t]*|[ \t]+–[ \t]+")
+_WORD_COUNT_RE = re.compile(
+    r"[ \t]*(?:"
+    r"[(\[][ \t]*(?:approx\.?|approximately|about|~)?[ \t]*\d[\d,]*[ \t]+words[ \t]*[)\]]"
+    r"|[(\[]?[*_]*word[ \t]*count[*_:]*[ \t]*[:\-]?[*_]*[ \t]*~?[ \t]*\d[\d,]*(?:[ \t]+words)?[*_]*[)\]]?"
+    r")",
+    re.IGNORECASE,
+)
+# "##Heading", "## **Heading**", "## H2: Heading" and closing hashes are all models' ways of writing "## Heading".
+# Hashes glued to a digit or a lowercase word ("#1 priority", "#hashtag") are prose, and so is a glued line
+# that reads as a sentence
+_HEADING_RE = re.compile(r"^(#{1,6})([ \t]+|(?=[A-Z*_]))(.*?)(?:[ \t]+#+)?[ \t]*$")
+_SENTENCE_LINE_RE = re.compile(r"(?:[.!?,;]|\.\.\.|…)[\"')\]*_]*$")
+_HEADING_LABEL_RE = re.compile(r"^(?:H[1-6]|Heading[ \t]*\d?)[ \t]*[:.\-][ \t]*", re.IGNORECASE)
+_BOLD_RE = re.compile(r"^(\*\*|__)(.+)\1$")
+# Markup that is not prose: comments, link targets, images, table rules, list and quote markers
+_NON_PROSE_RE = re.compile(r"<!--.*?-->|\]\([^)]*\)|!\[|^[ \t]*(?:[-*+>]|\d+[.)])[ \t]+|^[\s|:\-]+$")
+_WORD_RE = re.compile(r"[A-Za-z]+(?:'[A-Za-z]+)*|\d+(?:[.,]\d+)*")
+_SENTENCE_END_RE = re.compile(r"[.!?]+(?=[\s\"')\]*_]|$)")
+_TERMINAL_RE = re.compile(r"[.!?:][\"')\]*_]*$")
+_VOWEL_GROUP_RE = re.compile(r"[aeiouy]+")
+
+
+@lru_cache(maxsize=65536)
+def syllables(word: str) -> int:
+    word = word.lower()
+    if not word.isalpha():
+        return 1
+    count = len(_VOWEL_GROUP_RE.findall(word))
+    # Silent final "e" ("make"), but not "-le" ("simple") or "-ee" ("agree")
+    if count > 1 and word.endswith("e") and not word.endswith(("le", "ee")):
+        count -= 1
+    return max(1, count)
+
+
+def flesch_reading_ease(words: int, sentences: int, syllable_count: int) -> float:
+    if not words or not sentences:
+        return None
+    return round(206.835 - 1.015 * (words / sentences) - 84.6 * (syllable_count / words), 1)
+
+
+def parse_keywords(keywords: str) -> list:
+    seen = []
+    for keyword in (keywords or "").split(","):
+        keyword = " ".join(keyword.lower().split())
+        if keyword and keyword not in seen:
+            seen.append(keyword)
+    return seen
+
+
+@lru_cache(maxsize=256)
+def _keyword_re(keywords: tuple):
+    if not keywords:
+        return None
+    # Longest first so "remote work tools" wins over "remote work"
+    alternatives = "|".join(re.escape(keyword).replace(r"\ ", r"\s+") for keyword in sorted(keywords, key=len, reverse=True))
+    return re.compile(rf"(?<![\w-])(?:{alternatives})(?![\w-])")
+
+
+def _fence_lines(lines: list) -> tuple:
+    # Indexes of the first and last non-blank lines, where a bare fence is a wrapper rather than code
+    filled = [index for index, line in enumerate(lines) if line.strip()]
+    return (filled[0], filled[-1]) if filled else (-1, -1)
+
+
+def postprocess(text: str, keywords: str = "", stage: str = None) -> tuple:
+    # Returns (normalized text, report); the report holds the fixes applied, readability,
+    # keyword density and warnings a reviewer would otherwise need another model call for
+    started = time.perf_counter()
+    lines = text.strip().splitlines()
+    first, last = _fence_lines(lines)
+    keyword_list = parse_keywords(keywords)
+    keyword_re = _keyword_re(tuple(keyword_list))
+    keyword_counts = dict.fromkeys(keyword_list, 0)
+    fixes = dict.fromkeys(FIX_KINDS, 0)
+    headings = {"h1": 0, "h2": 0, "h3": 0}
+    words = sentences = syllable_count = prose_words = 0
+    out = []
+    in_code = in_wrapper = False
+    h1_seen = False
+
+    for index, line in enumerate(lines):
+        fence = _FENCE_RE.match(line)
+        if in_code:
+            out.append(line)
+            if fence and not fence.group(2):
+                in_code = False
+            continue
+        if fence:
+            language = fence.group(2).lower()
+            if in_wrapper and not language:
+                in_wrapper = False
+                fixes["code_fences"] += 1
+            elif language in _WRAPPER_LANGUAGES and (language or index == first or index == last):
+                # ```markdown around an answer or a section, or a bare fence around the whole answer
+                in_wrapper = index != last
+                fixes["code_fences"] += 1
+            else:
+                in_code = True
+                out.append(line)
+            continue
+
+        if not line.strip():
+            if out and out[-1].strip():
+                out.append("")
+            elif out:
+                fixes["blank_lines"] += 1
+            continue
+
+        if "—" in line or "–" in line:
+            line, count = _DASH_RE.subn(" - ", line)
+            fixes["em_dashes"] += count
+        if "ords" in line or "ount" in line:
+            line, count = _WORD_COUNT_RE.subn("", line)
+            if count:
+                fixes["word_counts"] += count
+                if not line.strip():
+                    continue
+
+        heading = _HEADING_RE.match(line) if line.startswith("#") else None
+        if heading and not heading.group(2) and _SENTENCE_LINE_RE.search(line):
+            heading = None
+        if heading:
+            level, title = len(heading.group(1)), heading.group(3)
+            bold = _BOLD_RE.match(title)
+            if bold:
+                title = bold.group(2).strip()
+            title = _HEADING_LABEL_RE.sub("", title)
+            if level == 1 and h1_seen:
+                # One title per article; later H1s are sections
+                level = 2
+            h1_seen = h1_seen or level == 1
+            normalized = f"{'#' * level} {title}"
+            if normalized != line:
+                fixes["headings"] += 1
+                line = normalized
+            if level <= 3:
+                headings[f"h{level}"] += 1
+            prose = title
+            words += len(_WORD_RE.findall(title))
+        else:
+            prose = _NON_PROSE_RE.sub(" ", line) if ("<" in line or "](" in line or not line[0].isalpha()) else line
+            tokens = _WORD_RE.findall(prose)
+            if tokens:
+                words += len(tokens)
+                prose_words += len(tokens)
+                syllable_count += sum(syllables(token) for token in tokens)
+                ends = len(_SENTENCE_END_RE.findall(prose))
+                # List items and table rows without a full stop still end a sentence
+                sentences += ends + (0 if _TERMINAL_RE.search(prose.rstrip()) else 1)
+
+        if keyword_re is not None:
+            for match in keyword_re.finditer(prose.lower()):
+                keyword_counts[" ".join(match.group(0).split())] += 1
+        out.append(line)
+
+    while out and not out[-1].strip():
+        out.pop()
+
+    keyword_report = {}
+    for keyword, count in keyword_counts.items():
+        density = round(count * len(keyword.split()) / words * 100, 2) if words else 0.0
+        keyword_report[keyword] = {"count": count, "density": density}
+    flesch = flesch_reading_ease(prose_words, sentences, syllable_count)
+
+    warnings = []
+    if flesch is not None and flesch < FLESCH_TARGET:
+        warnings.append(f"Flesch reading ease {flesch} is below {FLESCH_TARGET:g}")
+    for keyword, entry in keyword_report.items():
+        if not entry["count"]:
+            warnings.append(f"Keyword '{keyword}' does not appear")
+        elif entry["density"] > KEYWORD_DENSITY_MAX:
+            warnings.append(f"Keyword '{keyword}' density {entry['density']}% is above {KEYWORD_DENSITY_MAX:g}%")
+        elif entry["density"] < KEYWORD_DENSITY_MIN:
+            warnings.append(f"Keyword '{keyword}' density {entry['density']}% is below {KEYWORD_DENSITY_MIN:g}%")
+    if words and not headings["h1"]:
+        warnings.append("Article has no H1 title")
+
+    report = {
+        "words": words,
+        "sentences": sentences,
+        **headings,
+        "flesch_reading_ease": flesch,
+        "keywords": keyword_report,
+        "fixes": {kind: count for kind, count in fixes.items() if count},
+        "warnings": warnings,
+        "seconds": round(time.perf_counter() - started, 4),
+    }
+    if stage:
+        record_postprocess(stage, fixes, flesch)
+    return "\n".join(out), report
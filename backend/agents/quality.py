@@ -0,0 +1,144 @@
+import math
+import os
+import re
+
+from agents.postprocess import postprocess
+from agents.sections import join_sections, split_sections
+from agents.telemetry import job_truncations, record_gate
+
+# Local quality gates after the writer, SEO and humanizer: length, H2 count, keyword coverage and
+# truncation. A failing gate re-requests only the missing part instead of re-running the whole stage.
+QUALITY_GATES = os.getenv("QUALITY_GATES", "true").lower() in ("true", "1", "yes")
+# Continuation calls per answer that stopped at its token cap (stop_reason max_tokens / finish_reason length)
+MAX_CONTINUATIONS = int(os.getenv("MAX_CONTINUATIONS", "2"))
+# A draft under this share of its target length gets extra sections
+MIN_LENGTH_RATIO = float(os.getenv("MIN_LENGTH_RATIO", "0.85"))
+MIN_H2_SECTIONS = int(os.getenv("MIN_H2_SECTIONS", "5"))
+MAX_EXPANSION_SECTIONS = int(os.getenv("MAX_EXPANSION_SECTIONS", "3"))
+# A section pass returning under this share of the section's words, or without its heading, is redone once
+SECTION_MIN_RATIO = float(os.getenv("SECTION_MIN_RATIO", "0.6"))
+
+# Sent after a cut-off answer on OpenAI-style APIs; Anthropic continues from the partial answer itself
+CONTINUE_PROMPT = (
+    "Your answer was cut off. Continue exactly where it stopped, without repeating anything "
+    "and without any commentary."
+)
+
+_WORD_RE = re.compile(r"\w+")
+_H2_LINE_RE = re.compile(r"^##[ \t]", re.MULTILINE)
+
+
+def count_words(text: str) -> int:
+    return len(_WORD_RE.findall(text))
+
+
+def count_h2(text: str) -> int:
+    return len(_H2_LINE_RE.findall(text))
+
+
+def join_continuation(text: str, more: str) -> str:
+    # A continuation picks up mid-line; only a heading or list item it starts needs a line break first
+    if more.lstrip().startswith(("#", "- ", "* ")) and not text.endswith("\n"):
+        return text.rstrip() + "\n\n" + more.lstrip()
+    return text + more
+
+
+def section_acceptable(original: str, result: str) -> bool:
+    # A reworked section must keep its heading and most of its words, and not spill into other sections
+    if original.startswith("#") and not result.lstrip().startswith("#"):
+        return False
+    if count_h2(result) > count_h2(original):
+        return False
+    return count_words(result) >= SECTION_MIN_RATIO * count_words(original)
+
+
+def evaluate(stage: str, checks: dict, target_words: int = None, min_h2: int = None) -> list:
+    failures = []
+    truncated = ((job_truncations.get() or {}).get(stage) or {}).get("truncated", 0)
+    if truncated:
+        failures.append({"gate": "truncated", "answers": truncated})
+    if target_words and checks["words"] < MIN_LENGTH_RATIO * target_words:
+        failures.append({"gate": "length", "words": checks["words"], "target": target_words})
+    if min_h2 and checks["h2"] < min_h2:
+        failures.append({"gate": "h2_count", "h2": checks["h2"], "minimum": min_h2})
+    missing = [keyword for keyword, entry in checks["keywords"].items() if not entry["count"]]
+    if missing:
+        failures.append({"gate": "keywords", "missing": missing})
+    return failures
+
+
+def describe(failure: dict) -> str:
+    if failure["gate"] == "truncated":
+        return f"{failure['answers']} answer(s) still cut off after {MAX_CONTINUATIONS} continuation(s)"
+    if failure["gate"] == "length":
+        return f"{failure['words']} words, under {MIN_LENGTH_RATIO:.0%} of the {failure['target']}-word target"
+    if failure["gate"] == "h2_count":
+        return f"{failure['h2']} H2 sections, fewer than {failure['minimum']}"
+    return f"Keywords missing: {', '.join(failure['missing'])}"
+
+
+def sections_needed(failures: list, words: int, target_words: int, h2: int, min_h2: int, words_per_section: int) -> int:
+    count = 0
+    for failure in failures:
+        if failure["gate"] == "length":
+            count = max(count, math.ceil((target_words - words) / words_per_section))
+        elif failure["gate"] == "h2_count":
+            count = max(count, min_h2 - h2)
+    return min(count, MAX_EXPANSION_SECTIONS)
+
+
+def insert_sections(article: str, addition: str, count: int) -> str:
+    # New H2 sections go before the last one, which is the conclusion in any article of three or more
+    sections = split_sections(article)
+    new = [section for section in split_sections(addition) if section.startswith("## ")][:count]
+    if not new:
+        return article
+    position = len(sections) - 1 if len(sections) >= 3 else len(sections)
+    return join_sections(sections[:position] + new + sections[position:])
+
+
+def keyword_section(sections: list) -> int:
+    # The longest body section (not the intro or the conclusion) has the most room for another keyword;
+    # None for an empty answer, which has nothing to revise
+    body = range(1, len(sections) - 1) if len(sections) > 2 else range(len(sections))
+    return max(body, key=lambda index: count_words(sections[index]), default=None)
+
+
+async def enforce_gates(stage: str, content: str, checks: dict, keywords: str, target_words: int = None,
+                        min_h2: int = None, words_per_section: int = 450, expand_fn=None, revise_fn=None) -> tuple:
+    # expand_fn(article, count, missing_keywords) -> markdown with `count` new H2 sections
+    # revise_fn(section, sections, missing_keywords) -> the section rewritten to carry the keywords
+    failures = evaluate(stage, checks, target_words, min_h2)
+    repaired = []
+    if failures and QUALITY_GATES:
+        missing = next((failure["missing"] for failure in failures if failure["gate"] == "keywords"), [])
+        count = sections_needed(failures, checks["words"], target_words, checks["h2"], min_h2 or 0, words_per_section)
+        if count and expand_fn is not None:
+            print(f"🩹 {stage}: adding {count} section(s) ({'; '.join(describe(f) for f in failures)})")
+            content = insert_sections(content, await expand_fn(content, count, missing), count)
+            repaired.append("expanded")
+        elif missing and revise_fn is not None:
+            sections = split_sections(content)
+            index = keyword_section(sections)
+            if index is not None:
+                print(f"🩹 {stage}: working {', '.join(missing)} into section {index}")
+                revised = (await revise_fn(sections[index], sections, missing)).strip()
+                if section_acceptable(sections[index], revised):
+                    sections[index] = revised
+                    content = join_sections(sections)
+                    repaired.append("keywords")
+        if repaired:
+            content, checks = postprocess(content, keywords)
+
+    remaining = evaluate(stage, checks, target_words, min_h2) if repaired else failures
+    for failure in failures:
+        record_gate(stage, failure["gate"], "failed")
+        still_failing = any(other["gate"] == failure["gate"] for other in remaining)
+        record_gate(stage, failure["gate"], "remaining" if still_failing else "repaired")
+    checks["gates"] = {
+        "failed": [failure["gate"] for failure in failures],
+        "repairs": repaired,
+        "remaining": remaining,
+    }
+    checks["warnings"] = checks["warnings"] + [describe(failure) for failure in remaining if failure["gate"] != "keywords"]
+    return content, checks
@@ -1,15 +1,33 @@
+import asyncio
 import os
-import requests
 from dotenv import load_dotenv
-from time import sleep
+
+from agents.context_budget import brief_query, estimate_tokens, select_research
+from agents.http_client import ProviderError, post_json, run_sync
+from agents.research_cache import get_cached_research, make_cache_key, store_research
 
 load_dotenv()
 
 PERPLEXITY_API_KEY = os.getenv("PERPLEXITY_API_KEY")
-API_URL = "https://api.perplexity.ai/chat/completions"
+API_URL = os.getenv("PERPLEXITY_API_URL", "https://api.perplexity.ai/chat/completions")
 MODEL = "sonar-pro"
+# Tokens of a similar earlier brief's research passed along as findings to build on
+RESEARCH_SEED_TOKENS = int(os.getenv("RESEARCH_SEED_TOKENS", "2000"))
+
+def format_seed_section(user_input: dict, seed: str) -> str:
+    if not seed:
+        return ""
+    notes = seed if estimate_tokens(seed) <= RESEARCH_SEED_TOKENS else select_research(
+        seed, [brief_query(user_input)], RESEARCH_SEED_TOKENS
+    )
+    return f"""
+== EARLIER RESEARCH ==
+Research done for a very similar brief. Use it as a starting point: verify and update its facts and figures, fill its gaps, and drop anything that does not fit this brief.
+
+{notes}
+"""
 
-def format_research_prompt(user_input: dict) -> str:
+def format_research_prompt(user_input: dict, seed: str = None) -> str:
     topic = user_input.get("topic", "")
     content_direction = user_input.get("subtopic", "")  # Align with user_input field
     draft_title = user_input.get("draft_title", "Untitled")
@@ -56,7 +74,7 @@ The Content directin provides specific context for the main topic. It can be a s
 - Structure Style: {structure}
 - Desired Length: {length}
 - Include Competitor Research: {"Yes" if include_competitors else "No"}
-
+{format_seed_section(user_input, seed)}
 == CONTENT GOAL GUIDANCE ==
 Adapt your research based on the content goal:
 - Educate: Deliver structured, in-depth explanations with clarity. Prioritize factual accuracy, accessible examples, and logical progression of concepts.
@@ -100,11 +118,11 @@ Adapt your research based on the content goal:
 Only return structured, insightful, and synthesized research – no fluff. Prioritize depth over breadth, focusing on the most relevant aspects for the specified audience and content goal.
 """
 
-def run_research_agent(user_input: dict, output_dir: str) -> dict:
+async def run_research_agent_async(user_input: dict, output_dir: str, seed: str = None) -> dict:
     if not PERPLEXITY_API_KEY:
         raise EnvironmentError("PERPLEXITY_API_KEY not set in .env")
 
-    prompt = format_research_prompt(user_input)
+    prompt = format_research_prompt(user_input, seed)
 
     headers = {
         "Authorization": f"Bearer {PERPLEXITY_API_KEY}",
@@ -119,38 +137,49 @@ def run_research_agent(user_input: dict, output_dir: str) -> dict:
         "top_p": 0.9
     }
 
-    MAX_RETRIES = 3
-    RETRY_DELAY = 1.5
-
-    for attempt in range(MAX_RETRIES):
-        try:
-            response = requests.post(API_URL, headers=headers, json=payload)
-            response.raise_for_status()
-            data = response.json()
-
-            if "choices" not in data or not data["choices"]:
-                raise ValueError("Unexpected API response structure")
-
-            content = data["choices"][0]["message"]["content"]
-            # Save research summary to output folder
-            research_path = os.path.join(output_dir, "research.txt")
-            with open(research_path, "w", encoding="utf-8") as f:
-                f.write(content.strip())
-
-            return {
-                "agent": "ResearchAgent",
-                "prompt": prompt.strip(),
-                "result": content.strip()
-            }
-
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 429:
-                print(f"Rate limited. Retrying in {RETRY_DELAY ** (attempt + 1)} seconds...")
-                sleep(RETRY_DELAY ** (attempt + 1))
-                continue
-            print(f"[ResearchAgent] HTTP Error: {e.response.text}")
-            raise
-
-        except KeyError:
-            print("[ResearchAgent] Malformed API response")
-            raise
+    cache_key = make_cache_key(
+        prompt, MODEL, {k: v for k, v in payload.items() if k not in ("model", "messages")}
+    )
+    cached = await asyncio.to_thread(get_cached_research, cache_key)
+    if cached is not None:
+        print("📡 ResearchAgent cache hit, skipping Perplexity call")
+        research_path = os.path.join(output_dir, "research.txt")
+        with open(research_path, "w", encoding="utf-8") as f:
+            f.write(cached)
+
+        return {
+            "agent": "ResearchAgent",
+            "prompt": prompt.strip(),
+            "result": cached,
+            "cached": True
+        }
+
+    try:
+        data = await post_json(API_URL, headers, payload, provider="perplexity", stage="research")
+
+        if "choices" not in data or not data["choices"]:
+            raise ValueError("Unexpected API response structure")
+
+        content = data["choices"][0]["message"]["content"]
+    except ProviderError as e:
+        print(f"[ResearchAgent] HTTP Error: {e.text}")
+        raise
+    except KeyError:
+        print("[ResearchAgent] Malformed API response")
+        raise
+
+    # Save research summary to output folder
+    research_path = os.path.join(output_dir, "research.txt")
+    with open(research_path, "w", encoding="utf-8") as f:
+        f.write(content.strip())
+    await asyncio.to_thread(store_research, cache_key, content.strip())
+
+    return {
+        "agent": "ResearchAgent",
+        "prompt": prompt.strip(),
+        "result": content.strip(),
+        "cached": False
+    }
+
+def run_research_agent(user_input: dict, output_dir: str, seed: str = None) -> dict:
+    return run_sync(run_research_agent_async, user_input, output_dir, seed)
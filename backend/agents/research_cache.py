@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# Persistent, content-addressed cache for research results
+CACHE_PATH = os.getenv("RESEARCH_CACHE_PATH", os.path.join("cache", "research_cache.sqlite3"))
+CACHE_TTL = float(os.getenv("RESEARCH_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("RESEARCH_CACHE_MAX_ENTRIES", "500"))
+CACHE_ENABLED = os.getenv("RESEARCH_CACHE_ENABLED", "true").lower() in ("true", "1", "yes")
+
+_stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+# One reused connection per thread, with the schema created once; async callers go through asyncio.to_thread
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+def _connect_thread() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = sqlite3.connect(CACHE_PATH, timeout=10)
+    return conn
+
+
+def _connect() -> sqlite3.Connection:
+    global _schema_ready
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                directory = os.path.dirname(CACHE_PATH)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with _connect_thread() as conn:
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS research_cache ("
+                        " key TEXT PRIMARY KEY,"
+                        " content TEXT NOT NULL,"
+                        " created_at REAL NOT NULL,"
+                        " last_accessed REAL NOT NULL)"
+                    )
+                    conn.execute("CREATE INDEX IF NOT EXISTS idx_research_cache_lru ON research_cache (last_accessed)")
+                _schema_ready = True
+    return _connect_thread()
+
+
+def normalize_prompt(prompt: str) -> str:
+    return _WHITESPACE_RE.sub(" ", prompt).strip().lower()
+
+
+def make_cache_key(prompt: str, model: str, params: dict) -> str:
+    material = json.dumps(
+        {"prompt": normalize_prompt(prompt), "model": model, "params": params},
+        sort_keys=True,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def get_cached_research(key: str):
+    if not CACHE_ENABLED:
+        return None
+
+    now = time.time()
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT content, created_at FROM research_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            _stats["misses"] += 1
+            return None
+
+        content, created_at = row
+        if now - created_at > CACHE_TTL:
+            conn.execute("DELETE FROM research_cache WHERE key = ?", (key,))
+            _stats["expired"] += 1
+            _stats["misses"] += 1
+            return None
+
+        conn.execute("UPDATE research_cache SET last_accessed = ? WHERE key = ?", (now, key))
+    _stats["hits"] += 1
+    return content
+
+
+def store_research(key: str, content: str):
+    if not CACHE_ENABLED:
+        return
+
+    now = time.time()
+    with _connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO research_cache (key, content, created_at, last_accessed) VALUES (?, ?, ?, ?)",
+            (key, content, now, now),
+        )
+        # Drop expired rows, then evict least recently used entries beyond the size bound
+        conn.execute("DELETE FROM research_cache WHERE created_at < ?", (now - CACHE_TTL,))
+        evicted = conn.execute(
+            "DELETE FROM research_cache WHERE key IN ("
+            " SELECT key FROM research_cache ORDER BY last_accessed DESC LIMIT -1 OFFSET ?)",
+            (CACHE_MAX_ENTRIES,),
+        ).rowcount
+    _stats["evictions"] += max(evicted, 0)
+
+
+def get_cache_stats() -> dict:
+    entries = 0
+    if CACHE_ENABLED:
+        with _connect() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM research_cache").fetchone()[0]
+    lookups = _stats["hits"] + _stats["misses"]
+    return {
+        **_stats,
+        "entries": entries,
+        "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else 0.0,
+        "enabled": CACHE_ENABLED,
+    }
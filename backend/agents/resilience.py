@@ -0,0 +1,231 @@
+import asyncio
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+import aiohttp
+
+from agents.coordination import get_coordinator
+
+PROVIDERS = ["perplexity", "anthropic", "deepseek"]
+
+# Requests per second and burst size for each provider's token bucket
+DEFAULT_RATES = {"perplexity": 0.8, "anthropic": 1.0, "deepseek": 5.0}
+# Seconds to wait for a response (or between streamed chunks)
+DEFAULT_TIMEOUTS = {"perplexity": 180, "anthropic": 300, "deepseek": 600}
+
+MAX_RETRIES = int(os.getenv("PROVIDER_MAX_RETRIES", "4"))
+BACKOFF_BASE = float(os.getenv("PROVIDER_BACKOFF_BASE", "1.0"))
+BACKOFF_MAX = float(os.getenv("PROVIDER_BACKOFF_MAX", "60"))
+CONNECT_TIMEOUT = float(os.getenv("PROVIDER_CONNECT_TIMEOUT", "10"))
+BREAKER_THRESHOLD = int(os.getenv("PROVIDER_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.getenv("PROVIDER_BREAKER_COOLDOWN", "30"))
+
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504, 529}
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        # Take a token now and return how long the caller must wait before using it
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if self.probing or time.monotonic() - self.opened_at < self.cooldown:
+            return False
+        # Half-open once the cooldown has passed: one trial call goes through, the rest fail fast until it resolves
+        self.probing = True
+        return True
+
+    def end_probe(self):
+        # The trial call ended without tripping or closing the breaker (e.g. a 4xx, or it was cancelled)
+        self.probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self) -> bool:
+        self.failures += 1
+        if self.failures >= self.threshold:
+            was_closed = self.opened_at is None
+            self.opened_at = time.monotonic()
+            self.probing = False
+            return was_closed
+        return False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.probing or time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+
+def _env_float(provider: str, suffix: str, default: float) -> float:
+    return float(os.getenv(f"{provider.upper()}_{suffix}", str(default)))
+
+
+_buckets = {
+    provider: TokenBucket(
+        _env_float(provider, "RPS", DEFAULT_RATES[provider]),
+        _env_float(provider, "BURST", max(1.0, DEFAULT_RATES[provider] * 5)),
+    )
+    for provider in PROVIDERS
+}
+_breakers = {provider: CircuitBreaker(BREAKER_THRESHOLD, BREAKER_COOLDOWN) for provider in PROVIDERS}
+_metrics = {
+    provider: {
+        "calls": 0,
+        "attempts": 0,
+        "retries": 0,
+        "failures": 0,
+        "rate_limited": 0,
+        "timeouts": 0,
+        "circuit_rejections": 0,
+        "circuit_opens": 0,
+        "rate_limit_wait_seconds": 0.0,
+        "backoff_wait_seconds": 0.0,
+    }
+    for provider in PROVIDERS
+}
+
+
+def get_timeout(provider: str, streaming: bool = False) -> aiohttp.ClientTimeout:
+    seconds = _env_float(provider, "TIMEOUT", DEFAULT_TIMEOUTS.get(provider, 300))
+    if streaming:
+        # Bound the gap between chunks rather than the whole stream
+        return aiohttp.ClientTimeout(total=None, sock_connect=CONNECT_TIMEOUT, sock_read=seconds)
+    return aiohttp.ClientTimeout(total=seconds, sock_connect=CONNECT_TIMEOUT)
+
+
+def _retry_after(headers: dict) -> float:
+    value = (headers or {}).get("Retry-After") or (headers or {}).get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: float = None) -> float:
+    # Full jitter exponential backoff, never shorter than the provider's Retry-After
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, BACKOFF_MAX))
+    return delay
+
+
+def _classify(error: Exception):
+    # Returns (retryable, retry_after, trips_breaker); HTTP errors carry a status code
+    status = getattr(error, "status", None)
+    if isinstance(status, int):
+        retryable = status in RETRYABLE_STATUSES
+        return retryable, _retry_after(getattr(error, "headers", None)), status >= 500
+    if isinstance(error, (asyncio.TimeoutError, aiohttp.ServerTimeoutError)):
+        return True, None, True
+    if isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, ConnectionResetError)):
+        return True, None, True
+    return False, None, False
+
+
+async def call_with_retries(provider: str, attempt_fn, call_stats: dict = None):
+    # Run one provider call with rate limiting, retries and circuit breaking;
+    # call_stats, if given, receives this call's retry count
+    if provider not in _metrics:
+        return await attempt_fn()
+
+    metrics = _metrics[provider]
+    breaker = _breakers[provider]
+    bucket = _buckets[provider]
+    metrics["calls"] += 1
+
+    for attempt in range(MAX_RETRIES + 1):
+        if not breaker.allow():
+            metrics["circuit_rejections"] += 1
+            raise CircuitOpenError(f"{provider} circuit is open after repeated failures, failing fast")
+        probe = breaker.probing
+
+        try:
+            # Shared across workers when a coordination backend is configured
+            wait = await get_coordinator().reserve_token(provider, bucket)
+            if wait > 0:
+                metrics["rate_limit_wait_seconds"] += wait
+                await asyncio.sleep(wait)
+
+            metrics["attempts"] += 1
+            result = await attempt_fn()
+        except Exception as e:
+            retryable, retry_after, trips_breaker = _classify(e)
+            if isinstance(e, (asyncio.TimeoutError, aiohttp.ServerTimeoutError)):
+                metrics["timeouts"] += 1
+            if getattr(e, "status", None) == 429:
+                metrics["rate_limited"] += 1
+            if trips_breaker and breaker.record_failure():
+                metrics["circuit_opens"] += 1
+                print(f"⚡ {provider} circuit opened")
+            if probe:
+                breaker.end_probe()
+            if not retryable or attempt == MAX_RETRIES:
+                metrics["failures"] += 1
+                raise
+            delay = backoff_delay(attempt, retry_after)
+            metrics["retries"] += 1
+            metrics["backoff_wait_seconds"] += delay
+            if call_stats is not None:
+                call_stats["retries"] = call_stats.get("retries", 0) + 1
+            print(f"🔁 {provider} call failed ({e.__class__.__name__}), retrying in {delay:.1f}s...")
+            await asyncio.sleep(delay)
+            continue
+        except BaseException:
+            # Cancelled mid-probe: let the next caller try
+            if probe:
+                breaker.end_probe()
+            raise
+
+        breaker.record_success()
+        return result
+
+
+def get_resilience_stats() -> dict:
+    return {
+        provider: {
+            **{k: round(v, 3) if isinstance(v, float) else v for k, v in _metrics[provider].items()},
+            "circuit": _breakers[provider].state,
+        }
+        for provider in PROVIDERS
+    }
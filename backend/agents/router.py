@@ -0,0 +1,212 @@
+import asyncio
+import os
+import time
+from collections import deque
+
+from agents.telemetry import record_route
+
+# Per-stage model routing: ordered fallbacks, hedged requests and latency-SLO ordering.
+# A route is a list of "provider:model" targets; agents supply the call for one target.
+LATENCY_HORIZON = float(os.getenv("ROUTER_LATENCY_HORIZON", "900"))
+LATENCY_SAMPLES = int(os.getenv("ROUTER_LATENCY_SAMPLES", "50"))
+# A target needs this many recent calls before its latency can demote it
+MIN_SAMPLES = int(os.getenv("ROUTER_MIN_SAMPLES", "5"))
+
+ROUTES = {}
+# (stage, target name) -> deque of (finished_at, seconds, first_token_seconds)
+_latencies = {}
+_stats = {}
+
+
+def parse_route(spec: str) -> list:
+    # "deepseek:deepseek-reasoner,deepseek:deepseek-chat" -> [{"provider", "model", "name"}, ...]
+    targets = []
+    for item in spec.split(","):
+        provider, _, model = item.strip().partition(":")
+        if provider and model:
+            targets.append({"provider": provider, "model": model, "name": f"{provider}:{model}"})
+    return targets
+
+
+def register_route(stage: str, spec: str, hedge_after: float = 0.0, latency_slo: float = 0.0,
+                   attempt_timeout: float = None):
+    # hedge_after: seconds without a first token before the next target is started alongside (0 disables)
+    # latency_slo: targets whose recent p90 exceeds it are tried after the ones that meet it (0 disables)
+    targets = parse_route(spec)
+    if not targets:
+        raise ValueError(f"Route for {stage} has no provider:model targets: {spec!r}")
+    ROUTES[stage] = {
+        "targets": targets,
+        "hedge_after": hedge_after,
+        "latency_slo": latency_slo,
+        "attempt_timeout": attempt_timeout or None,
+    }
+    _stats.setdefault(stage, {"calls": 0, "hedges": 0, "fallbacks": 0, "exhausted": 0, "targets": {}})
+    for target in targets:
+        _stats[stage]["targets"].setdefault(
+            target["name"], {"attempts": 0, "won": 0, "failed": 0, "cancelled": 0, "timeouts": 0}
+        )
+
+
+def _percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def _recent(stage: str, name: str) -> list:
+    samples = _latencies.get((stage, name))
+    if not samples:
+        return []
+    cutoff = time.monotonic() - LATENCY_HORIZON
+    while samples and samples[0][0] < cutoff:
+        samples.popleft()
+    return list(samples)
+
+
+def recent_latency(stage: str, name: str, q: float = 0.9) -> float:
+    samples = _recent(stage, name)
+    if len(samples) < MIN_SAMPLES:
+        return None
+    return _percentile([seconds for _, seconds, _ in samples], q)
+
+
+def ordered_targets(stage: str) -> list:
+    # Targets over the SLO keep their relative order but move behind the rest; once their samples
+    # age out of the horizon they get their place back and are measured again
+    route = ROUTES[stage]
+    if not route["latency_slo"]:
+        return list(route["targets"])
+    within, over = [], []
+    for target in route["targets"]:
+        p90 = recent_latency(stage, target["name"])
+        (over if p90 is not None and p90 > route["latency_slo"] else within).append(target)
+    return within + over
+
+
+def _record_latency(stage: str, name: str, seconds: float, first_token: float):
+    samples = _latencies.setdefault((stage, name), deque(maxlen=LATENCY_SAMPLES))
+    samples.append((time.monotonic(), seconds, first_token))
+
+
+async def call_routed(stage: str, call_fn, outcome: dict = None):
+    # call_fn(target, on_first_token) runs one attempt and calls on_first_token() when the first
+    # output arrives. The first attempt to do so wins and the others are cancelled; an attempt that
+    # fails falls through to the next target. The last error is raised if every target fails.
+    # outcome, if given, receives the winning target under "target".
+    route = ROUTES[stage]
+    stats = _stats[stage]
+    stats["calls"] += 1
+    queue = ordered_targets(stage)
+    running = {}
+    committed = None
+    last_error = None
+    last_launch = 0.0
+
+    def launch(target: dict):
+        nonlocal last_launch
+        started = time.monotonic()
+        attempt = {"target": target, "started": started, "first_token": None}
+
+        def on_first_token():
+            nonlocal committed
+            if attempt["first_token"] is None:
+                attempt["first_token"] = time.monotonic() - started
+            if committed is None:
+                committed = task
+                for other in running:
+                    if other is not task:
+                        other.cancel()
+
+        coro = call_fn(target, on_first_token)
+        if route["attempt_timeout"]:
+            coro = asyncio.wait_for(coro, route["attempt_timeout"])
+        task = asyncio.create_task(coro)
+        running[task] = attempt
+        last_launch = started
+        stats["targets"][target["name"]]["attempts"] += 1
+
+    try:
+        if queue:
+            launch(queue.pop(0))
+        while running:
+            timeout = None
+            if committed is None and queue and route["hedge_after"] and len(running) == 1:
+                timeout = max(0.0, route["hedge_after"] - (time.monotonic() - last_launch))
+            done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # No output yet from the current attempt: race the next target against it
+                stats["hedges"] += 1
+                launch(queue.pop(0))
+                continue
+
+            for task in done:
+                attempt = running.pop(task)
+                name = attempt["target"]["name"]
+                target_stats = stats["targets"][name]
+                seconds = time.monotonic() - attempt["started"]
+                if task.cancelled():
+                    target_stats["cancelled"] += 1
+                    record_route(stage, name, "cancelled", seconds)
+                    continue
+                error = task.exception()
+                if error is None:
+                    for other in running:
+                        other.cancel()
+                    target_stats["won"] += 1
+                    record_route(stage, name, "won", seconds)
+                    _record_latency(stage, name, seconds, attempt["first_token"])
+                    if outcome is not None:
+                        outcome["target"] = attempt["target"]
+                    return task.result()
+                last_error = error
+                target_stats["failed"] += 1
+                if isinstance(error, asyncio.TimeoutError):
+                    target_stats["timeouts"] += 1
+                record_route(stage, name, "failed", seconds)
+                # A failure is sampled as at least the attempt timeout and twice the SLO, so a target that keeps
+                # failing or timing out is demoted instead of keeping its old latency history
+                penalty = max(seconds, route["attempt_timeout"] or 0, 2 * route["latency_slo"])
+                _record_latency(stage, name, penalty, None)
+                print(f"🔀 {stage} attempt on {name} failed ({error.__class__.__name__}: {error})")
+                if task is committed:
+                    committed = None
+
+            if not running and queue:
+                stats["fallbacks"] += 1
+                print(f"🔀 {stage} falling back to {queue[0]['name']}")
+                launch(queue.pop(0))
+    finally:
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+
+    stats["exhausted"] += 1
+    if last_error is None:
+        raise RuntimeError(f"No {stage} route target could be attempted")
+    raise last_error
+
+
+def get_router_stats() -> dict:
+    stages = {}
+    for stage, route in ROUTES.items():
+        targets = {}
+        for target in ordered_targets(stage):
+            samples = _recent(stage, target["name"])
+            seconds = [sample[1] for sample in samples]
+            first_tokens = [sample[2] for sample in samples if sample[2] is not None]
+            targets[target["name"]] = {
+                **_stats[stage]["targets"][target["name"]],
+                "recent_samples": len(samples),
+                "p50_seconds": round(_percentile(seconds, 0.5), 3) if seconds else None,
+                "p90_seconds": round(_percentile(seconds, 0.9), 3) if seconds else None,
+                "p50_first_token_seconds": round(_percentile(first_tokens, 0.5), 3) if first_tokens else None,
+            }
+        stages[stage] = {
+            **{key: value for key, value in _stats[stage].items() if key != "targets"},
+            "hedge_after": route["hedge_after"],
+            "latency_slo": route["latency_slo"],
+            "attempt_timeout": route["attempt_timeout"],
+            "targets": targets,
+        }
+    return stages
@@ -0,0 +1,215 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from agents.context_budget import estimate_tokens
+from agents.telemetry import record_gate, record_prompt_budget, record_section_pass
+
+# Section-level SEO/humanizer passes: unchanged sections are served from a content-addressed cache
+SECTION_PASSES = os.getenv("SECTION_PASSES", "true").lower() in ("true", "1", "yes")
+SECTION_PASS_CONCURRENCY = int(os.getenv("SECTION_PASS_CONCURRENCY", "4"))
+
+CACHE_PATH = os.getenv("SECTION_CACHE_PATH", os.path.join("cache", "section_cache.sqlite3"))
+CACHE_TTL = float(os.getenv("SECTION_CACHE_TTL", str(30 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("SECTION_CACHE_MAX_ENTRIES", "5000"))
+CACHE_ENABLED = os.getenv("SECTION_CACHE_ENABLED", "true").lower() in ("true", "1", "yes")
+
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+_H2_RE = re.compile(r"^##\s")
+
+
+# One reused connection per thread, with the schema created once; async callers go through asyncio.to_thread
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+def _connect_thread() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = sqlite3.connect(CACHE_PATH, timeout=10)
+    return conn
+
+
+def _connect() -> sqlite3.Connection:
+    global _schema_ready
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                directory = os.path.dirname(CACHE_PATH)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with _connect_thread() as conn:
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS section_cache ("
+                        " key TEXT PRIMARY KEY,"
+                        " content TEXT NOT NULL,"
+                        " created_at REAL NOT NULL,"
+                        " last_accessed REAL NOT NULL)"
+                    )
+                    conn.execute("CREATE INDEX IF NOT EXISTS idx_section_cache_lru ON section_cache (last_accessed)")
+                _schema_ready = True
+    return _connect_thread()
+
+
+def split_sections(article: str) -> list:
+    # The preamble (H1 + intro) is section 0, then one section per H2 with everything up to the next H2
+    sections = []
+    current = []
+    in_fence = False
+    for line in article.strip().splitlines():
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+        if not in_fence and _H2_RE.match(line) and current:
+            sections.append("\n".join(current).strip())
+            current = []
+        current.append(line)
+    if current:
+        sections.append("\n".join(current).strip())
+    return [section for section in sections if section]
+
+
+def join_sections(sections: list) -> str:
+    return "\n\n".join(section.strip() for section in sections if section.strip())
+
+
+def section_outline(sections: list) -> str:
+    # First line of every section (the H1/H2 headings) as context for a single-section prompt
+    return "\n".join(section.splitlines()[0] for section in sections)
+
+
+def section_key(stage: str, model: str, section: str, brief: dict, context: str = "") -> str:
+    material = json.dumps(
+        {"stage": stage, "model": model, "section": section.strip(), "brief": brief, "context": context},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def get_cached_section(key: str):
+    if not CACHE_ENABLED:
+        return None
+
+    now = time.time()
+    with _connect() as conn:
+        row = conn.execute("SELECT content, created_at FROM section_cache WHERE key = ?", (key,)).fetchone()
+        if row is None or now - row[1] > CACHE_TTL:
+            _stats["misses"] += 1
+            return None
+        conn.execute("UPDATE section_cache SET last_accessed = ? WHERE key = ?", (now, key))
+    _stats["hits"] += 1
+    return row[0]
+
+
+def store_section(key: str, content: str):
+    if not CACHE_ENABLED:
+        return
+
+    now = time.time()
+    with _connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO section_cache (key, content, created_at, last_accessed) VALUES (?, ?, ?, ?)",
+            (key, content, now, now),
+        )
+        conn.execute("DELETE FROM section_cache WHERE created_at < ?", (now - CACHE_TTL,))
+        evicted = conn.execute(
+            "DELETE FROM section_cache WHERE key IN ("
+            " SELECT key FROM section_cache ORDER BY last_accessed DESC LIMIT -1 OFFSET ?)",
+            (CACHE_MAX_ENTRIES,),
+        ).rowcount
+    _stats["evictions"] += max(evicted, 0)
+
+
+def get_section_cache_stats() -> dict:
+    entries = 0
+    if CACHE_ENABLED:
+        with _connect() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM section_cache").fetchone()[0]
+    lookups = _stats["hits"] + _stats["misses"]
+    return {
+        **_stats,
+        "entries": entries,
+        "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else 0.0,
+        "enabled": CACHE_ENABLED,
+        "section_passes": SECTION_PASSES,
+    }
+
+
+class OrderedTokenRelay:
+    # Forwards deltas from concurrently processed parts in article order, buffering parts that run ahead
+    def __init__(self, count: int, on_token):
+        self.on_token = on_token
+        self.buffers = [[] for _ in range(count)]
+        self.done = [False] * count
+        self.head = 0
+        # on_token may yield (e.g. publishing to a shared event log); keep emits and flushes in order
+        self.lock = asyncio.Lock()
+
+    async def emit(self, index: int, delta: str):
+        async with self.lock:
+            if index == self.head:
+                await self.on_token(delta)
+            else:
+                self.buffers[index].append(delta)
+
+    async def finish(self, index: int):
+        async with self.lock:
+            self.done[index] = True
+            while self.head < len(self.done) and self.done[self.head]:
+                self.head += 1
+                if self.head < len(self.done):
+                    await self.on_token("\n\n")
+                    for delta in self.buffers[self.head]:
+                        await self.on_token(delta)
+                    self.buffers[self.head] = []
+
+
+async def process_sections(stage: str, article: str, key_fn, process_fn, on_token=None, accept=None,
+                           cacheable=None) -> str:
+    # key_fn(index, sections) -> cache key; process_fn(index, sections, on_token) -> processed section text;
+    # accept(original, result) -> False has that one section processed again (once, without streaming);
+    # cacheable(index) -> False keeps that section's result out of the cache
+    sections = split_sections(article)
+    relay = OrderedTokenRelay(len(sections), on_token) if on_token else None
+    semaphore = asyncio.Semaphore(max(1, SECTION_PASS_CONCURRENCY))
+    reused = 0
+
+    async def run(index: int) -> str:
+        nonlocal reused
+        key = key_fn(index, sections)
+        result = await asyncio.to_thread(get_cached_section, key)
+        if result is not None:
+            reused += 1
+            # The whole prompt for this section was skipped
+            record_prompt_budget(stage, estimate_tokens(sections[index]), 0)
+            if relay:
+                await relay.emit(index, result)
+        else:
+            async def forward(delta: str):
+                await relay.emit(index, delta)
+
+            async with semaphore:
+                result = (await process_fn(index, sections, forward if relay else None)).strip()
+                if accept is not None and not accept(sections[index], result):
+                    print(f"🩹 {stage}: section {index} came back short or without its heading, redoing it")
+                    retry = (await process_fn(index, sections, None)).strip()
+                    if accept(sections[index], retry) or len(retry) > len(result):
+                        result = retry
+                    record_gate(stage, "section", "repaired" if accept(sections[index], result) else "remaining")
+            if cacheable is None or cacheable(index):
+                await asyncio.to_thread(store_section, key, result)
+        if relay:
+            await relay.finish(index)
+        return result
+
+    results = await asyncio.gather(*(run(index) for index in range(len(sections))))
+    record_section_pass(stage, reused, len(sections) - reused)
+    print(f"♻️ {stage}: reused {reused}/{len(sections)} sections, processed {len(sections) - reused}")
+    return join_sections(results)
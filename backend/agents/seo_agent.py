@@ -1,12 +1,45 @@
 import os
-import requests
 from dotenv import load_dotenv
 
+from agents.context_budget import compact_seo_context
+from agents.http_client import run_sync, stream_sse
+from agents.postprocess import postprocess
+from agents.quality import (
+    CONTINUE_PROMPT,
+    MAX_CONTINUATIONS,
+    enforce_gates,
+    join_continuation,
+    section_acceptable,
+)
+from agents.router import call_routed, register_route
+from agents.sections import SECTION_PASSES, process_sections, section_key, section_outline
+from agents.telemetry import record_continuation
+
 load_dotenv()
 
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
-
-def format_seo_prompt(user_input: dict, draft_article: str) -> str:
+API_URL = os.getenv("DEEPSEEK_API_URL", "https://api.deepseek.com/v1/chat/completions")
+SEO_MODEL = os.getenv("SEO_MODEL", "deepseek-reasoner")
+SEO_FALLBACK_MODEL = os.getenv("SEO_FALLBACK_MODEL", "deepseek-chat")
+# Tried in order; any OpenAI-compatible provider with <PROVIDER>_API_URL and <PROVIDER>_API_KEY can be added
+SEO_ROUTE = os.getenv("SEO_ROUTE", f"deepseek:{SEO_MODEL},deepseek:{SEO_FALLBACK_MODEL}")
+SEO_MAX_TOKENS = int(os.getenv("SEO_MAX_TOKENS", "8192"))
+# Seconds without a first streamed token (reasoning counts) before the next model is raced against it
+SEO_HEDGE_AFTER = float(os.getenv("SEO_HEDGE_AFTER", "60"))
+# Models whose recent p90 exceeds this many seconds are tried after the ones that meet it
+SEO_LATENCY_SLO = float(os.getenv("SEO_LATENCY_SLO", "180"))
+SEO_ATTEMPT_TIMEOUT = float(os.getenv("SEO_ATTEMPT_TIMEOUT", "420"))
+
+register_route("seo", SEO_ROUTE, SEO_HEDGE_AFTER, SEO_LATENCY_SLO, SEO_ATTEMPT_TIMEOUT)
+
+# Brief fields that shape the SEO prompt; a section is re-optimized when any of them changes
+SEO_BRIEF_FIELDS = (
+    "draft_title", "keywords", "target_audience", "tonality", "content_goal", "structure_style",
+    "article_length", "industry_vertical", "audience_pain_points", "geographic_focus", "reading_level",
+    "reference_brands", "call_to_action", "include_competitors",
+)
+
+def format_seo_prompt(user_input: dict, draft_article: str, outline: str = None, missing_keywords: list = None) -> str:
     title = user_input.get("draft_title", "Untitled")
     content_direction = user_input.get("content_direction", "")
     keywords = user_input.get("keywords", "")
@@ -30,18 +63,34 @@ def format_seo_prompt(user_input: dict, draft_article: str) -> str:
     }
     length_value = length_map.get(length, 2000)
 
+    if outline:
+        # Single-section pass: the rest of the article is handled by parallel calls
+        scope = f"""
+== SECTION SCOPE ==
+The text below is one section of a longer article with this outline:
+{outline}
+Optimize only this section. Keep its heading line as is, do not add a title, and do not write other sections.
+Keep the section at roughly its current length.
+"""
+        length_note = ""
+    else:
+        scope = ""
+        length_note = f"""
+== LENGTH ==
+Target length is approximately {length_value} words. Retain or expand only if valuable — no padding.
+"""
+
     return f"""You are an expert SEO content optimizer.
 
 Your task is to improve the following article using advanced SEO techniques and user-aligned strategy.
 
 == SEO STRATEGY ==
-1. Integrate primary and related keywords naturally: {keywords}
+1. Integrate primary and related keywords naturally: {keywords}{f" (the article does not use these yet: {', '.join(missing_keywords)})" if missing_keywords else ""}
 2. Add relevant internal and external references if suitable
 3. Improve structure using proper headers (H1 for title, H2/H3 for sections)
 4. Enhance clarity, depth, and examples — especially for audience pain points
 5. Maintain tone: {tone}, and reflect reader expectations
-6. Aim for Flesch Reading Ease > 60
-7. Avoid robotic or generic phrasing
+6. Avoid robotic or generic phrasing
 
 == EEAT + HELPFUL CONTENT PRINCIPLES ==
 - Experience: Add real examples or context
@@ -62,10 +111,7 @@ Your task is to improve the following article using advanced SEO techniques and
 - Brands to Match: {brands}
 - Include Competitor Context: {"Yes" if include_competitors else "No"}
 - Suggested CTA: {call_to_action or "N/A"}
-
-== LENGTH ==
-Target length is approximately {length_value} words. Retain or expand only if valuable — no padding.
-
+{length_note}{scope}
 == ARTICLE TO OPTIMIZE ==
 {draft_article}
 
@@ -75,32 +121,112 @@ Target length is approximately {length_value} words. Retain or expand only if va
 - Do NOT remove original ideas — only improve them
 """
 
-def run_seo_agent(user_input: dict, draft_article: str, output_dir: str) -> dict:
+def _endpoint(provider: str) -> tuple:
+    if provider == "deepseek":
+        return API_URL, DEEPSEEK_API_KEY
+    return os.getenv(f"{provider.upper()}_API_URL"), os.getenv(f"{provider.upper()}_API_KEY")
+
+async def _optimize(prompt: str, outcome: dict = None) -> str:
+    messages = [
+        {"role": "system", "content": "You are an expert SEO content editor."},
+        {"role": "user", "content": prompt.strip()}
+    ]
+
+    async def attempt(target: dict, on_first_token) -> str:
+        url, api_key = _endpoint(target["provider"])
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        payload = {
+            "model": target["model"],
+            "messages": messages,
+            "max_tokens": SEO_MAX_TOKENS,
+            "stream": True,
+            "stream_options": {"include_usage": True},
+        }
+
+        async def request() -> tuple:
+            # Streamed so the router can see the first token. A reasoning model streams reasoning_content
+            # long before its answer, so that counts as the first byte; only content is kept
+            parts = []
+            finish_reason = None
+            async for chunk in stream_sse(url, headers, payload, provider=target["provider"], stage="seo"):
+                choices = chunk.get("choices") or [{}]
+                delta = choices[0].get("delta", {})
+                if delta.get("content") or delta.get("reasoning_content"):
+                    on_first_token()
+                if delta.get("content"):
+                    parts.append(delta["content"])
+                finish_reason = choices[0].get("finish_reason") or finish_reason
+            return "".join(parts), finish_reason
+
+        text, finish_reason = await request()
+        if not text:
+            raise ValueError(f"{target['name']} returned an empty response")
+        for _ in range(MAX_CONTINUATIONS):
+            if finish_reason != "length":
+                break
+            # Cut off at SEO_MAX_TOKENS: the same model is asked for the rest only
+            record_continuation("seo", target["provider"], "continued")
+            payload["messages"] = messages + [
+                {"role": "assistant", "content": text},
+                {"role": "user", "content": CONTINUE_PROMPT},
+            ]
+            more, finish_reason = await request()
+            text = join_continuation(text, more)
+        if finish_reason == "length":
+            record_continuation("seo", target["provider"], "truncated")
+        return text
+
+    return await call_routed("seo", attempt, outcome)
+
+async def optimize_by_section(user_input: dict, draft_article: str) -> str:
+    brief = {field: user_input.get(field) for field in SEO_BRIEF_FIELDS}
+
+    def key(index: int, sections: list) -> str:
+        # The outline is context only, so renaming one heading does not invalidate every section
+        return section_key("seo", SEO_MODEL, sections[index], brief)
+
+    # Sections a fallback model answered are not cached: the key names SEO_MODEL
+    fallback_answers = set()
+
+    async def optimize(index: int, sections: list, on_token=None) -> str:
+        prompt = format_seo_prompt(user_input, compact_seo_context(sections[index]), section_outline(sections))
+        outcome = {}
+        result = await _optimize(prompt, outcome)
+        if outcome["target"]["model"] != SEO_MODEL:
+            fallback_answers.add(index)
+        return result
+
+    return await process_sections("seo", draft_article, key, optimize, accept=section_acceptable,
+                                  cacheable=lambda index: index not in fallback_answers)
+
+async def run_seo_agent_async(user_input: dict, draft_article: str, output_dir: str) -> dict:
     if not DEEPSEEK_API_KEY:
         raise EnvironmentError("DEEPSEEK_API_KEY not set in .env")
 
-    prompt = format_seo_prompt(user_input, draft_article)
+    if SECTION_PASSES:
+        # Only sections whose text, outline or brief changed since a previous pass are sent
+        prompt = format_seo_prompt(user_input, "<one section at a time>", "<article outline>")
+        content = await optimize_by_section(user_input, draft_article)
+    else:
+        prompt = format_seo_prompt(user_input, compact_seo_context(draft_article))
+        content = await _optimize(prompt)
 
-    url = "https://api.deepseek.com/v1/chat/completions"
+    # Readability and keyword density are measured locally rather than asked of the model
+    content, checks = postprocess(content, user_input.get("keywords", ""), "seo")
 
-    headers = {
-        "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-        "Content-Type": "application/json"
-    }
+    async def revise(section: str, sections: list, missing_keywords: list) -> str:
+        return await _optimize(format_seo_prompt(user_input, section, section_outline(sections), missing_keywords))
 
-    payload = {
-        "model": "deepseek-reasoner",
-        "messages": [
-            {"role": "system", "content": "You are an expert SEO content editor."},
-            {"role": "user", "content": prompt.strip()}
-        ]
-    }
-
-    response = requests.post(url, headers=headers, json=payload)
-    response.raise_for_status()
-
-    data = response.json()
-    content = data["choices"][0]["message"]["content"]
+    # Optimizing should not shrink the draft or drop its sections (measured by the same pass as the output);
+    # missing keywords go into one section
+    _, target = postprocess(draft_article)
+    content, checks = await enforce_gates(
+        "seo", content, checks, user_input.get("keywords", ""),
+        target_words=target["words"], min_h2=target["h2"], revise_fn=revise,
+    )
 
     # Save SEO output to output folder
     seo_path = os.path.join(output_dir, "seo.md")
@@ -110,5 +236,9 @@ def run_seo_agent(user_input: dict, draft_article: str, output_dir: str) -> dict
     return {
         "agent": "SEOAgent",
         "prompt": prompt.strip(),
-        "optimized_article": content
+        "optimized_article": content,
+        "checks": checks
     }
+
+def run_seo_agent(user_input: dict, draft_article: str, output_dir: str) -> dict:
+    return run_sync(run_seo_agent_async, user_input, draft_article, output_dir)
@@ -0,0 +1,298 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+import numpy as np
+
+# Local near-duplicate index over past briefs (to reuse their research) and final articles (to flag
+# SEO cannibalization). Each entry is a MinHash signature; lookups use LSH banding, so only entries that
+# share a band with the query are scored, however many are stored.
+INDEX_PATH = os.getenv("SIMILARITY_INDEX_PATH", os.path.join("cache", "similarity.sqlite3"))
+SIMILARITY_ENABLED = os.getenv("SIMILARITY_ENABLED", "true").lower() in ("true", "1", "yes")
+NUM_PERM = 64
+# Two rows per band: pairs with a Jaccard similarity of 0.4 share a band with probability > 0.99
+BAND_ROWS = 2
+BANDS = NUM_PERM // BAND_ROWS
+# Upper bound on entries scored per lookup; those sharing the most bands are kept
+MAX_CANDIDATES = int(os.getenv("SIMILARITY_MAX_CANDIDATES", "5000"))
+# New entries' band keys wait in a small unsorted tail (scanned on lookup) and are merged into the
+# sorted arrays once this many entries have piled up, so an add does not copy the whole index
+TAIL_ENTRIES = int(os.getenv("SIMILARITY_TAIL_ENTRIES", "1024"))
+ARTICLE_SHINGLE_WORDS = 5
+
+# Brief fields that decide what the research covers
+BRIEF_FIELDS = ("topic", "subtopic", "content_direction", "target_audience", "industry_vertical",
+                "geographic_focus", "audience_pain_points")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from how i in into is it its of on or our that the their this to "
+    "what when where which who why will with you your vs versus about best guide tips top ways".split()
+)
+SUFFIXES = ("ations", "ation", "ments", "ment", "ings", "ing", "ers", "er", "ies", "es", "ed", "ly", "s")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Fixed seeds: signatures stored by earlier processes must stay comparable
+_MERSENNE = np.uint64((1 << 61) - 1)
+_rng = np.random.default_rng(0x5EED)
+_PERM_A = _rng.integers(1, (1 << 61) - 1, NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, (1 << 61) - 1, NUM_PERM, dtype=np.uint64)
+_BAND_SALT = _rng.integers(0, np.iinfo(np.uint64).max, BANDS, dtype=np.uint64)
+
+_stats = {"lookups": 0, "lookup_seconds": 0.0, "candidates_scored": 0, "added": 0, "removed": 0}
+
+
+def _stem(word: str) -> str:
+    # Just enough stemming to match "managers", "managing" and "management"
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-3] + "y" if suffix == "ies" else word[:-len(suffix)]
+            break
+    return word[:-1] if word.endswith("e") and len(word) > 3 else word
+
+
+def brief_shingles(user_input: dict) -> set:
+    text = " ".join(str(user_input.get(field) or "") for field in BRIEF_FIELDS).lower()
+    return {_stem(word) for word in _WORD_RE.findall(text) if word not in STOPWORDS}
+
+
+def article_shingles(article: str) -> set:
+    words = _WORD_RE.findall(article.lower())
+    size = ARTICLE_SHINGLE_WORDS
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash(shingles: set) -> np.ndarray:
+    if not shingles:
+        return None
+    hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+                         dtype=np.uint64, count=len(shingles))
+    # uint64 products wrap around, which is fine for a hash family
+    permuted = (np.outer(hashes, _PERM_A) + _PERM_B) % _MERSENNE
+    return (permuted.min(axis=0) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+
+def _band_keys(signatures: np.ndarray) -> np.ndarray:
+    # (n, NUM_PERM) uint32 -> (n, BANDS) uint64, one key per band, salted so bands never collide
+    pairs = signatures.reshape(len(signatures), BANDS, BAND_ROWS).astype(np.uint64)
+    return ((pairs[:, :, 0] << np.uint64(32)) | pairs[:, :, 1]) ^ _BAND_SALT
+
+
+def _connect() -> sqlite3.Connection:
+    directory = os.path.dirname(INDEX_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(INDEX_PATH, timeout=10)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS similarity_index ("
+        " kind TEXT NOT NULL,"
+        " job_id TEXT NOT NULL,"
+        " output_dir TEXT,"
+        " label TEXT,"
+        " signature BLOB NOT NULL,"
+        " created_at REAL NOT NULL,"
+        " PRIMARY KEY (kind, job_id))"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_similarity_output_dir ON similarity_index (output_dir)")
+    return conn
+
+
+class SimilarityIndex:
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.count = 0
+        self.entries = []
+        self.rows = {}
+        # output_dir -> rows, so retention can drop a run without scanning every entry
+        self.dir_rows = {}
+        self.signatures = np.empty((0, NUM_PERM), dtype=np.uint32)
+        self.alive = np.empty(0, dtype=bool)
+        # Band keys of every row, sorted, with the row each key belongs to
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.key_rows = np.empty(0, dtype=np.int64)
+        self.tail_keys = np.empty(TAIL_ENTRIES * BANDS, dtype=np.uint64)
+        self.tail_rows = np.empty(TAIL_ENTRIES * BANDS, dtype=np.int64)
+        self.tail_count = 0
+
+    def _load(self):
+        with _connect() as conn:
+            rows = conn.execute(
+                "SELECT job_id, output_dir, label, signature FROM similarity_index WHERE kind = ? ORDER BY created_at",
+                (self.kind,),
+            ).fetchall()
+        self.entries = [{"job_id": row[0], "output_dir": row[1], "label": row[2]} for row in rows]
+        self.rows = {row[0]: index for index, row in enumerate(rows)}
+        self.dir_rows = {}
+        for index, row in enumerate(rows):
+            self.dir_rows.setdefault(row[1], []).append(index)
+        self.count = len(rows)
+        self.signatures = np.frombuffer(b"".join(row[3] for row in rows), dtype=np.uint32).reshape(-1, NUM_PERM).copy()
+        self.alive = np.ones(self.count, dtype=bool)
+        keys = _band_keys(self.signatures).ravel()
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.key_rows = order // BANDS
+        self.tail_count = 0
+        self.loaded = True
+
+    def _ensure_loaded(self):
+        if not self.loaded:
+            self._load()
+
+    def add(self, job_id: str, output_dir: str, label: str, signature: np.ndarray):
+        with self.lock:
+            self._ensure_loaded()
+            if job_id in self.rows:
+                self.alive[self.rows[job_id]] = False
+            if self.count == len(self.signatures):
+                # Grow by doubling so adding stays cheap at 100k+ entries
+                capacity = max(64, 2 * len(self.signatures))
+                grown = np.zeros((capacity, NUM_PERM), dtype=np.uint32)
+                grown[:self.count] = self.signatures[:self.count]
+                self.signatures = grown
+                alive = np.zeros(capacity, dtype=bool)
+                alive[:self.count] = self.alive[:self.count]
+                self.alive = alive
+            row = self.count
+            self.signatures[row] = signature
+            self.alive[row] = True
+            self.count += 1
+            self.entries.append({"job_id": job_id, "output_dir": output_dir, "label": label})
+            self.rows[job_id] = row
+            self.dir_rows.setdefault(output_dir, []).append(row)
+
+            if self.tail_count == len(self.tail_keys):
+                self._merge_tail()
+            start = self.tail_count
+            self.tail_keys[start:start + BANDS] = _band_keys(signature[None, :])[0]
+            self.tail_rows[start:start + BANDS] = row
+            self.tail_count += BANDS
+        with _connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO similarity_index (kind, job_id, output_dir, label, signature, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (self.kind, job_id, output_dir, label, signature.tobytes(), time.time()),
+            )
+        _stats["added"] += 1
+
+    def _merge_tail(self):
+        # One pass over the sorted arrays for TAIL_ENTRIES adds, instead of one per add
+        count = self.tail_count
+        order = np.argsort(self.tail_keys[:count], kind="stable")
+        keys = self.tail_keys[:count][order]
+        positions = np.searchsorted(self.keys, keys)
+        self.keys = np.insert(self.keys, positions, keys)
+        self.key_rows = np.insert(self.key_rows, positions, self.tail_rows[:count][order])
+        self.tail_count = 0
+
+    def remove_output_dir(self, output_dir: str):
+        # Entries are tombstoned in memory and dropped from disk; the arrays are rebuilt on the next load
+        with self.lock:
+            if self.loaded:
+                for row in self.dir_rows.pop(output_dir, []):
+                    if self.alive[row]:
+                        self.alive[row] = False
+                        job_id = self.entries[row]["job_id"]
+                        if self.rows.get(job_id) == row:
+                            del self.rows[job_id]
+                        _stats["removed"] += 1
+        with _connect() as conn:
+            conn.execute("DELETE FROM similarity_index WHERE kind = ? AND output_dir = ?", (self.kind, output_dir))
+
+    def query(self, signature: np.ndarray, limit: int = 5, min_similarity: float = 0.0, exclude: str = None) -> list:
+        started = time.perf_counter()
+        with self.lock:
+            self._ensure_loaded()
+            keys = _band_keys(signature[None, :])[0]
+            lows = np.searchsorted(self.keys, keys, "left")
+            highs = np.searchsorted(self.keys, keys, "right")
+            spans = [self.key_rows[low:high] for low, high in zip(lows, highs) if high > low]
+            if self.tail_count:
+                # Entries added since the last merge, one row per shared band like the sorted spans
+                hits = np.isin(self.tail_keys[:self.tail_count], keys)
+                spans.append(self.tail_rows[:self.tail_count][hits])
+            matches = []
+            if spans:
+                candidates, shared_bands = np.unique(np.concatenate(spans), return_counts=True)
+                live = self.alive[candidates]
+                candidates, shared_bands = candidates[live], shared_bands[live]
+                if len(candidates) > MAX_CANDIDATES:
+                    keep = np.argpartition(-shared_bands, MAX_CANDIDATES)[:MAX_CANDIDATES]
+                    candidates = candidates[keep]
+                _stats["candidates_scored"] += len(candidates)
+                # Estimated Jaccard similarity: the share of MinHash values two signatures agree on
+                scores = (self.signatures[candidates] == signature).mean(axis=1)
+                for index in np.argsort(-scores, kind="stable"):
+                    score = float(scores[index])
+                    if score < min_similarity or len(matches) >= limit:
+                        break
+                    entry = self.entries[candidates[index]]
+                    if entry["job_id"] != exclude:
+                        matches.append({**entry, "similarity": round(score, 3)})
+        _stats["lookups"] += 1
+        _stats["lookup_seconds"] += time.perf_counter() - started
+        return matches
+
+    def size(self) -> int:
+        with self.lock:
+            self._ensure_loaded()
+            return int(self.alive[:self.count].sum())
+
+
+_indexes = {"brief": SimilarityIndex("brief"), "article": SimilarityIndex("article")}
+
+
+def similar_briefs(user_input: dict, limit: int = 5, min_similarity: float = 0.0, exclude: str = None) -> list:
+    signature = minhash(brief_shingles(user_input)) if SIMILARITY_ENABLED else None
+    if signature is None:
+        return []
+    return _indexes["brief"].query(signature, limit, min_similarity, exclude)
+
+
+def similar_articles(article: str, limit: int = 5, min_similarity: float = 0.0, exclude: str = None) -> list:
+    signature = minhash(article_shingles(article)) if SIMILARITY_ENABLED else None
+    if signature is None:
+        return []
+    return _indexes["article"].query(signature, limit, min_similarity, exclude)
+
+
+def index_brief(job_id: str, output_dir: str, user_input: dict):
+    signature = minhash(brief_shingles(user_input)) if SIMILARITY_ENABLED else None
+    if signature is not None:
+        _indexes["brief"].add(job_id, output_dir, user_input.get("topic") or "", signature)
+
+
+def index_article(job_id: str, output_dir: str, article: str, title: str = ""):
+    signature = minhash(article_shingles(article)) if SIMILARITY_ENABLED else None
+    if signature is not None:
+        _indexes["article"].add(job_id, output_dir, title, signature)
+
+
+def forget_run(output_dir: str):
+    if SIMILARITY_ENABLED:
+        for index in _indexes.values():
+            index.remove_output_dir(output_dir)
+
+
+def load_indexes():
+    # Loading 100k entries takes about a second; done at startup, off the event loop
+    if SIMILARITY_ENABLED:
+        for index in _indexes.values():
+            index.size()
+
+
+def get_similarity_stats() -> dict:
+    lookups = _stats["lookups"]
+    return {
+        **{key: value for key, value in _stats.items() if key != "lookup_seconds"},
+        "avg_lookup_ms": round(_stats["lookup_seconds"] / lookups * 1000, 3) if lookups else None,
+        "briefs": _indexes["brief"].size() if SIMILARITY_ENABLED else 0,
+        "articles": _indexes["article"].size() if SIMILARITY_ENABLED else 0,
+        "enabled": SIMILARITY_ENABLED,
+    }
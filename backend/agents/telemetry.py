@@ -0,0 +1,186 @@
+import contextvars
+import math
+
+# Histogram bucket upper bounds
+SECONDS_BUCKETS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600, math.inf]
+BYTES_BUCKETS = [1_000, 5_000, 10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, math.inf]
+TOKENS_BUCKETS = [100, 500, 1_000, 2_000, 4_000, 8_000, 16_000, 32_000, math.inf]
+FLESCH_BUCKETS = [0, 30, 50, 60, 70, 80, 90, math.inf]
+
+# Provider calls made on behalf of the current job (set by the pipeline, inherited by its tasks)
+job_calls = contextvars.ContextVar("job_calls", default=None)
+# Per-stage prompt context sizes before and after compaction for the current job
+job_prompt_budget = contextvars.ContextVar("job_prompt_budget", default=None)
+# Per-stage continuation calls and outputs still truncated after them for the current job
+job_truncations = contextvars.ContextVar("job_truncations", default=None)
+
+_histograms = {}
+_counters = {}
+
+
+def _observe(name: str, buckets: list, labels: tuple, value: float):
+    series = _histograms.setdefault(name, {"buckets": buckets, "series": {}})["series"]
+    entry = series.setdefault(labels, {"counts": [0] * len(buckets), "sum": 0.0, "count": 0})
+    for index, bound in enumerate(buckets):
+        if value <= bound:
+            entry["counts"][index] += 1
+    entry["sum"] += value
+    entry["count"] += 1
+
+
+def _increment(name: str, labels: tuple, value: float = 1):
+    series = _counters.setdefault(name, {})
+    series[labels] = series.get(labels, 0) + value
+
+
+def extract_usage(data: dict) -> dict:
+    # Normalize OpenAI-style (prompt/completion) and Anthropic-style (input/output) usage blocks
+    usage = data.get("usage") or (data.get("message") or {}).get("usage") or {}
+    prompt = usage.get("prompt_tokens", usage.get("input_tokens"))
+    completion = usage.get("completion_tokens", usage.get("output_tokens"))
+    return {
+        key: value
+        for key, value in (("prompt_tokens", prompt), ("completion_tokens", completion))
+        if value is not None
+    }
+
+
+def record_call(
+    stage: str,
+    provider: str,
+    seconds: float,
+    ttfb: float,
+    request_bytes: int,
+    response_bytes: int,
+    usage: dict,
+    retries: int,
+    status: str,
+):
+    labels = (("stage", stage or "unknown"), ("provider", provider or "unknown"))
+    _observe("autoauthor_provider_call_seconds", SECONDS_BUCKETS, labels, seconds)
+    if ttfb is not None:
+        _observe("autoauthor_provider_ttfb_seconds", SECONDS_BUCKETS, labels, ttfb)
+    _observe("autoauthor_provider_request_bytes", BYTES_BUCKETS, labels, request_bytes)
+    _observe("autoauthor_provider_response_bytes", BYTES_BUCKETS, labels, response_bytes)
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if kind in usage:
+            _observe(f"autoauthor_provider_{kind}", TOKENS_BUCKETS, labels, usage[kind])
+            _increment(f"autoauthor_provider_{kind}_total", labels, usage[kind])
+    _increment("autoauthor_provider_calls_total", labels + (("status", status),))
+    _increment("autoauthor_provider_retries_total", labels, retries)
+
+    calls = job_calls.get()
+    if calls is not None:
+        calls.append({
+            "stage": stage,
+            "provider": provider,
+            "seconds": round(seconds, 3),
+            "ttfb_seconds": round(ttfb, 3) if ttfb is not None else None,
+            "request_bytes": request_bytes,
+            "response_bytes": response_bytes,
+            "retries": retries,
+            "status": status,
+            **usage,
+        })
+
+
+def record_route(stage: str, target: str, outcome: str, seconds: float):
+    # One routed attempt: won, failed, or cancelled after another target answered first
+    labels = (("stage", stage), ("target", target))
+    _increment("autoauthor_route_attempts_total", labels + (("outcome", outcome),))
+    if outcome == "won":
+        _observe("autoauthor_route_seconds", SECONDS_BUCKETS, labels, seconds)
+
+
+def record_stage(stage: str, seconds: float):
+    _observe("autoauthor_stage_seconds", SECONDS_BUCKETS, (("stage", stage),), seconds)
+
+
+def record_prompt_budget(stage: str, original_tokens: int, sent_tokens: int):
+    labels = (("stage", stage),)
+    _increment("autoauthor_prompt_context_tokens_total", labels, sent_tokens)
+    _increment("autoauthor_prompt_tokens_saved_total", labels, max(0, original_tokens - sent_tokens))
+
+    budget = job_prompt_budget.get()
+    if budget is not None:
+        # Stages that make several calls (e.g. sectioned drafting) accumulate into one entry
+        entry = budget.setdefault(stage, {"original_tokens": 0, "sent_tokens": 0, "saved_tokens": 0})
+        entry["original_tokens"] += original_tokens
+        entry["sent_tokens"] += sent_tokens
+        entry["saved_tokens"] = max(0, entry["original_tokens"] - entry["sent_tokens"])
+
+
+def record_section_pass(stage: str, reused: int, processed: int):
+    labels = (("stage", stage),)
+    _increment("autoauthor_sections_reused_total", labels, reused)
+    _increment("autoauthor_sections_processed_total", labels, processed)
+
+
+def record_postprocess(stage: str, fixes: dict, flesch: float):
+    labels = (("stage", stage),)
+    for kind, count in fixes.items():
+        if count:
+            _increment("autoauthor_postprocess_fixes_total", labels + (("fix", kind),), count)
+    if flesch is not None:
+        _observe("autoauthor_flesch_reading_ease", FLESCH_BUCKETS, labels, flesch)
+
+
+def record_continuation(stage: str, provider: str, outcome: str):
+    # outcome: "continued" when a cut-off answer was resumed, "truncated" when it still ended cut off
+    _increment("autoauthor_continuations_total", (("stage", stage), ("provider", provider), ("outcome", outcome)))
+    truncations = job_truncations.get()
+    if truncations is not None:
+        entry = truncations.setdefault(stage, {"continued": 0, "truncated": 0})
+        entry[outcome] += 1
+
+
+def record_gate(stage: str, gate: str, outcome: str):
+    # outcome: "failed", "repaired" or "remaining" for a quality gate after a stage
+    _increment("autoauthor_quality_gates_total", (("stage", stage), ("gate", gate), ("outcome", outcome)))
+
+
+def summarize_calls(calls: list) -> dict:
+    # Per-stage totals for a job's timing summary
+    summary = {}
+    for call in calls:
+        stage = summary.setdefault(call["stage"], {
+            "calls": 0, "seconds": 0.0, "ttfb_seconds": None, "request_bytes": 0,
+            "response_bytes": 0, "prompt_tokens": 0, "completion_tokens": 0, "retries": 0,
+        })
+        stage["calls"] += 1
+        stage["seconds"] = round(stage["seconds"] + call["seconds"], 3)
+        if stage["ttfb_seconds"] is None:
+            stage["ttfb_seconds"] = call["ttfb_seconds"]
+        for key in ("request_bytes", "response_bytes", "prompt_tokens", "completion_tokens", "retries"):
+            stage[key] += call.get(key) or 0
+    return summary
+
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = [f'{key}="{value}"' for key, value in labels + extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == math.inf else repr(float(bound))
+
+
+def render_prometheus(gauges: dict = None) -> str:
+    # Prometheus text exposition format (version 0.0.4)
+    lines = []
+    for name, histogram in sorted(_histograms.items()):
+        lines.append(f"# TYPE {name} histogram")
+        for labels, entry in sorted(histogram["series"].items()):
+            for bound, count in zip(histogram["buckets"], entry["counts"]):
+                lines.append(f"{name}_bucket{_format_labels(labels, (('le', _format_bound(bound)),))} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {entry['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {entry['count']}")
+    for name, series in sorted(_counters.items()):
+        lines.append(f"# TYPE {name} counter")
+        for labels, value in sorted(series.items()):
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+    for name, series in sorted((gauges or {}).items()):
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in sorted(series.items()):
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
@@ -1,10 +1,35 @@
+import asyncio
 import os
-import requests
+import re
 from dotenv import load_dotenv
 
+from agents.context_budget import compact_section_context, compact_writer_context
+from agents.http_client import ProviderError, post_json, run_sync, stream_sse
+from agents.postprocess import postprocess
+from agents.quality import MAX_CONTINUATIONS, MIN_H2_SECTIONS, enforce_gates, join_continuation
+from agents.telemetry import record_continuation
+from agents.sections import OrderedTokenRelay
+
 load_dotenv()
 
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+API_URL = os.getenv("ANTHROPIC_API_URL", "https://api.anthropic.com/v1/messages")
+WRITER_MODEL = "claude-3-7-sonnet-20250219"
+
+# "single" drafts the article in one call; "sectioned" outlines it, then drafts each H2 concurrently
+WRITER_MODE = os.getenv("WRITER_MODE", "single")
+OUTLINE_MODEL = os.getenv("WRITER_OUTLINE_MODEL", "claude-3-5-haiku-20241022")
+SECTION_MAX_TOKENS = int(os.getenv("WRITER_SECTION_MAX_TOKENS", "4000"))
+WORDS_PER_SECTION = 450
+
+LENGTH_MAP = {
+    "short": 1000,
+    "medium": 2000,
+    "long": 3000
+}
+
+_H1_RE = re.compile(r"^#\s+(.+)$")
+_H2_RE = re.compile(r"^##\s+(.+)$")
 
 def format_writer_prompt(user_input: dict, research_summary: str) -> str:
     topic = user_input.get("topic", "")
@@ -24,12 +49,7 @@ def format_writer_prompt(user_input: dict, research_summary: str) -> str:
     call_to_action = user_input.get("call_to_action", "")
     include_competitors = user_input.get("include_competitors", False)
 
-    length_map = {
-        "short": 1000,
-        "medium": 2000,
-        "long": 3000
-    }
-    length_value = length_map.get(article_length, 2000)
+    length_value = LENGTH_MAP.get(article_length, 2000)
 
     return f"""
 You are a master content writer, blending journalistic precision and creative storytelling to craft engaging articles.
@@ -47,7 +67,6 @@ Write a {structure_style}-style article on "{topic}" with a focus on "{subtopic}
 - MUST achieve {length_value} words (±10%)
 - Minimum 5 H2 sections with 3-4 paragraphs each
 - Each paragraph must contain 3-5 full sentences
-- Failure to meet length will require full rewrite
 - Word count will be verified before acceptance
 
 == USER INPUT SUMMARY ==
@@ -68,10 +87,13 @@ Write a {structure_style}-style article on "{topic}" with a focus on "{subtopic}
 - Call-to-Action: {call_to_action or "N/A"}
 - Include Competitors: {"Yes" if include_competitors else "No"}
 
+== RESEARCH NOTES ==
+{research_summary}
+
 == EXPANSION TECHNIQUES ==
 1. **Section Depth**:
    - Each H2 must contain:
-     - 1 statistical insight from {research_summary}
+     - 1 statistical insight from the research notes
      - 2 real-world examples ({geographic_focus} focused)
      - 1 extended analogy/metaphor
      - 3 {keywords} integrations
@@ -98,7 +120,7 @@ Write a {structure_style}-style article on "{topic}" with a focus on "{subtopic}
    - Title must score 8/10 on clickability (test: "Would {target_audience} share this?")
 
 2. **Introduction** (150-200 words):
-   - Start with a {research_summary}-derived stat or quote tied to {topic}
+   - Start with a stat or quote from the research notes tied to {topic}
    - Hook {target_audience} by addressing {audience_pain_points} in {tonality}
    - Include a "steel thread" phrase (e.g., "{subtopic} advantage") that recurs in H2/H3 headers
    - End with a promise of {content_goal}
@@ -106,7 +128,7 @@ Write a {structure_style}-style article on "{topic}" with a focus on "{subtopic}
 3. **Section Development** (400-500 words each):
    - Each H2 section includes:
      - Emotional appeal to {audience_pain_points}
-     - 1 data point from {research_summary}
+     - 1 data point from the research notes
      - 1 {geographic_focus}- or {industry_vertical}-specific example
      - 1-2 {keywords} naturally integrated
      - Subtle nod to {call_to_action}
@@ -120,7 +142,7 @@ Write a {structure_style}-style article on "{topic}" with a focus on "{subtopic}
 
 5. **Competitor Context** (If {include_competitors}):
    - Add H2 section "How {topic} Stacks Up"
-   - Use {research_summary} insights for {industry_vertical}-specific comparisons
+   - Use insights from the research notes for {industry_vertical}-specific comparisons
 
 6. **Call-to-Action**:
    - Embed {call_to_action} 3x: early H2, mid-article, conclusion
@@ -129,46 +151,293 @@ Write a {structure_style}-style article on "{topic}" with a focus on "{subtopic}
 == OUTPUT FORMAT ==
 - Return the article in markdown (## for H2, ### for H3)
 - Flag 3+ {keywords}-rich phrases in <!-- -->
-- Replace em dashes with hyphens ( - )
 - Strictly target {length_value} words (±10%)
-- No summaries or word counts
-- Article will be rejected if under length
+- No summaries
 """
 
-def run_writer_agent(user_input: dict, research_summary: str, output_dir: str) -> dict:
-    if not ANTHROPIC_API_KEY:
-        raise EnvironmentError("ANTHROPIC_API_KEY not set in .env")
+def format_outline_prompt(user_input: dict, research_notes: str, section_count: int) -> str:
+    length_value = LENGTH_MAP.get(user_input.get("article_length", "medium"), 2000)
+    return f"""
+You are planning a {user_input.get("structure_style", "essay")}-style article of about {length_value} words.
+
+== BRIEF ==
+- Topic: {user_input.get("topic", "")}
+- Draft Title: {user_input.get("draft_title") or "N/A"}
+- Keywords: {user_input.get("keywords") or "N/A"}
+- Target Audience: {user_input.get("target_audience", "")}
+- Audience Pain Points: {user_input.get("audience_pain_points") or "N/A"}
+- Industry Vertical: {user_input.get("industry_vertical") or "N/A"}
+- Geographic Focus: {user_input.get("geographic_focus") or "Global"}
+- Content Goal: {user_input.get("content_goal", "")}
+- Call-to-Action: {user_input.get("call_to_action") or "N/A"}
+- Include Competitors: {"Yes" if user_input.get("include_competitors") else "No"}
+
+== RESEARCH NOTES ==
+{research_notes}
+
+== TASK ==
+Return only an outline in this exact markdown shape, with no other text:
+
+# <engaging H1 title with one keyword and a power verb>
+## <H2 heading>
+<one sentence on what this section covers and which research point it uses>
+
+Write exactly {section_count} H2 sections. The last one is the conclusion with the call-to-action.
+"""
+
+def format_section_prompt(user_input: dict, outline: dict, index: int, research_notes: str, words: int) -> str:
+    # index -1 is the introduction that sits between the H1 and the first H2
+    outline_text = "\n".join(f"## {heading}: {summary}" for heading, summary in outline["sections"])
+    if index < 0:
+        task = f"""Write only the introduction ({words} words). Do not repeat the title and do not add any heading.
+- Open with a stat or quote from the research notes tied to {user_input.get("topic", "")}
+- Address {user_input.get("audience_pain_points") or "the reader's pain points"} and end with a promise of {user_input.get("content_goal", "")}"""
+    else:
+        heading, summary = outline["sections"][index]
+        task = f"""Write only the section "## {heading}" ({words} words, 3-4 paragraphs of 3-5 sentences).
+- Start with the line "## {heading}" and use ### for any sub-headings
+- Cover: {summary}
+- Include 1 data point from the research notes and 1 {user_input.get("geographic_focus") or "real-world"} example
+- Integrate 1-2 of these keywords naturally: {user_input.get("keywords") or "N/A"}"""
+        if index == len(outline["sections"]) - 1:
+            task += f"\n- This is the conclusion: close with the call-to-action: {user_input.get('call_to_action') or 'N/A'}"
+
+    return f"""
+You are a master content writer drafting one part of a longer article. Other writers are drafting the other parts at the same time, so stay inside your part.
+
+== ARTICLE ==
+Title: {outline["title"]}
+{outline_text}
+
+== BRIEF ==
+- Audience: {user_input.get("target_audience", "")} ({user_input.get("reading_level") or "Intermediate"} reading level)
+- Tone: {user_input.get("tonality", "")}, in the voice of {user_input.get("reference_brands") or "a seasoned journalist"}
+- Industry Vertical: {user_input.get("industry_vertical") or "N/A"}
+- Content Goal: {user_input.get("content_goal", "")}
+
+== RESEARCH NOTES ==
+{research_notes}
+
+== YOUR PART ==
+{task}
+
+== OUTPUT FORMAT ==
+- Markdown only
+- Flag 1 keyword-rich phrase in <!-- -->
+- No summaries or commentary
+"""
+
+def format_expansion_prompt(user_input: dict, article: str, research_notes: str, count: int, missing_keywords: list) -> str:
+    # Quality gate: the draft came back short, so only the missing sections are requested
+    headings = "\n".join(line for line in article.splitlines() if line.startswith(("# ", "## ")))
+    keywords = f"\n- Work in these keywords, which the draft never uses: {', '.join(missing_keywords)}" if missing_keywords else ""
+    return f"""
+You are a master content writer extending an article that came out too short.
+
+== EXISTING ARTICLE OUTLINE ==
+{headings}
+
+== BRIEF ==
+- Topic: {user_input.get("topic", "")}
+- Audience: {user_input.get("target_audience", "")} ({user_input.get("reading_level") or "Intermediate"} reading level)
+- Tone: {user_input.get("tonality", "")}
+- Keywords: {user_input.get("keywords") or "N/A"}
+- Geographic Focus: {user_input.get("geographic_focus") or "Global"}
+
+== RESEARCH NOTES ==
+{research_notes}
+
+== YOUR PART ==
+Write exactly {count} new H2 section(s) that fit before the conclusion and cover ground the outline above does not.
+- Start each with a "## " heading and use ### for any sub-headings
+- About {WORDS_PER_SECTION} words each, 3-4 paragraphs of 3-5 sentences
+- Include 1 data point from the research notes and 1 real-world example per section{keywords}
 
-    prompt = format_writer_prompt(user_input, research_summary)
+== OUTPUT FORMAT ==
+- Markdown only, the new sections and nothing else
+- No summaries or commentary
+"""
+
+def format_keyword_prompt(user_input: dict, section: str, missing_keywords: list) -> str:
+    return f"""
+You are editing one section of an article for {user_input.get("target_audience", "")} in a {user_input.get("tonality", "")} tone.
+
+Rewrite the section below so it naturally uses these keywords: {", ".join(missing_keywords)}.
+Keep its heading line, its facts and its length. Change only what the keywords need.
+
+== SECTION ==
+{section}
+
+== OUTPUT FORMAT ==
+- Markdown only, the rewritten section and nothing else
+"""
+
+def parse_outline(text: str) -> dict:
+    title = ""
+    sections = []
+    for line in text.splitlines():
+        line = line.strip()
+        h1 = _H1_RE.match(line)
+        h2 = _H2_RE.match(line)
+        if h1 and not title:
+            title = h1.group(1).strip()
+        elif h2:
+            sections.append([h2.group(1).strip(), ""])
+        elif line and sections and not sections[-1][1]:
+            sections[-1][1] = line
+    return {"title": title, "sections": [tuple(section) for section in sections]}
+
+def _part_body(text: str) -> str:
+    # Keep a part's own content: skip a leading H1/H2 and stop where it spills into another H2
+    lines = text.strip().splitlines()
+    while lines and (_H1_RE.match(lines[0].strip()) or _H2_RE.match(lines[0].strip()) or not lines[0].strip()):
+        lines.pop(0)
+    for position, line in enumerate(lines):
+        if _H1_RE.match(line.strip()) or _H2_RE.match(line.strip()):
+            lines = lines[:position]
+            break
+    return "\n".join(lines).strip()
+
+def stitch_sections(title: str, intro: str, sections: list, outline: dict) -> str:
+    # Local stitch: one H1, the intro, then each section under exactly its outline heading
+    parts = [f"# {title}", _part_body(intro)]
+    for (heading, _), body in zip(outline["sections"], sections):
+        parts.append(f"## {heading}\n\n{_part_body(body)}")
+    return "\n\n".join(part for part in parts if part.strip())
 
-    url = "https://api.anthropic.com/v1/messages"
+def writer_mode(user_input: dict) -> str:
+    return (user_input.get("writer_mode") or WRITER_MODE).lower()
 
+async def _request(payload: dict, on_token=None, stage: str = "writer") -> tuple:
+    # One messages call -> (text, stop_reason)
     headers = {
         "x-api-key": ANTHROPIC_API_KEY,
         "Content-Type": "application/json",
         "anthropic-version": "2023-06-01"
     }
 
+    if on_token is None:
+        data = await post_json(API_URL, headers, payload, provider="anthropic", stage=stage)
+        return data["content"][0]["text"], data.get("stop_reason")
+
+    # Stream text deltas to the caller while assembling the full text
+    payload = {**payload, "stream": True}
+    parts = []
+    stop_reason = None
+    async for event in stream_sse(API_URL, headers, payload, provider="anthropic", stage=stage):
+        if event.get("type") == "error":
+            raise Exception(f"Streaming error: {event.get('error')}")
+        delta = event.get("delta", {})
+        if event.get("type") == "content_block_delta" and delta.get("type") == "text_delta":
+            parts.append(delta["text"])
+            await on_token(delta["text"])
+        elif event.get("type") == "message_delta":
+            stop_reason = delta.get("stop_reason") or stop_reason
+    return "".join(parts), stop_reason
+
+async def _complete(prompt: str, max_tokens: int, model: str = WRITER_MODEL, on_token=None, stage: str = "writer") -> str:
+    messages = [
+        {
+            "role": "user",
+            "content": prompt.strip()
+        }
+    ]
     payload = {
-        "model": "claude-3-7-sonnet-20250219",
-        "max_tokens": 8000,
-        "messages": [
-            {
-                "role": "user",
-                "content": prompt.strip()
-            }
-        ],
+        "model": model,
+        "max_tokens": max_tokens,
+        "messages": messages,
         "system": "You are a professional content writer."
     }
 
-    response = requests.post(url, headers=headers, json=payload)
-    
-    if response.status_code != 200:
-        print(f"Error: {response.status_code} - {response.text}")
-        raise Exception(f"API request failed with status code {response.status_code}: {response.text}")
-    
-    data = response.json()
-    content = data["content"][0]["text"]
+    try:
+        text, stop_reason = await _request(payload, on_token, stage)
+        for _ in range(MAX_CONTINUATIONS):
+            if stop_reason != "max_tokens":
+                break
+            # The cut-off answer goes back as the start of the assistant turn and the model carries on from it
+            record_continuation(stage, "anthropic", "continued")
+            text = text.rstrip()
+            payload["messages"] = messages + [{"role": "assistant", "content": text}]
+            more, stop_reason = await _request(payload, on_token, stage)
+            text = join_continuation(text, more)
+        if stop_reason == "max_tokens":
+            record_continuation(stage, "anthropic", "truncated")
+        return text
+    except ProviderError as e:
+        print(f"Error: {e.status} - {e.text}")
+        raise
+
+async def write_sectioned_article(user_input: dict, research_summary: str, on_token=None) -> tuple:
+    length_value = LENGTH_MAP.get(user_input.get("article_length", "medium"), 2000)
+    section_count = max(5, round(length_value / WORDS_PER_SECTION))
+
+    outline_notes = compact_writer_context(user_input, research_summary)
+    outline_prompt = format_outline_prompt(user_input, outline_notes, section_count)
+    outline = parse_outline(await _complete(outline_prompt, 1000, model=OUTLINE_MODEL, stage="writer_outline"))
+    if len(outline["sections"]) < 2:
+        return None, None
+    outline["title"] = outline["title"] or user_input.get("draft_title") or user_input.get("topic", "")
+    print(f"🧩 Outline ready: {len(outline['sections'])} sections, drafting concurrently...")
+
+    intro_words = 175
+    section_words = max(200, (length_value - intro_words) // len(outline["sections"]))
+    # Part 0 is the introduction, parts 1..n the H2 sections
+    relay = OrderedTokenRelay(len(outline["sections"]) + 1, on_token) if on_token else None
+    if relay:
+        await on_token(f"# {outline['title']}\n\n")
+
+    async def draft(part: int) -> str:
+        index = part - 1
+        query = outline["title"] if index < 0 else " ".join(outline["sections"][index])
+        notes = compact_section_context(user_input, research_summary, query)
+        words = intro_words if index < 0 else section_words
+        prompt = format_section_prompt(user_input, outline, index, notes, words)
+
+        async def forward(delta: str):
+            await relay.emit(part, delta)
+
+        text = await _complete(prompt, SECTION_MAX_TOKENS, on_token=forward if relay else None)
+        if relay:
+            await relay.finish(part)
+        return text
+
+    parts = await asyncio.gather(*(draft(part) for part in range(len(outline["sections"]) + 1)))
+    return outline_prompt, stitch_sections(outline["title"], parts[0], parts[1:], outline)
+
+async def enforce_writer_gates(user_input: dict, research_summary: str, content: str, checks: dict) -> tuple:
+    # A short draft gets only its missing sections; missing keywords are worked into one section
+    async def expand(article: str, count: int, missing_keywords: list) -> str:
+        notes = compact_writer_context(user_input, research_summary)
+        prompt = format_expansion_prompt(user_input, article, notes, count, missing_keywords)
+        return await _complete(prompt, SECTION_MAX_TOKENS * count, stage="writer")
+
+    async def revise(section: str, sections: list, missing_keywords: list) -> str:
+        return await _complete(format_keyword_prompt(user_input, section, missing_keywords), SECTION_MAX_TOKENS, stage="writer")
+
+    return await enforce_gates(
+        "writer", content, checks, user_input.get("keywords", ""),
+        target_words=LENGTH_MAP.get(user_input.get("article_length", "medium"), 2000),
+        min_h2=MIN_H2_SECTIONS, words_per_section=WORDS_PER_SECTION, expand_fn=expand, revise_fn=revise,
+    )
+
+async def run_writer_agent_async(user_input: dict, research_summary: str, output_dir: str, on_token=None) -> dict:
+    if not ANTHROPIC_API_KEY:
+        raise EnvironmentError("ANTHROPIC_API_KEY not set in .env")
+
+    prompt = content = None
+    if writer_mode(user_input) == "sectioned":
+        prompt, content = await write_sectioned_article(user_input, research_summary, on_token)
+        if content is None:
+            print("⚠️ Outline had too few sections, falling back to a single writer call")
+
+    if content is None:
+        # Research appears once, trimmed to the passages most relevant to the brief
+        research_notes = compact_writer_context(user_input, research_summary)
+        prompt = format_writer_prompt(user_input, research_notes)
+        content = await _complete(prompt, 8000, on_token=on_token)
+
+    content, checks = postprocess(content, user_input.get("keywords", ""), "writer")
+    content, checks = await enforce_writer_gates(user_input, research_summary, content, checks)
 
     # Save writer output to output folder
     writer_path = os.path.join(output_dir, "writer.md")
@@ -178,5 +447,9 @@ def run_writer_agent(user_input: dict, research_summary: str, output_dir: str) -
     return {
         "agent": "WriterAgent",
         "prompt": prompt.strip(),
-        "article": content
+        "article": content,
+        "checks": checks
     }
+
+def run_writer_agent(user_input: dict, research_summary: str, output_dir: str) -> dict:
+    return run_sync(run_writer_agent_async, user_input, research_summary, output_dir)
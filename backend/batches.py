@@ -0,0 +1,189 @@
+import asyncio
+import os
+import uuid
+import zipfile
+from datetime import datetime
+
+from agents.research_agent import run_research_agent_async
+from jobs import (
+    ACTIVE_STATUSES,
+    apply_brief_defaults,
+    create_job_async,
+    create_output_dir,
+    get_job,
+    load_batch,
+    save_batch,
+    update_job_async,
+)
+from pipeline import run_pipeline
+from scheduler import QUEUE_RETRY_AFTER, QueueFullError, job_slot
+
+BATCH_PARALLELISM = int(os.getenv("BATCH_PARALLELISM", "4"))
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "500"))
+ZIP_CHUNK_SIZE = 64 * 1024
+
+# Batch records are kept in the job store; this only holds the tasks running on this worker
+_RUNNING = {}
+
+
+def research_group_key(user_input: dict) -> tuple:
+    # Briefs with the same topic, vertical and geography share one research call
+    return tuple(
+        " ".join(str(user_input.get(field, "")).lower().split())
+        for field in ("topic", "industry_vertical", "geographic_focus")
+    )
+
+
+async def create_batch(briefs: list, parallelism: int = None) -> dict:
+    batch_id = uuid.uuid4().hex
+    job_ids = []
+    for brief in briefs:
+        user_input = apply_brief_defaults(dict(brief))
+        job = await create_job_async(user_input, create_output_dir(user_input), batch_id=batch_id)
+        job_ids.append(job["id"])
+
+    batch = {
+        "id": batch_id,
+        "job_ids": job_ids,
+        "parallelism": max(1, parallelism or BATCH_PARALLELISM),
+        "created_at": datetime.now().isoformat(),
+    }
+    await asyncio.to_thread(save_batch, batch)
+    return batch
+
+
+def batch_status(job_statuses: list) -> str:
+    # Derived from the batch's jobs, so it reads the same on every worker
+    if all(status not in ACTIVE_STATUSES for status in job_statuses):
+        return "complete"
+    if any(status != "pending" for status in job_statuses):
+        return "running"
+    return "pending"
+
+
+def get_batch(batch_id: str) -> dict:
+    batch = load_batch(batch_id)
+    if batch is not None:
+        batch["status"] = batch_status(batch.pop("job_statuses"))
+    return batch
+
+
+def start_batch(batch: dict):
+    task = asyncio.create_task(run_batch(batch))
+    _RUNNING[batch["id"]] = task
+    task.add_done_callback(lambda _: _RUNNING.pop(batch["id"], None))
+
+
+async def run_batch(batch: dict):
+    semaphore = asyncio.Semaphore(batch["parallelism"])
+    shared_research = {}
+
+    async def research_fn(user_input: dict, output_dir: str) -> str:
+        key = research_group_key(user_input)
+        if key not in shared_research:
+            shared_research[key] = asyncio.ensure_future(run_research_agent_async(user_input, output_dir))
+        try:
+            # Shield so one cancelled job doesn't cancel research other briefs are waiting on
+            result = await asyncio.shield(shared_research[key])
+        except Exception as e:
+            # One failed shared call should not fail the whole group; each brief researches on its own
+            print(f"⚠️ Shared research for '{user_input.get('topic', '')}' failed ({e}), researching this brief alone")
+            return (await run_research_agent_async(user_input, output_dir))["result"]
+        research_path = os.path.join(output_dir, "research.txt")
+        if not os.path.exists(research_path):
+            with open(research_path, "w", encoding="utf-8") as f:
+                f.write(result["result"])
+        return result["result"]
+
+    async def run_one(job_id: str):
+        async with semaphore:
+            job = await asyncio.to_thread(get_job, job_id)
+            while True:
+                try:
+                    async with job_slot(job_id):
+                        await update_job_async(job_id, status="running")
+                        result = await run_pipeline(job, research_fn=research_fn)
+                    break
+                except QueueFullError:
+                    # Interactive requests filled the queue; wait for room rather than failing the brief
+                    await asyncio.sleep(QUEUE_RETRY_AFTER)
+            await update_job_async(job_id, status="complete", docx_path=result["docx_path"])
+
+    async def run_guarded(job_id: str):
+        try:
+            await run_one(job_id)
+        except Exception as e:
+            print(f"❌ Batch job {job_id} failed: {e}")
+            await update_job_async(job_id, status="failed", error=str(e))
+
+    print(f"📦 Batch {batch['id']} starting with {len(batch['job_ids'])} briefs...")
+    await asyncio.gather(*(run_guarded(job_id) for job_id in batch["job_ids"]))
+    print(f"📦 Batch {batch['id']} finished.")
+
+
+def get_batch_progress(batch: dict) -> dict:
+    jobs = [get_job(job_id) for job_id in batch["job_ids"]]
+    counts = {}
+    for job in jobs:
+        counts[job["status"]] = counts.get(job["status"], 0) + 1
+    finished = counts.get("complete", 0) + counts.get("failed", 0)
+    return {
+        "batch_id": batch["id"],
+        "status": batch_status([job["status"] for job in jobs]),
+        "total": len(jobs),
+        "counts": counts,
+        "progress": round(finished / len(jobs), 4) if jobs else 1.0,
+        "jobs": [
+            {
+                "job_id": job["id"],
+                "topic": job["user_input"].get("topic", ""),
+                "status": job["status"],
+                "error": job["error"],
+            }
+            for job in jobs
+        ],
+    }
+
+
+class _ZipChunkSink:
+    # Write-only, non-seekable target so zipfile streams entries with data descriptors
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_batch_zip(batch: dict):
+    for data in _iter_zip_parts(batch):
+        if data:
+            yield data
+
+
+def _iter_zip_parts(batch: dict):
+    # Yield the archive piece by piece; only one file chunk is held in memory at a time
+    sink = _ZipChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+        for index, job_id in enumerate(batch["job_ids"], start=1):
+            job = get_job(job_id)
+            if job["status"] != "complete" or not job["docx_path"]:
+                continue
+            arcname = f"{index:03d}_{os.path.basename(job['output_dir'])}.docx"
+            with open(job["docx_path"], "rb") as src, archive.open(arcname, "w", force_zip64=True) as dest:
+                while True:
+                    chunk = src.read(ZIP_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dest.write(chunk)
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
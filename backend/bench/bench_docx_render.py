@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents import output_agent
+from agents.output_agent import new_document, parse_markdown_to_docx, render_markdown_to_docx, write_docx_file
+
+WORDS = (
+    "remote teams build trust through clear goals shared rituals honest feedback and "
+    "measurable outcomes that managers review weekly with data from real projects"
+).split()
+
+
+def make_rich_article(words: int) -> str:
+    # Headings, inline emphasis, links, code, nested lists, quotes and tables, like a real draft
+    rng = random.Random(words)
+    lines = ["# Benchmark Article Title", ""]
+    written = 0
+    section = 1
+    while written < words:
+        lines += [f"## Section {section}: **Key** ideas", ""]
+        for _ in range(4):
+            count = 60
+            sentence = " ".join(rng.choice(WORDS) for _ in range(count))
+            lines += [
+                f"{sentence.capitalize()} with **bold**, *italic*, `code` and a "
+                f"[source](https://example.com/{section}) in it.",
+                "",
+            ]
+            written += count + 8
+        lines += [
+            "### Checklist", "",
+            "- First point with **emphasis**",
+            "  - Nested detail about *async* work",
+            "- Second point", "",
+            "1. Ordered step", "2. Another step", "",
+            "> A quote from a **manager** about remote teams.", "",
+            "| Practice | Impact |", "|---|---|", "| Standups | **High** |", "| Retros | Medium |", "",
+            "<!-- keyword: remote work -->", "",
+        ]
+        written += 40
+        section += 1
+    return "\n".join(lines)
+
+
+def measure(render) -> dict:
+    # Time and memory come from separate runs; tracemalloc slows allocation-heavy code several-fold
+    started = time.perf_counter()
+    size = render()
+    seconds = time.perf_counter() - started
+    tracemalloc.start()
+    render()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": round(seconds, 4), "peak_mb": round(peak / 1024 / 1024, 2), "bytes": size}
+
+
+def legacy(content: str) -> int:
+    doc = new_document()
+    parse_markdown_to_docx(doc, content)
+    stream = BytesIO()
+    doc.save(stream)
+    return len(stream.getvalue())
+
+
+def single_pass(content: str) -> int:
+    doc = new_document()
+    render_markdown_to_docx(doc, content)
+    stream = BytesIO()
+    doc.save(stream)
+    return len(stream.getvalue())
+
+
+def best_of(repeat: int, render) -> dict:
+    runs = [measure(render) for _ in range(repeat)]
+    return min(runs, key=lambda run: run["seconds"])
+
+
+def cached(content: str, workdir: str) -> int:
+    # A cache hit copies the already-rendered file instead of rendering again
+    path = write_docx_file(content, os.path.join(workdir, "copy.docx"))
+    return os.path.getsize(path)
+
+
+def main(args) -> list:
+    results = []
+    workdir = tempfile.mkdtemp(prefix="autoauthor_docx_bench_")
+    for words in args.words:
+        content = make_rich_article(words)
+        output_agent._render_cache.clear()
+        write_docx_file(content, os.path.join(workdir, "first.docx"))
+        results.append({
+            "words": len(content.split()),
+            "legacy": best_of(args.repeat, lambda: legacy(content)),
+            "single_pass": best_of(args.repeat, lambda: single_pass(content)),
+            "cached": best_of(args.repeat, lambda: cached(content, workdir)),
+        })
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare the legacy and single-pass markdown-to-DOCX renderers")
+    parser.add_argument("--words", type=int, nargs="+", default=[3000, 10000, 20000])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per renderer; the fastest is reported")
+    parser.add_argument("--json", help="also write the results to this file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = main(args)
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
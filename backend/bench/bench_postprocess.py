@@ -0,0 +1,96 @@
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.postprocess import postprocess
+
+WORDS = (
+    "remote teams build trust through clear goals shared rituals honest feedback and "
+    "measurable outcomes that managers review weekly with data from real projects"
+).split()
+KEYWORDS = "remote teams, honest feedback, async standups"
+
+
+def make_messy_article(words: int) -> str:
+    # What models hand back: a ```markdown wrapper per section, em dashes, word counts, sloppy headings
+    rng = random.Random(words)
+    parts = ["```markdown", "#Benchmark Article Title (~%d words)" % words, ""]
+    written = 0
+    section = 1
+    while written < words:
+        parts += ["```markdown" if section > 1 else "", f"## **H2: Section {section}** ##", ""]
+        for _ in range(4):
+            sentences = []
+            for _ in range(4):
+                count = rng.randint(8, 20)
+                sentences.append(" ".join(rng.choice(WORDS) for _ in range(count)).capitalize() + ".")
+                written += count
+            parts += [" — ".join(sentences[:2]) + " " + " ".join(sentences[2:]), ""]
+        parts += ["- Remote teams need **rituals**", "- Honest feedback, every week", "", "```"]
+        section += 1
+    parts += ["", f"Word count: {written:,}"]
+    return "\n".join(parts)
+
+
+def legacy(content: str) -> str:
+    # The regex chain the humanizer used to run, without any measurements
+    content = content.replace("—", " - ")
+    content = re.sub(r"\(?(word count|~?\s*\d+\s*words)\)?", "", content, flags=re.IGNORECASE)
+    content = re.sub(r'^```markdown\s*\n', '', content, flags=re.MULTILINE)
+    content = re.sub(r'\n```$', '', content, flags=re.MULTILINE)
+    return content.strip()
+
+
+def best_of(repeat: int, fn) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return round(min(timings) * 1000, 2)
+
+
+def main(args) -> list:
+    results = []
+    for words in args.words:
+        article = make_messy_article(words)
+        text, report = postprocess(article, KEYWORDS)
+        postprocess_ms = best_of(args.repeat, lambda: postprocess(article, KEYWORDS))
+        result = {
+            "words": report["words"],
+            "bytes": len(article.encode("utf-8")),
+            "legacy_ms": best_of(args.repeat, lambda: legacy(article)),
+            "postprocess_ms": postprocess_ms,
+            "words_per_second": round(report["words"] / (postprocess_ms / 1000)) if postprocess_ms else None,
+            "flesch_reading_ease": report["flesch_reading_ease"],
+            "fixes": report["fixes"],
+            "fences_left": text.count("```"),
+            "em_dashes_left": text.count("—"),
+        }
+        print(f"🏁 {words} words: legacy {result['legacy_ms']} ms, postprocess {postprocess_ms} ms "
+              f"({result['words_per_second']} words/s)")
+        results.append(result)
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Time the local post-processing pass on large, messy articles")
+    parser.add_argument("--words", type=int, nargs="+", default=[3000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per size; the fastest is reported")
+    parser.add_argument("--json", help="also write the results to this file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = main(args)
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
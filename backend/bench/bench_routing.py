@@ -0,0 +1,119 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_llm_server import provider_env, start_mock_server
+from run_benchmark import summarize
+
+PRIMARY = "deepseek:deepseek-reasoner"
+ROUTE = "deepseek:deepseek-reasoner,deepseek:deepseek-chat"
+
+
+def scenarios(args) -> dict:
+    # route, hedge_after, latency_slo for each configuration being compared
+    return {
+        "single": (PRIMARY, 0, 0),
+        "fallback": (ROUTE, 0, 0),
+        "hedged": (ROUTE, args.hedge_after, 0),
+        "hedged_slo": (ROUTE, args.hedge_after, args.slo),
+    }
+
+
+async def run_scenario(name: str, route: tuple, args) -> dict:
+    from agents import router, seo_agent
+
+    router._latencies.clear()
+    router._stats.pop("seo", None)
+    router.register_route("seo", route[0], route[1], route[2], args.attempt_timeout)
+    prompt = seo_agent.format_seo_prompt({"keywords": "remote work"}, "## Section\n\nText.", "- Section")
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    failures = 0
+
+    async def one():
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await seo_agent._optimize(prompt)
+                latencies.append(time.perf_counter() - started)
+            except Exception:
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(args.calls)))
+    stats = router.get_router_stats()["seo"]
+    return {
+        "scenario": name,
+        "route": route[0],
+        "hedge_after": route[1],
+        "latency_slo": route[2],
+        "wall_seconds": round(time.perf_counter() - started, 2),
+        "latency": {**summarize(latencies), "max": round(max(latencies), 3) if latencies else None},
+        "failures": failures,
+        "hedges": stats["hedges"],
+        "fallbacks": stats["fallbacks"],
+        "wins": {target: data["won"] for target, data in stats["targets"].items()},
+        "cancelled": {target: data["cancelled"] for target, data in stats["targets"].items()},
+    }
+
+
+async def main(args) -> list:
+    config = {
+        "latency": args.chat_latency,
+        "model_latency": {"deepseek-reasoner": args.reasoner_latency, "deepseek-chat": args.chat_latency},
+        "slow_rate": args.slow_rate,
+        "slow_latency": args.slow_latency,
+        "failing_models": ["deepseek-reasoner"] if args.fail_primary else [],
+        "chunk_delay": 0.002,
+        "words": 600,
+    }
+    runner, base_url = await start_mock_server(config)
+    # Agents read their endpoints and rate limits at import time
+    os.environ.update(provider_env(base_url))
+    os.environ.update(DEEPSEEK_RPS="10000", DEEPSEEK_CONCURRENCY=str(args.concurrency * 2),
+                      PROVIDER_MAX_RETRIES="0", PROVIDER_BREAKER_THRESHOLD="1000000")
+    selected = scenarios(args)
+    results = []
+    try:
+        for name in args.scenarios or list(selected):
+            result = await run_scenario(name, selected[name], args)
+            print(f"🏁 {name}: p50 {result['latency']['p50']}s, p99 {result['latency']['p99']}s, "
+                  f"{result['hedges']} hedges, {result['failures']} failures")
+            results.append(result)
+    finally:
+        from agents.http_client import close_session
+        await close_session()
+        await runner.cleanup()
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare SEO routing with and without fallbacks, hedging and SLO ordering")
+    parser.add_argument("--calls", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--reasoner-latency", type=float, default=1.5)
+    parser.add_argument("--chat-latency", type=float, default=0.4)
+    parser.add_argument("--slow-rate", type=float, default=0.1, help="Fraction of calls with an extra --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=8.0)
+    parser.add_argument("--hedge-after", type=float, default=2.5)
+    parser.add_argument("--slo", type=float, default=3.0)
+    parser.add_argument("--attempt-timeout", type=float, default=30.0)
+    parser.add_argument("--fail-primary", action="store_true", help="Answer every reasoner call with a 503")
+    parser.add_argument("--scenarios", nargs="*", choices=["single", "fallback", "hedged", "hedged_slo"])
+    parser.add_argument("--json", help="Write the results to this file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = asyncio.run(main(args))
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,81 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BRIEF = {"topic": "remote work tips for managers", "target_audience": "engineering managers"}
+PARAPHRASE = {"topic": "managing remote teams tips", "target_audience": "engineering managers"}
+
+
+def timed(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return round((time.perf_counter() - started) / repeat * 1000, 3)
+
+
+def main(args) -> list:
+    # The index path is read at import time, so the module is imported once it points at a scratch file
+    workdir = tempfile.mkdtemp(prefix="autoauthor-similarity-")
+    os.environ["SIMILARITY_INDEX_PATH"] = os.path.join(workdir, "similarity.sqlite3")
+    from agents import similarity
+
+    rng = random.Random(1)
+    vocab = [f"term{i}" for i in range(args.vocabulary)]
+    results = []
+    stored = 0
+    for size in sorted(args.sizes):
+        # Synthetic briefs of 6-20 terms, written straight to SQLite and loaded the way a restart would
+        rows = []
+        for i in range(stored, size):
+            signature = similarity.minhash({rng.choice(vocab) for _ in range(rng.randint(6, 20))})
+            rows.append(("brief", f"job{i}", f"output/run{i}", "", signature.tobytes(), float(i)))
+        with similarity._connect() as conn:
+            conn.executemany("INSERT INTO similarity_index VALUES (?, ?, ?, ?, ?, ?)", rows)
+        stored = size
+        index = similarity._indexes["brief"]
+        index.loaded = False
+        started = time.perf_counter()
+        index.size()
+        load_seconds = round(time.perf_counter() - started, 3)
+
+        similarity.index_brief(f"brief{size}", "output/brief", BRIEF)
+        queries = [{"topic": " ".join(rng.choice(vocab) for _ in range(10))} for _ in range(args.queries)]
+        miss_ms = round(sum(timed(lambda q=q: similarity.similar_briefs(q), 1) for q in queries) / len(queries), 3)
+        hit_ms = timed(lambda: similarity.similar_briefs(PARAPHRASE, 5, 0.3), args.queries)
+        add_ms = timed(lambda: similarity.index_brief(f"added{size}", "output/added", PARAPHRASE), 1)
+        match = similarity.similar_briefs(PARAPHRASE, 1, 0.3, exclude=f"added{size}")
+        result = {
+            "stored_briefs": size,
+            "load_seconds": load_seconds,
+            "lookup_ms": miss_ms,
+            "paraphrase_lookup_ms": hit_ms,
+            "paraphrase_similarity": match[0]["similarity"] if match else None,
+            "add_ms": add_ms,
+        }
+        print(f"🏁 {size} briefs: lookup {miss_ms} ms, paraphrase {hit_ms} ms, add {add_ms} ms, load {load_seconds}s")
+        results.append(result)
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure similar-brief lookups as the index grows")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--vocabulary", type=int, default=20000, help="distinct terms the synthetic briefs draw from")
+    parser.add_argument("--json", help="also write the results to this file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = main(args)
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,235 @@
+import argparse
+import asyncio
+import json
+import random
+
+from aiohttp import web
+
+# Stand-in for the Perplexity / DeepSeek chat completions and Anthropic messages endpoints
+DEFAULT_CONFIG = {
+    "latency": 0.5,             # seconds before the first byte
+    "chunk_delay": 0.005,       # seconds between streamed chunks
+    "words": 2000,              # words per generated article
+    "words_per_chunk": 8,       # words per streamed delta
+    "error_rate": 0.0,          # fraction of requests answered with a 5xx
+    "rate_limit_rate": 0.0,     # fraction of requests answered with a 429
+    "retry_after": 1,           # Retry-After seconds sent with 429s
+    "model_latency": {},        # per-model override of latency, e.g. {"deepseek-reasoner": 8}
+    "slow_rate": 0.0,           # fraction of requests that also wait slow_latency (a latency tail)
+    "slow_latency": 0.0,
+    "failing_models": [],       # models always answered with a 503, to exercise fallbacks
+    "truncate_rate": 0.0,       # fraction of answers cut in half and marked max_tokens / length
+}
+
+WORDS = (
+    "remote teams build trust through clear goals shared rituals honest feedback and "
+    "measurable outcomes that managers review weekly with data from real projects"
+).split()
+
+
+def make_article(words: int) -> str:
+    rng = random.Random(words)
+    lines = ["# Benchmark Article Title", ""]
+    section_words = max(50, words // 6)
+    written = 0
+    section = 1
+    while written < words:
+        lines += [f"## Section {section}", ""]
+        remaining = min(section_words, words - written)
+        while remaining > 0:
+            count = min(remaining, 60)
+            sentence = " ".join(rng.choice(WORDS) for _ in range(count))
+            lines += [f"{sentence.capitalize()} with **bold** and *italic* words.", ""]
+            remaining -= count
+            written += count
+        lines += ["- first point", "- second point", ""]
+        section += 1
+    return "\n".join(lines)
+
+
+def _usage(prompt: str, text: str, anthropic: bool) -> dict:
+    prompt_tokens = max(1, len(prompt) // 4)
+    completion_tokens = max(1, len(text) // 4)
+    if anthropic:
+        return {"input_tokens": prompt_tokens, "output_tokens": completion_tokens}
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+
+
+def create_app(config: dict = None) -> web.Application:
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    article = make_article(config["words"])
+    section = "## " + make_article(max(50, config["words"] // 6)).split("\n## ")[1].strip()
+    stats = {
+        "requests": 0, "streams": 0, "injected_429": 0, "injected_5xx": 0, "slow": 0, "disconnects": 0,
+        "truncated": 0, "continuations": 0,
+    }
+
+    async def handle(request: web.Request) -> web.StreamResponse:
+        stats["requests"] += 1
+        body = await request.json()
+        anthropic = request.path.endswith("/messages")
+        prompt = json.dumps(body.get("messages", []))
+        # Sectioned writer, SEO and humanizer prompts draft one part, so they get one section back
+        text = section if ("== SECTION SCOPE ==" in prompt or "== YOUR PART ==" in prompt) else article
+        stop = "end_turn" if anthropic else "stop"
+        # A continuation carries the cut-off answer as an assistant message and gets the rest of it
+        messages = body.get("messages", [])
+        previous = [message["content"] for message in messages if message.get("role") == "assistant"]
+        if previous:
+            stats["continuations"] += 1
+            text = text[len(previous[-1].rstrip()):] if text.startswith(previous[-1].rstrip()) else ""
+        elif random.random() < config["truncate_rate"]:
+            stats["truncated"] += 1
+            text = text[:len(text) // 2]
+            stop = "max_tokens" if anthropic else "length"
+
+        if body.get("model") in config["failing_models"]:
+            stats["injected_5xx"] += 1
+            return web.json_response({"error": "model unavailable"}, status=503)
+
+        roll = random.random()
+        if roll < config["rate_limit_rate"]:
+            stats["injected_429"] += 1
+            return web.json_response(
+                {"error": "rate limited"}, status=429, headers={"Retry-After": str(config["retry_after"])}
+            )
+        if roll < config["rate_limit_rate"] + config["error_rate"]:
+            stats["injected_5xx"] += 1
+            return web.json_response({"error": "upstream unavailable"}, status=503)
+
+        latency = config["model_latency"].get(body.get("model"), config["latency"])
+        if random.random() < config["slow_rate"]:
+            stats["slow"] += 1
+            latency += config["slow_latency"]
+        await asyncio.sleep(latency)
+        usage = _usage(prompt, text, anthropic)
+
+        if not body.get("stream"):
+            if anthropic:
+                return web.json_response({
+                    "content": [{"type": "text", "text": text}],
+                    "stop_reason": stop,
+                    "usage": usage,
+                })
+            return web.json_response({
+                "choices": [{"message": {"role": "assistant", "content": text}, "finish_reason": stop}],
+                "usage": usage,
+            })
+
+        stats["streams"] += 1
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        async def send(event: dict):
+            await response.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+
+        if anthropic:
+            await send({"type": "message_start", "message": {"usage": {"input_tokens": usage["input_tokens"]}}})
+        words = text.split(" ")
+        step = config["words_per_chunk"]
+        for start in range(0, len(words), step):
+            delta = " ".join(words[start:start + step]) + ("" if start + step >= len(words) else " ")
+            if anthropic:
+                await send({"type": "content_block_delta", "delta": {"type": "text_delta", "text": delta}})
+            else:
+                await send({"choices": [{"delta": {"content": delta}, "finish_reason": None}]})
+            if config["chunk_delay"]:
+                await asyncio.sleep(config["chunk_delay"])
+
+        if anthropic:
+            await send({
+                "type": "message_delta",
+                "delta": {"stop_reason": stop},
+                "usage": {"output_tokens": usage["output_tokens"]},
+            })
+            await send({"type": "message_stop"})
+        else:
+            await send({"choices": [{"delta": {}, "finish_reason": stop}], "usage": usage})
+            await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def handle_request(request: web.Request) -> web.StreamResponse:
+        try:
+            return await handle(request)
+        except ConnectionResetError:
+            # The client went away mid-response, e.g. the cancelled side of a hedged request
+            stats["disconnects"] += 1
+            return web.Response(status=499)
+
+    async def get_stats(request: web.Request) -> web.Response:
+        return web.json_response(stats)
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app["stats"] = stats
+    app.router.add_post("/chat/completions", handle_request)
+    app.router.add_post("/v1/chat/completions", handle_request)
+    app.router.add_post("/v1/messages", handle_request)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+
+async def start_mock_server(config: dict = None, host: str = "127.0.0.1", port: int = 0):
+    # Returns (runner, base_url); call runner.cleanup() to stop
+    runner = web.AppRunner(create_app(config), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}"
+
+
+def provider_env(base_url: str) -> dict:
+    # Environment that points every agent at the stand-in server
+    return {
+        "PERPLEXITY_API_URL": f"{base_url}/chat/completions",
+        "ANTHROPIC_API_URL": f"{base_url}/v1/messages",
+        "DEEPSEEK_API_URL": f"{base_url}/v1/chat/completions",
+        "PERPLEXITY_API_KEY": "bench",
+        "ANTHROPIC_API_KEY": "bench",
+        "DEEPSEEK_API_KEY": "bench",
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Local stand-in for the AutoAuthor LLM providers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=DEFAULT_CONFIG["latency"])
+    parser.add_argument("--chunk-delay", type=float, default=DEFAULT_CONFIG["chunk_delay"])
+    parser.add_argument("--words", type=int, default=DEFAULT_CONFIG["words"])
+    parser.add_argument("--error-rate", type=float, default=DEFAULT_CONFIG["error_rate"])
+    parser.add_argument("--rate-limit-rate", type=float, default=DEFAULT_CONFIG["rate_limit_rate"])
+    parser.add_argument("--model-latency", action="append", default=[], metavar="MODEL=SECONDS",
+                        help="Per-model latency override (repeatable)")
+    parser.add_argument("--slow-rate", type=float, default=DEFAULT_CONFIG["slow_rate"])
+    parser.add_argument("--slow-latency", type=float, default=DEFAULT_CONFIG["slow_latency"])
+    parser.add_argument("--failing-model", action="append", default=[], help="Model answered with 503s (repeatable)")
+    parser.add_argument("--truncate-rate", type=float, default=DEFAULT_CONFIG["truncate_rate"])
+    return parser.parse_args()
+
+
+def parse_model_latency(values: list) -> dict:
+    latencies = {}
+    for value in values:
+        model, _, seconds = value.partition("=")
+        latencies[model] = float(seconds)
+    return latencies
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    config = {
+        "latency": args.latency,
+        "chunk_delay": args.chunk_delay,
+        "words": args.words,
+        "error_rate": args.error_rate,
+        "rate_limit_rate": args.rate_limit_rate,
+        "model_latency": parse_model_latency(args.model_latency),
+        "slow_rate": args.slow_rate,
+        "slow_latency": args.slow_latency,
+        "failing_models": args.failing_model,
+        "truncate_rate": args.truncate_rate,
+    }
+    print(f"🧪 Mock LLM server on http://{args.host}:{args.port}")
+    web.run_app(create_app(config), host=args.host, port=args.port, access_log=None)
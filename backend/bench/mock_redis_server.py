@@ -0,0 +1,272 @@
+import argparse
+import asyncio
+import time
+
+# Stand-in for the subset of Redis that the coordination backend uses (RESP2 over TCP).
+# Single process, in memory, no persistence: for local multi-worker runs and benchmarks only.
+COMMANDS = ("PING", "AUTH", "SELECT", "GET", "SET", "DEL", "EXISTS", "EXPIRE", "INCRBYFLOAT",
+            "XADD", "XREAD", "XLEN", "FLUSHALL", "DBSIZE")
+
+
+class ReplyError(Exception):
+    pass
+
+
+def _encode(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, ReplyError):
+        return b"-%s\r\n" % str(value).encode("utf-8")
+    if isinstance(value, bool):
+        return b":%d\r\n" % int(value)
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(_encode(item) for item in value)
+    if isinstance(value, str) and value in ("OK", "PONG"):
+        return b"+%s\r\n" % value.encode("utf-8")
+    data = value if isinstance(value, bytes) else str(value).encode("utf-8")
+    return b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+async def _read_command(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline command (e.g. typed into telnet)
+        return line.decode("utf-8").split()
+    args = []
+    for _ in range(int(line[1:-2])):
+        header = await reader.readline()
+        length = int(header[1:-2])
+        args.append((await reader.readexactly(length + 2))[:-2].decode("utf-8"))
+    return args
+
+
+def _parse_id(value: str) -> tuple:
+    ms, _, seq = value.partition("-")
+    return int(ms), int(seq or 0)
+
+
+class Store:
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.changed = asyncio.Event()
+        self.stats = {"commands": 0, "connections": 0}
+
+    def _alive(self, key: str) -> bool:
+        deadline = self.expires.get(key)
+        if deadline is not None and time.monotonic() >= deadline:
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def _notify(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    async def execute(self, args: list):
+        self.stats["commands"] += 1
+        name = args[0].upper()
+        if name not in COMMANDS:
+            return ReplyError(f"ERR unknown command '{args[0]}'")
+        try:
+            return await getattr(self, f"cmd_{name.lower()}")(*args[1:])
+        except ReplyError as e:
+            return e
+        except (TypeError, ValueError, IndexError):
+            return ReplyError(f"ERR wrong arguments for '{name.lower()}' command")
+
+    async def cmd_ping(self, *args):
+        return args[0] if args else "PONG"
+
+    async def cmd_auth(self, *args):
+        return "OK"
+
+    async def cmd_select(self, db):
+        return "OK"
+
+    async def cmd_flushall(self, *args):
+        self.data.clear()
+        self.expires.clear()
+        return "OK"
+
+    async def cmd_dbsize(self):
+        return sum(1 for key in list(self.data) if self._alive(key))
+
+    async def cmd_get(self, key):
+        if not self._alive(key):
+            return None
+        value = self.data[key]
+        if not isinstance(value, str):
+            raise ReplyError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    async def cmd_set(self, key, value, *options):
+        ttl = None
+        flags = set()
+        index = 0
+        while index < len(options):
+            option = options[index].upper()
+            if option in ("EX", "PX"):
+                ttl = float(options[index + 1]) / (1 if option == "EX" else 1000)
+                index += 2
+            elif option in ("NX", "XX"):
+                flags.add(option)
+                index += 1
+            else:
+                raise ReplyError("ERR syntax error")
+        exists = self._alive(key)
+        if ("NX" in flags and exists) or ("XX" in flags and not exists):
+            return None
+        self.data[key] = value
+        self.expires.pop(key, None)
+        if ttl is not None:
+            self.expires[key] = time.monotonic() + ttl
+        return "OK"
+
+    async def cmd_del(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._alive(key):
+                del self.data[key]
+                self.expires.pop(key, None)
+                removed += 1
+        return removed
+
+    async def cmd_exists(self, *keys):
+        return sum(1 for key in keys if self._alive(key))
+
+    async def cmd_expire(self, key, seconds):
+        if not self._alive(key):
+            return 0
+        self.expires[key] = time.monotonic() + float(seconds)
+        return 1
+
+    async def cmd_incrbyfloat(self, key, amount):
+        # Keeps any TTL, like Redis
+        current = float(self.data[key]) if self._alive(key) else 0.0
+        value = repr(current + float(amount))
+        self.data[key] = value
+        return value
+
+    async def cmd_xadd(self, key, *args):
+        args = list(args)
+        maxlen = None
+        if args[0].upper() == "MAXLEN":
+            args.pop(0)
+            if args[0] in ("~", "="):
+                args.pop(0)
+            maxlen = int(args.pop(0))
+        entry_id, fields = args[0], args[1:]
+        if not fields or len(fields) % 2:
+            raise ReplyError("ERR wrong number of arguments for 'xadd' command")
+        if not self._alive(key):
+            self.data[key] = []
+        stream = self.data[key]
+        if not isinstance(stream, list):
+            raise ReplyError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        last = stream[-1][0] if stream else (0, 0)
+        if entry_id == "*":
+            now = int(time.time() * 1000)
+            new_id = (now, last[1] + 1) if now <= last[0] else (now, 0)
+            new_id = max(new_id, (last[0], last[1] + 1))
+        else:
+            new_id = _parse_id(entry_id)
+            if new_id <= last or new_id == (0, 0):
+                raise ReplyError("ERR The ID specified in XADD is equal or smaller than the target stream top item")
+        stream.append((new_id, fields))
+        if maxlen is not None and len(stream) > maxlen:
+            del stream[:len(stream) - maxlen]
+        self._notify()
+        return f"{new_id[0]}-{new_id[1]}"
+
+    async def cmd_xlen(self, key):
+        return len(self.data[key]) if self._alive(key) else 0
+
+    def _entries_after(self, key: str, after: tuple, count: int) -> list:
+        if not self._alive(key):
+            return []
+        entries = [entry for entry in self.data[key] if entry[0] > after]
+        return [[f"{entry_id[0]}-{entry_id[1]}", list(fields)] for entry_id, fields in entries[:count]]
+
+    async def cmd_xread(self, *args):
+        args = list(args)
+        count = 1 << 30
+        block = None
+        while args[0].upper() != "STREAMS":
+            option = args.pop(0).upper()
+            if option == "COUNT":
+                count = int(args.pop(0))
+            elif option == "BLOCK":
+                block = int(args.pop(0)) / 1000
+            else:
+                raise ReplyError(f"ERR unsupported XREAD option '{option}'")
+        args.pop(0)
+        half = len(args) // 2
+        keys, ids = args[:half], args[half:]
+        after = [_parse_id(value) for value in ids]
+        deadline = time.monotonic() + block if block else None
+        while True:
+            changed = self.changed
+            reply = []
+            for key, position in zip(keys, after):
+                entries = self._entries_after(key, position, count)
+                if entries:
+                    reply.append([key, entries])
+            if reply:
+                return reply
+            if block is None:
+                return None
+            remaining = deadline - time.monotonic() if deadline else None
+            if remaining is not None and remaining <= 0:
+                return None
+            try:
+                await asyncio.wait_for(changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                return None
+
+
+async def start_mock_redis(host: str = "127.0.0.1", port: int = 0):
+    # Returns (server, url); call server.close() to stop
+    store = Store()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        store.stats["connections"] += 1
+        try:
+            while True:
+                args = await _read_command(reader)
+                if not args:
+                    break
+                writer.write(_encode(await store.execute(args)))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    server.store = store
+    bound_port = server.sockets[0].getsockname()[1]
+    return server, f"redis://{host}:{bound_port}/0"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Redis commands AutoAuthor's coordination uses")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    return parser.parse_args()
+
+
+async def serve(host: str, port: int):
+    server, url = await start_mock_redis(host, port)
+    print(f"🧪 Mock Redis server on {url}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    asyncio.run(serve(args.host, args.port))
@@ -0,0 +1,248 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+from mock_llm_server import DEFAULT_CONFIG, provider_env, start_mock_server
+from mock_redis_server import start_mock_redis
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGES = ["research", "writer", "seo", "humanizer", "output"]
+# Extra brief fields applied to every generated brief (set from the command line)
+BRIEF_OVERRIDES = {}
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return round(ordered[index], 3)
+
+
+def summarize(values: list) -> dict:
+    return {"p50": percentile(values, 50), "p95": percentile(values, 95), "p99": percentile(values, 99), "n": len(values)}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def peak_rss_mb(pid: int) -> float:
+    # VmHWM is the process's resident set high-water mark (Linux only)
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def brief(index: int) -> dict:
+    return {
+        "topic": f"Benchmark topic {index}",
+        "target_audience": "Engineering managers",
+        "keywords": "remote work, async communication",
+        "article_length": "medium",
+        **BRIEF_OVERRIDES,
+    }
+
+
+async def run_stream_client(session: aiohttp.ClientSession, base_url: str, index: int) -> dict:
+    started = time.perf_counter()
+    first_token = None
+    async with session.get(f"{base_url}/generate-stream", params={k: str(v) for k, v in brief(index).items()}) as response:
+        if response.status != 200:
+            return {"ok": False, "status": response.status, "seconds": time.perf_counter() - started}
+        async for raw_line in response.content:
+            line = raw_line.decode("utf-8").strip()
+            if not line.startswith("data:"):
+                continue
+            event = json.loads(line[len("data:"):].strip())
+            if event["status"] == "token" and first_token is None:
+                first_token = time.perf_counter() - started
+            if event["status"] == "complete":
+                return {
+                    "ok": True,
+                    "seconds": time.perf_counter() - started,
+                    "first_token": first_token,
+                    "timings": event.get("timings", {}),
+                }
+            if event["status"] == "error":
+                return {"ok": False, "error": event["message"], "seconds": time.perf_counter() - started}
+    return {"ok": False, "error": "stream ended early", "seconds": time.perf_counter() - started}
+
+
+async def run_generate_client(session: aiohttp.ClientSession, base_url: str, index: int) -> dict:
+    started = time.perf_counter()
+    async with session.post(f"{base_url}/generate", json=brief(index)) as response:
+        body = await response.read()
+        return {"ok": response.status == 200, "status": response.status, "bytes": len(body),
+                "seconds": time.perf_counter() - started}
+
+
+async def drive(base_url: str, endpoint: str, clients: int, articles: int) -> list:
+    counter = iter(range(articles))
+    results = []
+    client_fn = run_stream_client if endpoint == "stream" else run_generate_client
+    timeout = aiohttp.ClientTimeout(total=None, sock_read=900)
+
+    async def client(session: aiohttp.ClientSession):
+        for index in counter:
+            try:
+                results.append(await client_fn(session, base_url, index))
+            except Exception as e:
+                results.append({"ok": False, "error": repr(e), "seconds": 0.0})
+
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        await asyncio.gather(*(client(session) for _ in range(clients)))
+    return results
+
+
+def report(endpoint: str, results: list, wall: float) -> dict:
+    ok = [r for r in results if r["ok"]]
+    stages = {}
+    for stage in STAGES:
+        values = [r["timings"][stage]["seconds"] for r in ok if stage in r.get("timings", {})]
+        if values:
+            stages[stage] = summarize(values)
+    return {
+        "endpoint": endpoint,
+        "articles": len(results),
+        "succeeded": len(ok),
+        "failed": len(results) - len(ok),
+        "errors": sorted({r.get("error") or f"HTTP {r.get('status')}" for r in results if not r["ok"]})[:5],
+        "wall_seconds": round(wall, 3),
+        "articles_per_minute": round(len(ok) / wall * 60, 2) if wall else None,
+        "end_to_end": summarize([r["seconds"] for r in ok]),
+        "first_token": summarize([r["first_token"] for r in ok if r.get("first_token") is not None]),
+        "stages": stages,
+    }
+
+
+async def main(args) -> dict:
+    mock_config = {
+        "latency": args.latency,
+        "chunk_delay": args.chunk_delay,
+        "words": args.words,
+        "error_rate": args.error_rate,
+        "rate_limit_rate": args.rate_limit_rate,
+        "truncate_rate": args.truncate_rate,
+    }
+    mock_runner, mock_url = await start_mock_server(mock_config)
+    redis_server = None
+    workdir = tempfile.mkdtemp(prefix="autoauthor_bench_")
+    port = free_port()
+    env = {
+        **os.environ,
+        **provider_env(mock_url),
+        "AUTOAUTHOR_OUTPUT_DIR": os.path.join(workdir, "output"),
+        "RESEARCH_CACHE_PATH": os.path.join(workdir, "research_cache.sqlite3"),
+        "RESEARCH_CACHE_ENABLED": "true" if args.research_cache else "false",
+        "SECTION_CACHE_PATH": os.path.join(workdir, "section_cache.sqlite3"),
+        "SECTION_CACHE_ENABLED": "true" if args.section_cache else "false",
+        # Every benchmark brief is the same, so auto mode would seed every research prompt after the first
+        "SIMILARITY_INDEX_PATH": os.path.join(workdir, "similarity.sqlite3"),
+        "SIMILAR_RESEARCH_MODE": "auto" if args.similar_research else "off",
+        "MAX_CONCURRENT_JOBS": str(args.max_jobs),
+        "MAX_QUEUE_SIZE": str(max(args.clients * 2, 50)),
+    }
+    if args.coordination == "redis":
+        # Workers share the job registry, event logs and rate limits through the stand-in server
+        redis_server, env["COORDINATION_URL"] = await start_mock_redis()
+    if not args.keep_rate_limits:
+        for provider in ("PERPLEXITY", "ANTHROPIC", "DEEPSEEK"):
+            env[f"{provider}_RPS"] = "10000"
+            env[f"{provider}_BURST"] = "10000"
+            env[f"{provider}_CONCURRENCY"] = str(args.max_jobs * 2)
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning",
+         "--workers", str(args.workers)],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL if not args.verbose else None,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    reports = []
+    try:
+        async with aiohttp.ClientSession() as session:
+            for _ in range(100):
+                try:
+                    async with session.get(f"{base_url}/health") as response:
+                        if response.status == 200:
+                            break
+                except aiohttp.ClientError:
+                    pass
+                await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("Backend did not become healthy")
+
+        endpoints = ["stream", "generate"] if args.endpoint == "both" else [args.endpoint]
+        for endpoint in endpoints:
+            started = time.perf_counter()
+            results = await drive(base_url, endpoint, args.clients, args.articles)
+            reports.append(report(endpoint, results, time.perf_counter() - started))
+        summary = {
+            "clients": args.clients,
+            "max_jobs": args.max_jobs,
+            "workers": args.workers,
+            "coordination": args.coordination,
+            "mock": {**mock_config, **mock_runner.app["stats"]},
+            "peak_rss_mb": peak_rss_mb(server.pid),
+            "results": reports,
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+        await mock_runner.cleanup()
+        if redis_server is not None:
+            redis_server.close()
+    return summary
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline AutoAuthor throughput benchmark against a mock LLM server")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent HTTP clients")
+    parser.add_argument("--articles", type=int, default=32, help="articles to generate per endpoint")
+    parser.add_argument("--endpoint", choices=["stream", "generate", "both"], default="both")
+    parser.add_argument("--max-jobs", type=int, default=8, help="MAX_CONCURRENT_JOBS for the backend (per worker)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--coordination", choices=["local", "redis"], default="local",
+                        help="redis runs a stand-in Redis server so workers share state")
+    parser.add_argument("--latency", type=float, default=DEFAULT_CONFIG["latency"])
+    parser.add_argument("--chunk-delay", type=float, default=DEFAULT_CONFIG["chunk_delay"])
+    parser.add_argument("--words", type=int, default=DEFAULT_CONFIG["words"])
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="fraction of answers cut off at the token cap")
+    parser.add_argument("--article-length", choices=["short", "medium", "long"], default="medium")
+    parser.add_argument("--writer-mode", choices=["single", "sectioned"], default="single")
+    parser.add_argument("--research-cache", action="store_true", help="leave the research cache enabled")
+    parser.add_argument("--section-cache", action="store_true", help="leave the section cache enabled")
+    parser.add_argument("--similar-research", action="store_true", help="seed research prompts from similar briefs")
+    parser.add_argument("--keep-rate-limits", action="store_true", help="keep the default provider rate limits")
+    parser.add_argument("--json", help="also write the summary to this file")
+    parser.add_argument("--verbose", action="store_true")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    BRIEF_OVERRIDES.update(article_length=args.article_length, writer_mode=args.writer_mode)
+    summary = asyncio.run(main(args))
+    print(json.dumps(summary, indent=2))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
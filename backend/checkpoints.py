@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+
+MANIFEST_NAME = "manifest.json"
+
+# Pipeline stages in execution order and the file each one leaves in the run folder
+STAGES = ["research", "writer", "seo", "humanizer", "output"]
+STAGE_FILES = {
+    "research": "research.txt",
+    "writer": "writer.md",
+    "seo": "seo.md",
+    "humanizer": "humanizer.md",
+    "output": "final.docx",
+}
+
+
+def inputs_hash(user_input: dict) -> str:
+    material = json.dumps(user_input, sort_keys=True, default=str)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def load_manifest(output_dir: str) -> dict:
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(output_dir: str, manifest: dict):
+    manifest["updated_at"] = datetime.now().isoformat()
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def prepare_manifest(job: dict) -> dict:
+    # Start a fresh manifest whenever the brief no longer matches the recorded one
+    output_dir = job["output_dir"]
+    digest = inputs_hash(job["user_input"])
+    manifest = load_manifest(output_dir)
+    if manifest is None or manifest.get("inputs_hash") != digest:
+        manifest = {
+            "job_id": job["id"],
+            "inputs_hash": digest,
+            "user_input": job["user_input"],
+            "stages": {},
+            "status": "running",
+            "created_at": datetime.now().isoformat(),
+        }
+    manifest["status"] = "running"
+    save_manifest(output_dir, manifest)
+    return manifest
+
+
+def reusable_stages(manifest: dict, output_dir: str, resume_from: str = None) -> list:
+    # Only the unbroken prefix of completed stages before resume_from can be reused
+    reusable = []
+    for stage in STAGES:
+        if stage == resume_from:
+            break
+        if stage not in manifest.get("stages", {}):
+            break
+        if not os.path.exists(os.path.join(output_dir, STAGE_FILES[stage])):
+            break
+        reusable.append(stage)
+    return reusable
+
+
+def mark_stage_complete(output_dir: str, stage: str):
+    manifest = load_manifest(output_dir) or {"stages": {}}
+    manifest.setdefault("stages", {})[stage] = {
+        "file": STAGE_FILES[stage],
+        "completed_at": datetime.now().isoformat(),
+    }
+    save_manifest(output_dir, manifest)
+
+
+def mark_run_status(output_dir: str, status: str, error: str = None):
+    manifest = load_manifest(output_dir)
+    if manifest is None:
+        return
+    manifest["status"] = status
+    manifest["error"] = error
+    save_manifest(output_dir, manifest)
+
+
+def record_timings(output_dir: str, timings: dict):
+    manifest = load_manifest(output_dir)
+    if manifest is None:
+        return
+    manifest["timings"] = timings
+    save_manifest(output_dir, manifest)
+
+
+def record_similarity(output_dir: str, similarity: dict):
+    manifest = load_manifest(output_dir)
+    if manifest is None:
+        return
+    manifest["similarity"] = similarity
+    save_manifest(output_dir, manifest)
+
+
+def record_checks(output_dir: str, checks: dict):
+    # Local text checks per stage; a resumed run keeps the checks of the stages it restored
+    manifest = load_manifest(output_dir)
+    if manifest is None:
+        return
+    manifest.setdefault("checks", {}).update(checks)
+    save_manifest(output_dir, manifest)
+
+
+def read_stage_output(output_dir: str, stage: str) -> str:
+    path = os.path.join(output_dir, STAGE_FILES[stage])
+    if stage == "output":
+        return path
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def find_manifest_dir(base_dir: str, job_id: str) -> str:
+    # Locate a run folder by job ID when the in-memory registry no longer knows it
+    if not os.path.isdir(base_dir):
+        return None
+    for entry in os.scandir(base_dir):
+        if not entry.is_dir():
+            continue
+        manifest = load_manifest(entry.path)
+        if manifest and manifest.get("job_id") == job_id:
+            return entry.path
+    return None
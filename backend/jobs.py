@@ -0,0 +1,350 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+from agents.coordination import get_coordinator
+from agents.output_agent import sanitize_filename
+
+# Base output directory
+OUTPUT_BASE_DIR = os.getenv("AUTOAUTHOR_OUTPUT_DIR", "output")
+os.makedirs(OUTPUT_BASE_DIR, exist_ok=True)
+
+# Every brief field the agents read, with its default value
+BRIEF_DEFAULTS = {
+    "topic": "",
+    "draft_title": "",
+    "content_direction": "",
+    "keywords": "",
+    "target_audience": "",
+    "industry_vertical": "",
+    "audience_pain_points": "",
+    "geographic_focus": "",
+    "content_goal": "Educate",
+    "tonality": "Conversational",
+    "structure_style": "listicle",
+    "article_length": "medium",
+    "reading_level": "Intermediate",
+    "reference_brands": "",
+    "call_to_action": "",
+    "include_competitors": True
+}
+
+# Every run is indexed in SQLite; jobs still in flight are also kept in memory
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join(OUTPUT_BASE_DIR, "jobs.sqlite3"))
+MAX_PAGE_SIZE = 200
+ACTIVE_STATUSES = ("pending", "queued", "running")
+
+# Live job records keyed by job ID (finished jobs are read back from the store)
+JOBS = {}
+
+_COLUMNS = (
+    "id", "status", "topic", "batch_id", "output_dir", "docx_path", "error", "user_input",
+    "timings", "prompt_tokens", "completion_tokens", "created_at", "updated_at",
+)
+_JSON_COLUMNS = ("user_input", "timings")
+
+# One reused connection per thread; async code reaches the store through asyncio.to_thread
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+def _open() -> sqlite3.Connection:
+    conn = sqlite3.connect(JOB_DB_PATH, timeout=10)
+    # WAL lets history reads run alongside the pipeline's status writes
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def init_job_store():
+    # Creates the schema once per process (at startup, or on first use outside the server)
+    global _schema_ready
+    with _schema_lock:
+        if _schema_ready:
+            return
+        directory = os.path.dirname(JOB_DB_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = _connect_thread()
+        with conn:
+            _create_schema(conn)
+        _schema_ready = True
+
+
+def _create_schema(conn: sqlite3.Connection):
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS jobs ("
+        " id TEXT PRIMARY KEY,"
+        " status TEXT NOT NULL,"
+        " topic TEXT COLLATE NOCASE,"
+        " batch_id TEXT,"
+        " output_dir TEXT,"
+        " docx_path TEXT,"
+        " error TEXT,"
+        " user_input TEXT,"
+        " timings TEXT,"
+        " prompt_tokens INTEGER,"
+        " completion_tokens INTEGER,"
+        " created_at TEXT NOT NULL,"
+        " updated_at TEXT NOT NULL)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs (created_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_topic_created ON jobs (topic, created_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_batch ON jobs (batch_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_output_dir ON jobs (output_dir)")
+    # Batches live here too, so any worker can report on a batch another worker is running
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS batches ("
+        " id TEXT PRIMARY KEY,"
+        " job_ids TEXT NOT NULL,"
+        " parallelism INTEGER NOT NULL,"
+        " created_at TEXT NOT NULL)"
+    )
+
+
+def _connect_thread() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = _open()
+    return conn
+
+
+def _connect() -> sqlite3.Connection:
+    # Used as "with _connect() as conn:", which commits (or rolls back) but keeps the connection open
+    if not _schema_ready:
+        init_job_store()
+    return _connect_thread()
+
+
+def _save(job: dict):
+    row = [job.get(column) for column in _COLUMNS]
+    for column in _JSON_COLUMNS:
+        index = _COLUMNS.index(column)
+        row[index] = json.dumps(row[index]) if row[index] is not None else None
+    with _connect() as conn:
+        conn.execute(
+            f"INSERT OR REPLACE INTO jobs ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+            row,
+        )
+    # Let other workers find this job (no-op for the local backend, and off the event loop, where the
+    # *_async wrappers publish once the write is done)
+    get_coordinator().publish_job(job)
+
+
+def _row_to_job(row: tuple) -> dict:
+    job = dict(zip(_COLUMNS, row))
+    for column in _JSON_COLUMNS:
+        if job[column] is not None:
+            job[column] = json.loads(job[column])
+    return job
+
+
+def active_job_ids() -> list:
+    with _connect() as conn:
+        rows = conn.execute(
+            f"SELECT id FROM jobs WHERE status IN ({', '.join('?' * len(ACTIVE_STATUSES))})", ACTIVE_STATUSES
+        ).fetchall()
+    return [row[0] for row in rows]
+
+
+def active_output_dirs() -> list:
+    # Run folders of jobs in flight on any worker sharing this store
+    with _connect() as conn:
+        rows = conn.execute(
+            f"SELECT output_dir FROM jobs WHERE status IN ({', '.join('?' * len(ACTIVE_STATUSES))})", ACTIVE_STATUSES
+        ).fetchall()
+    return [row[0] for row in rows if row[0]]
+
+
+def mark_interrupted_jobs(exclude=()) -> int:
+    # Jobs left in flight by a previous process can never finish; they stay resumable.
+    # exclude holds jobs another live worker is still running.
+    orphaned = [job_id for job_id in active_job_ids() if job_id not in exclude]
+    if not orphaned:
+        return 0
+    with _connect() as conn:
+        return conn.execute(
+            f"UPDATE jobs SET status = 'interrupted', error = 'Server restarted', updated_at = ?"
+            f" WHERE id IN ({', '.join('?' * len(orphaned))})",
+            (datetime.now().isoformat(), *orphaned),
+        ).rowcount
+
+
+def apply_brief_defaults(user_input: dict) -> dict:
+    for key, value in BRIEF_DEFAULTS.items():
+        user_input.setdefault(key, value)
+    return user_input
+
+
+def create_output_dir(user_input: dict) -> str:
+    # Create dynamic output folder: sanitized_topic_dayMonth_HHMM
+    topic = user_input["topic"] or "article"
+    sanitized_topic = sanitize_filename(topic)
+    timestamp = datetime.now().strftime("%d%B_%H%M")
+    base_dir = os.path.join(OUTPUT_BASE_DIR, f"{sanitized_topic}_{timestamp}")
+    # Runs of the same topic within the same minute get a numeric suffix instead of sharing a folder
+    output_dir = base_dir
+    suffix = 2
+    while True:
+        try:
+            os.makedirs(output_dir)
+            return output_dir
+        except FileExistsError:
+            output_dir = f"{base_dir}_{suffix}"
+            suffix += 1
+
+
+def create_job(user_input: dict, output_dir: str, job_id: str = None, batch_id: str = None) -> dict:
+    job_id = job_id or uuid.uuid4().hex
+    job = {
+        "id": job_id,
+        "status": "pending",
+        "topic": user_input.get("topic", ""),
+        "batch_id": batch_id,
+        "user_input": user_input,
+        "output_dir": output_dir,
+        "docx_path": None,
+        "error": None,
+        "timings": None,
+        "prompt_tokens": None,
+        "completion_tokens": None,
+        "created_at": datetime.now().isoformat(),
+        "updated_at": datetime.now().isoformat(),
+    }
+    JOBS[job_id] = job
+    _save(job)
+    return job
+
+
+async def create_job_async(user_input: dict, output_dir: str, job_id: str = None, batch_id: str = None) -> dict:
+    job = await asyncio.to_thread(create_job, user_input, output_dir, job_id, batch_id)
+    get_coordinator().publish_job(job)
+    return job
+
+
+def get_job(job_id: str) -> dict:
+    job = JOBS.get(job_id)
+    if job is not None:
+        return job
+    with _connect() as conn:
+        row = conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _row_to_job(row) if row else None
+
+
+async def lookup_job(job_id: str) -> dict:
+    # Like get_job, but also sees jobs running on other workers through the coordination backend
+    job = JOBS.get(job_id)
+    if job is not None:
+        return job
+    coordinator = get_coordinator()
+    if not coordinator.local:
+        try:
+            job = await coordinator.get_job(job_id)
+        except Exception as e:
+            print(f"⚠️ Coordination lookup failed for job {job_id}: {e}")
+        if job is not None:
+            return job
+    return await asyncio.to_thread(get_job, job_id)
+
+
+def update_job(job_id: str, **fields) -> dict:
+    job = get_job(job_id)
+    if job is None:
+        # Unknown or deleted job: there is nothing to update
+        print(f"⚠️ Ignoring update for unknown job {job_id}")
+        return None
+    job.update(fields)
+    job["updated_at"] = datetime.now().isoformat()
+    _save(job)
+    # Finished jobs live only in the store
+    if job["status"] in ACTIVE_STATUSES:
+        JOBS[job_id] = job
+    else:
+        JOBS.pop(job_id, None)
+    return job
+
+
+async def update_job_async(job_id: str, **fields) -> dict:
+    job = await asyncio.to_thread(update_job, job_id, **fields)
+    if job is not None:
+        get_coordinator().publish_job(job)
+    return job
+
+
+def save_batch(batch: dict):
+    with _connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO batches (id, job_ids, parallelism, created_at) VALUES (?, ?, ?, ?)",
+            (batch["id"], json.dumps(batch["job_ids"]), batch["parallelism"], batch["created_at"]),
+        )
+
+
+def load_batch(batch_id: str) -> dict:
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT id, job_ids, parallelism, created_at FROM batches WHERE id = ?", (batch_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        statuses = [status for (status,) in conn.execute("SELECT status FROM jobs WHERE batch_id = ?", (batch_id,))]
+    return {
+        "id": row[0],
+        "job_ids": json.loads(row[1]),
+        "parallelism": row[2],
+        "created_at": row[3],
+        "job_statuses": statuses,
+    }
+
+
+def mark_output_removed(output_dir: str, status: str):
+    # The run folder was deleted by retention; keep the history row but drop its files
+    with _connect() as conn:
+        conn.execute(
+            "UPDATE jobs SET status = ?, docx_path = NULL, updated_at = ? WHERE output_dir = ?",
+            (status, datetime.now().isoformat(), output_dir),
+        )
+
+
+def list_jobs(topic: str = None, status: str = None, created_after: str = None, created_before: str = None,
+              batch_id: str = None, limit: int = 50, cursor: str = None) -> dict:
+    # Newest first, paged by (created_at, id) so each page is an index range scan
+    clauses = []
+    params = []
+    if topic:
+        escaped = topic.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        clauses.append("topic LIKE ? ESCAPE '\\'")
+        params.append(f"{escaped}%")
+    if status:
+        clauses.append("status = ?")
+        params.append(status)
+    if batch_id:
+        clauses.append("batch_id = ?")
+        params.append(batch_id)
+    if created_after:
+        clauses.append("created_at >= ?")
+        params.append(created_after)
+    if created_before:
+        clauses.append("created_at < ?")
+        params.append(created_before)
+    if cursor:
+        cursor_created, _, cursor_id = cursor.partition("|")
+        clauses.append("(created_at < ? OR (created_at = ? AND id < ?))")
+        params += [cursor_created, cursor_created, cursor_id]
+
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    with _connect() as conn:
+        rows = conn.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM jobs {where} ORDER BY created_at DESC, id DESC LIMIT ?",
+            (*params, limit + 1),
+        ).fetchall()
+
+    jobs = [_row_to_job(row) for row in rows[:limit]]
+    next_cursor = f"{jobs[-1]['created_at']}|{jobs[-1]['id']}" if len(rows) > limit else None
+    return {"jobs": jobs, "next_cursor": next_cursor}
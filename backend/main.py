@@ -1,19 +1,68 @@
 import asyncio
 import json
 import os
-from datetime import datetime
-from fastapi import FastAPI, Request
-from fastapi.responses import StreamingResponse
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from sse_starlette.sse import EventSourceResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from agents.research_agent import run_research_agent
-from agents.writer_agent import run_writer_agent
-from agents.seo_agent import run_seo_agent
-from agents.humanizer_agent import run_humanizer_agent
-from agents.output_agent import get_docx_stream, sanitize_filename
-
-app = FastAPI()
+from agents.coordination import get_coordinator, worker_heartbeat_loop
+from agents.output_agent import DOCUMENT_NAME, RENDERERS, parse_document, render_format, rendered_formats, save_document
+from agents.http_client import close_session
+from agents.research_cache import get_cache_stats
+from agents.sections import get_section_cache_stats
+from checkpoints import STAGE_FILES, STAGES, find_manifest_dir, load_manifest, mark_stage_complete, prepare_manifest
+from jobs import (
+    OUTPUT_BASE_DIR,
+    apply_brief_defaults,
+    create_job_async,
+    create_output_dir,
+    active_job_ids,
+    init_job_store,
+    list_jobs,
+    lookup_job,
+    mark_interrupted_jobs,
+    update_job_async,
+)
+from batches import MAX_BATCH_SIZE, create_batch, get_batch, get_batch_progress, iter_batch_zip, start_batch
+from pipeline import run_pipeline
+from streams import get_stream_stats, has_stream, parse_event_id, start_stream, subscribe
+from retention import BUNDLE_NAME, RESEARCH_BLOB, disk_ok, get_storage_stats, restore_intermediates, retention_loop
+from scheduler import QUEUE_RETRY_AFTER, QueueFullError, admit, get_queue_stats, is_full, job_slot
+from agents.http_client import get_provider_stats
+from agents.router import get_router_stats
+from agents.similarity import get_similarity_stats, load_indexes, similar_briefs
+from agents.telemetry import render_prometheus
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The job store's schema is created once, before any request uses it
+    await asyncio.to_thread(init_job_store)
+    # With a shared coordination backend, jobs still owned by a live worker are left alone
+    try:
+        live = await get_coordinator().live_jobs(await asyncio.to_thread(active_job_ids))
+    except Exception as e:
+        # Without the registry we cannot tell orphans from jobs other workers are running
+        print(f"⚠️ Coordination backend unavailable at startup ({e}), not marking interrupted jobs")
+        live = set(await asyncio.to_thread(active_job_ids))
+    interrupted = await asyncio.to_thread(mark_interrupted_jobs, live)
+    if interrupted:
+        print(f"⚠️ Marked {interrupted} unfinished job(s) from a previous run as interrupted")
+    background = [
+        asyncio.create_task(retention_loop()),
+        asyncio.create_task(worker_heartbeat_loop()),
+        # The similarity index is read into memory off the event loop so the first lookup is fast
+        asyncio.create_task(asyncio.to_thread(load_indexes)),
+    ]
+    yield
+    for task in background:
+        task.cancel()
+    await get_coordinator().close()
+    # Release pooled provider connections on shutdown
+    await close_session()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -23,175 +72,387 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Base output directory
-OUTPUT_BASE_DIR = "output"
-os.makedirs(OUTPUT_BASE_DIR, exist_ok=True)
-
-latest_article = ""
+DOCX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
 
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
 
+@app.get("/queue/stats")
+def queue_stats():
+    return {
+        **get_queue_stats(),
+        "providers": get_provider_stats(),
+        "routing": get_router_stats(),
+        "similarity": get_similarity_stats(),
+        "streams": get_stream_stats(),
+    }
+
+@app.get("/metrics")
+def metrics():
+    queue = get_queue_stats()
+    providers = get_provider_stats()
+    cache = get_cache_stats()
+    sections = get_section_cache_stats()
+    storage = get_storage_stats()
+    streams = get_stream_stats()
+    similarity = get_similarity_stats()
+    gauges = {
+        "autoauthor_jobs_running": {(): queue["running"]},
+        "autoauthor_jobs_waiting": {(): queue["waiting"]},
+        "autoauthor_provider_in_flight": {
+            (("provider", provider),): stats["in_flight"] for provider, stats in providers.items()
+        },
+        "autoauthor_provider_rate_limit_wait_seconds": {
+            (("provider", provider),): stats["rate_limit_wait_seconds"] for provider, stats in providers.items()
+        },
+        "autoauthor_provider_backoff_wait_seconds": {
+            (("provider", provider),): stats["backoff_wait_seconds"] for provider, stats in providers.items()
+        },
+        "autoauthor_research_cache_hits": {(): cache["hits"]},
+        "autoauthor_research_cache_misses": {(): cache["misses"]},
+        "autoauthor_section_cache_hits": {(): sections["hits"]},
+        "autoauthor_section_cache_misses": {(): sections["misses"]},
+        "autoauthor_sse_live_streams": {(): streams["live_streams"]},
+        "autoauthor_sse_subscribers": {(): streams["subscribers"]},
+        "autoauthor_sse_publish_errors": {(): streams["publish_errors"]},
+        "autoauthor_sse_reattached": {(): streams["reattached"]},
+        "autoauthor_output_bytes": {(): storage["total_bytes"]},
+        "autoauthor_output_runs": {(): storage["runs"]},
+        "autoauthor_output_free_bytes": {(): storage["free_bytes"] or 0},
+        "autoauthor_retention_evicted_runs": {(): storage["evicted_runs"]},
+        "autoauthor_retention_expired_runs": {(): storage["expired_runs"]},
+        "autoauthor_similarity_indexed": {
+            (("kind", "brief"),): similarity["briefs"], (("kind", "article"),): similarity["articles"]
+        },
+        "autoauthor_similarity_lookups": {(): similarity["lookups"]},
+    }
+    return PlainTextResponse(render_prometheus(gauges), media_type="text/plain; version=0.0.4")
+
+@app.get("/research-cache/stats")
+def research_cache_stats():
+    return get_cache_stats()
+
+@app.get("/section-cache/stats")
+def section_cache_stats():
+    return get_section_cache_stats()
+
+@app.get("/storage/stats")
+def storage_stats():
+    return get_storage_stats()
+
+def create_sse_payload(status: str, message: str, data: dict = None) -> dict:
+    payload_content = {"status": status, "message": message}
+    if data:
+        payload_content.update(data)
+    return {"data": json.dumps(payload_content), "event": "message"}
+
+def queue_full_error() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Server is at capacity, please retry shortly",
+        headers={"Retry-After": str(QUEUE_RETRY_AFTER)}
+    )
+
+def check_disk():
+    # Refuse new work while the disk is nearly full; the retention loop frees space in the background
+    if not disk_ok():
+        raise HTTPException(
+            status_code=503,
+            detail="Server is low on disk space, please retry shortly",
+            headers={"Retry-After": str(QUEUE_RETRY_AFTER)}
+        )
+
+async def admit_job(job: dict):
+    try:
+        admit(job["id"])
+    except QueueFullError:
+        await update_job_async(job["id"], status="rejected")
+        raise queue_full_error()
+
 @app.post("/generate")
 async def generate_content(request: Request):
     user_input = await request.json()
 
     # Ensure all expected fields exist
-    defaults = {
-        "topic": "",
-        "draft_title": "",
-        "content_direction": "",
-        "keywords": "",
-        "target_audience": "",
-        "industry_vertical": "",
-        "audience_pain_points": "",
-        "geographic_focus": "",
-        "content_goal": "Educate",
-        "tonality": "Conversational",
-        "structure_style": "listicle",
-        "article_length": "medium",
-        "reading_level": "Intermediate",
-        "reference_brands": "",
-        "call_to_action": "",
-        "include_competitors": True
-    }
-    for key, value in defaults.items():
-        user_input.setdefault(key, value)
-
-    # Create dynamic output folder: sanitized_topic_dayMonth_HHMM
-    topic = user_input["topic"] or "article"
-    sanitized_topic = sanitize_filename(topic)
-    timestamp = datetime.now().strftime("%d%B_%H%M")
-    output_dir = os.path.join(OUTPUT_BASE_DIR, f"{sanitized_topic}_{timestamp}")
-    os.makedirs(output_dir, exist_ok=True)
-
-    print("📡 ResearchAgent starting...")
-    research_summary = run_research_agent(user_input, output_dir)["result"]
-
-    print("✍️ WriterAgent starting...")
-    raw_article = run_writer_agent(user_input, research_summary, output_dir)["article"]
-
-    print("📈 SEOAgent starting...")
-    optimized_article = run_seo_agent(user_input, raw_article, output_dir)["optimized_article"]
-
-    print("🧠 HumanizerAgent starting...")
-    final_article = run_humanizer_agent(user_input, optimized_article, research_summary, output_dir)["final_article"]
-
-    print("📄 Generating and saving .docx file...")
-    docx_stream = get_docx_stream(final_article)
-    # Save DOCX to output folder
-    docx_path = os.path.join(output_dir, "final.docx")
-    with open(docx_path, "wb") as f:
-        f.write(docx_stream.getvalue())
-    # Reset stream for streaming response
-    docx_stream.seek(0)
-
-    filename = f"{sanitized_topic}_{timestamp}.docx"
-    return StreamingResponse(
-        docx_stream,
-        media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    apply_brief_defaults(user_input)
+
+    if is_full():
+        raise queue_full_error()
+    check_disk()
+    output_dir = create_output_dir(user_input)
+    job = await create_job_async(user_input, output_dir)
+    await admit_job(job)
+
+    try:
+        async with job_slot(job["id"]):
+            await update_job_async(job["id"], status="running")
+            result = await run_pipeline(job)
+    except Exception as e:
+        await update_job_async(job["id"], status="failed", error=str(e))
+        raise
+    await update_job_async(job["id"], status="complete", docx_path=result["docx_path"])
+
+    filename = f"{os.path.basename(output_dir)}.docx"
+    return FileResponse(
+        result["docx_path"],
+        media_type=DOCX_MEDIA_TYPE,
+        filename=filename,
+        headers={"X-Job-ID": job["id"]}
     )
 
 @app.get("/generate")
-async def download_generated_article():
-    global latest_article
-    if not latest_article:
-        return {"error": "No article available. Please generate content first."}
-    
-    docx_stream = get_docx_stream(latest_article)
+async def download_generated_article(job_id: str = ""):
+    if not job_id:
+        return {"error": "No job specified. Use the job_id from the generation stream."}
+    return await download_job(job_id)
+
+@app.get("/jobs")
+async def job_history(
+    topic: str = None,
+    status: str = None,
+    created_after: str = None,
+    created_before: str = None,
+    batch_id: str = None,
+    limit: int = 50,
+    cursor: str = None,
+):
+    # Newest first; pass next_cursor back as ?cursor= for the following page
+    return await asyncio.to_thread(list_jobs, topic, status, created_after, created_before, batch_id, limit, cursor)
+
+@app.get("/jobs/{job_id}")
+async def job_detail(job_id: str):
+    job = await lookup_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    files = {
+        stage: os.path.join(job["output_dir"], name)
+        for stage, name in STAGE_FILES.items()
+        if os.path.exists(os.path.join(job["output_dir"], name))
+    }
+    # Compacted runs keep their intermediates in a bundle that is unpacked on resume
+    for key, name in (("intermediates", BUNDLE_NAME), ("research_blob", RESEARCH_BLOB)):
+        if os.path.exists(os.path.join(job["output_dir"], name)):
+            files[key] = os.path.join(job["output_dir"], name)
+    if os.path.exists(os.path.join(job["output_dir"], DOCUMENT_NAME)):
+        files["document"] = os.path.join(job["output_dir"], DOCUMENT_NAME)
+    manifest = load_manifest(job["output_dir"]) or {}
+    return {
+        **job,
+        "files": files,
+        "formats": list(RENDERERS),
+        "rendered_formats": rendered_formats(job["output_dir"]),
+        "similarity": manifest.get("similarity") or {},
+        "checks": manifest.get("checks") or {},
+    }
+
+def ensure_document(output_dir: str):
+    # Runs finished before the parsed document was saved get it rebuilt from the final article
+    if os.path.exists(os.path.join(output_dir, DOCUMENT_NAME)):
+        return
+    restore_intermediates(output_dir)
+    with open(os.path.join(output_dir, STAGE_FILES["humanizer"]), "r", encoding="utf-8") as f:
+        save_document(output_dir, parse_document(f.read()))
+
+@app.get("/jobs/{job_id}/download")
+async def download_job(job_id: str, format: str = "docx"):
+    if format not in RENDERERS:
+        raise HTTPException(status_code=400, detail=f"Unknown format '{format}', expected one of: {', '.join(RENDERERS)}")
+    job = await lookup_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] != "complete" or not job["docx_path"]:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}, no document available yet")
+    if not os.path.exists(job["docx_path"]):
+        # Multi-host deployments need output/ on shared storage
+        raise HTTPException(status_code=404, detail="Document is not available on this server")
+
+    filename = os.path.basename(job["output_dir"])
+    if format == "docx":
+        # Serve the already-rendered file from the job's output folder
+        return FileResponse(job["docx_path"], media_type=DOCX_MEDIA_TYPE, filename=f"{filename}.docx")
+
+    # Other formats are rendered on first request and cached next to final.docx
+    try:
+        await asyncio.to_thread(ensure_document, job["output_dir"])
+        path = await asyncio.to_thread(render_format, job["output_dir"], format)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="The article source is not available on this server")
+    download_name = RENDERERS[format]["filename"].replace("final", filename, 1)
+    return FileResponse(path, media_type=RENDERERS[format]["media_type"], filename=download_name)
+
+async def load_finished_job(job_id: str) -> dict:
+    job = await lookup_job(job_id)
+    if job is None:
+        # Rebuild the job from its run manifest after a restart
+        output_dir = find_manifest_dir(OUTPUT_BASE_DIR, job_id)
+        if output_dir is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        manifest = load_manifest(output_dir)
+        job = await create_job_async(manifest["user_input"], output_dir, job_id=job_id)
+    elif job["status"] in ("pending", "queued", "running"):
+        raise HTTPException(status_code=409, detail="Job is still running")
+    if not os.path.isdir(job["output_dir"]):
+        raise HTTPException(status_code=410, detail=f"Job output was removed ({job['status']})")
+    check_disk()
+    return job
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request, last_event_id: str = None):
+    # Explicit reattach for clients that open a new EventSource (which cannot set Last-Event-ID)
+    stream_job_id, run, last_seq = parse_event_id(request.headers.get("last-event-id") or last_event_id)
+    if stream_job_id not in (None, job_id):
+        raise HTTPException(status_code=400, detail="Last-Event-ID belongs to a different job")
+    return EventSourceResponse(await attach_stream(job_id, last_seq, run))
+
+@app.post("/jobs/{job_id}/resume")
+async def resume_job(job_id: str, resume_from: str = None):
+    if resume_from is not None and resume_from not in STAGES:
+        raise HTTPException(status_code=400, detail=f"resume_from must be one of {STAGES}")
+
+    job = await load_finished_job(job_id)
+    await admit_job(job)
+    return EventSourceResponse(await stream_generation(job, resume_from=resume_from))
+
+@app.post("/jobs/{job_id}/revise")
+async def revise_job(job_id: str, request: Request):
+    # Replace the draft with an edited one and re-run SEO, humanizer and output;
+    # sections the editor left alone are served from the section cache
+    body = await request.json()
+    article = body.get("article") if isinstance(body, dict) else None
+    if not isinstance(article, str) or not article.strip():
+        raise HTTPException(status_code=400, detail="Provide the edited draft as {\"article\": \"...\"}")
+
+    job = await load_finished_job(job_id)
+    prepare_manifest(job)
+    with open(os.path.join(job["output_dir"], STAGE_FILES["writer"]), "w", encoding="utf-8") as f:
+        f.write(article.strip())
+    mark_stage_complete(job["output_dir"], "writer")
+
+    await admit_job(job)
+    return EventSourceResponse(await stream_generation(job, resume_from="seo"))
+
+@app.post("/briefs/similar")
+async def similar_briefs_endpoint(request: Request, limit: int = 5, min_similarity: float = 0.3):
+    # Earlier runs whose brief reads like this one; pass a job_id as reuse_research_from to start from its research
+    brief = await request.json()
+    if not isinstance(brief, dict):
+        raise HTTPException(status_code=400, detail="The brief must be an object")
+    limit = max(1, min(limit, 50))
+    return {"matches": await asyncio.to_thread(similar_briefs, brief, limit, min_similarity)}
+
+# --- Batch Endpoints ---
+
+@app.post("/batches")
+async def create_batch_endpoint(request: Request):
+    body = await request.json()
+    briefs = body.get("briefs") if isinstance(body, dict) else body
+    if not isinstance(briefs, list) or not briefs:
+        raise HTTPException(status_code=400, detail="Provide a non-empty list of briefs")
+    if len(briefs) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"A batch may hold at most {MAX_BATCH_SIZE} briefs")
+    if not all(isinstance(brief, dict) for brief in briefs):
+        raise HTTPException(status_code=400, detail="Each brief must be an object")
+
+    check_disk()
+    parallelism = body.get("parallelism") if isinstance(body, dict) else None
+    batch = await create_batch(briefs, parallelism)
+    start_batch(batch)
+    return {"batch_id": batch["id"], "job_ids": batch["job_ids"], "parallelism": batch["parallelism"]}
+
+@app.get("/batches/{batch_id}")
+async def batch_status(batch_id: str):
+    batch = await asyncio.to_thread(get_batch, batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return await asyncio.to_thread(get_batch_progress, batch)
+
+@app.get("/batches/{batch_id}/download")
+async def download_batch(batch_id: str):
+    batch = await asyncio.to_thread(get_batch, batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    if batch["status"] != "complete":
+        raise HTTPException(status_code=409, detail=f"Batch is {batch['status']}, archive not available yet")
+
     return StreamingResponse(
-        docx_stream,
-        media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        headers={"Content-Disposition": "attachment; filename=AutoAuthor_Article.docx"}
+        iter_batch_zip(batch),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename=batch_{batch_id}.zip"}
     )
 
 # --- SSE Streaming Endpoint ---
 
-import concurrent.futures
+async def stream_generation(job: dict, resume_from: str = None):
+    # The job must already hold a place in the scheduler queue (see admit_job).
+    # The pipeline runs in a task owned by the job's event log, so closing the
+    # connection no longer stops it; subscribers attach with attach_stream.
+    job_id = job["id"]
 
-async def stream_generation(user_input: dict):
-    try:
-        def create_sse_payload(status: str, message: str, data: dict = None) -> dict:
-            payload_content = {"status": status, "message": message}
-            if data:
-                payload_content.update(data)
-            return {"data": json.dumps(payload_content), "event": "message"}
-
-        # Create dynamic output folder
-        topic = user_input["topic"] or "article"
-        sanitized_topic = sanitize_filename(topic)
-        timestamp = datetime.now().strftime("%d%B_%H%M")
-        output_dir = os.path.join(OUTPUT_BASE_DIR, f"{sanitized_topic}_{timestamp}")
-        os.makedirs(output_dir, exist_ok=True)
-
-        # Get the event loop and set up a thread pool
-        loop = asyncio.get_running_loop()
-        with concurrent.futures.ThreadPoolExecutor() as pool:
-            # Research Stage
-            yield create_sse_payload("research_started", "🔍 Gathering insights from the web...")
-            print("📡 ResearchAgent starting...")
-            research_summary = await loop.run_in_executor(
-                pool, run_research_agent, user_input, output_dir
-            )
-            research_summary = research_summary["result"]
-
-            # Writing Stage
-            yield create_sse_payload("writer_started", "✍️ Drafting the first cut of the article...")
-            print("✍️ WriterAgent starting...")
-            raw_article = await loop.run_in_executor(
-                pool, run_writer_agent, user_input, research_summary, output_dir
-            )
-            raw_article = raw_article["article"]
-
-            # SEO Stage
-            yield create_sse_payload("seo_started", "📈 Optimizing the article...")
-            print("📈 SEOAgent starting...")
-            optimized_article = await loop.run_in_executor(
-                pool, run_seo_agent, user_input, raw_article, output_dir
-            )
-            optimized_article = optimized_article["optimized_article"]
-
-            # Humanizing Stage
-            yield create_sse_payload("humanizer_started", "🧠 Adding the human touch...")
-            print("🧠 HumanizerAgent starting...")
-            global latest_article
-            final_article = await loop.run_in_executor(
-                pool, run_humanizer_agent, user_input, optimized_article, research_summary, output_dir
-            )
-            final_article = final_article["final_article"]
-            latest_article = final_article
-
-            # Output Stage
-            yield create_sse_payload("output_started", "📄 Preparing the final document...")
-            print("📄 Generating and saving .docx file...")
-            docx_stream = get_docx_stream(final_article)
-            docx_path = os.path.join(output_dir, "final.docx")
-            with open(docx_path, "wb") as f:
-                f.write(docx_stream.getvalue())
+    async def run_job(publish):
+        async def emit(status: str, message: str, data: dict = None):
+            await publish(create_sse_payload(status, message, data))
 
-            # Completion
-            yield create_sse_payload("complete", "✅ Article generated successfully!")
-            print("✅ Generation complete.")
+        async def on_queue_position(position: int):
+            await update_job_async(job_id, status="queued")
+            await emit("queued", f"⏳ Waiting for a free slot (position {position} in queue)...", {"position": position})
 
-        yield {"data": json.dumps({"status": "finished", "message": "Stream closed"}), "event": "close"}
+        try:
+            await emit("job_created", "🆔 Job registered", {"job_id": job_id})
 
-    except Exception as e:
-        error_message = f"An error occurred: {str(e)}"
-        print(f"❌ Error during generation: {error_message}")
-        yield {"data": json.dumps({"status": "error", "message": error_message}), "event": "error"}
+            async with job_slot(job_id, on_queue_position):
+                await update_job_async(job_id, status="running", error=None)
+                result = await run_pipeline(job, emit, resume_from=resume_from)
+            await update_job_async(job_id, status="complete", docx_path=result["docx_path"])
+
+            # Completion
+            await emit("complete", "✅ Article generated successfully!", {
+                "job_id": job_id, "timings": result["timings"], "prompt_budget": result["prompt_budget"],
+                "similarity": result["similarity"], "checks": result["checks"],
+            })
+            print("✅ Generation complete.")
 
-async def keep_alive():
-    while True:
-        yield {"data": json.dumps({"status": "ping", "message": "Connection alive"}), "event": "ping"}
-        await asyncio.sleep(15)
+            await publish({"data": json.dumps({"status": "finished", "message": "Stream closed"}), "event": "close"})
+
+        except Exception as e:
+            error_message = f"An error occurred: {str(e)}"
+            print(f"❌ Error during generation: {error_message}")
+            await update_job_async(job_id, status="failed", error=error_message)
+            await publish({"data": json.dumps({"status": "error", "message": error_message, "job_id": job_id}), "event": "error"})
+
+    await start_stream(job_id, run_job)
+    return subscribe(job_id)
+
+async def attach_stream(job_id: str, last_seq: int = 0, run: int = None):
+    # Reconnect to a job's event log; finished jobs whose log has expired get a summary instead
+    if await has_stream(job_id):
+        return subscribe(job_id, last_seq, run)
+    job = await lookup_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def summary():
+        if job["status"] == "complete":
+            yield create_sse_payload("complete", "✅ Article generated successfully!", {
+                "job_id": job_id, "timings": job.get("timings") or {}
+            })
+            yield {"data": json.dumps({"status": "finished", "message": "Stream closed"}), "event": "close"}
+        else:
+            message = job.get("error") or f"Job is {job['status']}; resume it with POST /jobs/{job_id}/resume"
+            yield {"data": json.dumps({"status": "error", "message": message, "job_id": job_id}), "event": "error"}
+
+    return summary()
 
 def parse_bool(value: str) -> bool:
     return value.lower() in ('true', '1', 't', 'yes', 'y')
 
 @app.get("/generate-stream")
 async def generate_content_stream(request: Request):
+    # A browser reconnect repeats this URL with Last-Event-ID: reattach instead of starting a second paid run
+    reconnect_job_id, run, last_seq = parse_event_id(request.headers.get("last-event-id"))
+    if reconnect_job_id:
+        return EventSourceResponse(await attach_stream(reconnect_job_id, last_seq, run))
+
     params = request.query_params
     user_input = {
         "topic": params.get("topic", ""),
@@ -211,11 +472,18 @@ async def generate_content_stream(request: Request):
         "reference_brands": params.get("reference_brands", ""),
         "call_to_action": params.get("call_to_action", "")
     }
-
-    async def combined_stream():
-        async for event in stream_generation(user_input):
-            yield event
-        async for ping in keep_alive():
-            yield ping
-
-    return EventSourceResponse(combined_stream())
+    # Optional: "sectioned" drafts long articles section by section (see WRITER_MODE)
+    if params.get("writer_mode"):
+        user_input["writer_mode"] = params["writer_mode"]
+    # Optional: start from the research of an earlier job (e.g. one offered in a similar_briefs event)
+    if params.get("reuse_research_from"):
+        user_input["reuse_research_from"] = params["reuse_research_from"]
+
+    # Reject quickly instead of piling more pipelines onto the providers
+    if is_full():
+        raise queue_full_error()
+    check_disk()
+    job = await create_job_async(user_input, create_output_dir(user_input))
+    await admit_job(job)
+
+    return EventSourceResponse(await stream_generation(job))
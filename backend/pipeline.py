@@ -0,0 +1,330 @@
+import asyncio
+import json
+import os
+import time
+
+from agents.research_agent import run_research_agent_async
+from agents.writer_agent import run_writer_agent_async
+from agents.seo_agent import run_seo_agent_async
+from agents.humanizer_agent import run_humanizer_agent_async
+from agents.output_agent import clear_rendered_formats, new_document, parse_document, save_document, write_docx_file
+from agents.similarity import index_article, index_brief, similar_articles, similar_briefs
+from agents.telemetry import job_calls, job_prompt_budget, job_truncations, record_stage, summarize_calls
+from checkpoints import (
+    STAGE_FILES,
+    load_manifest,
+    mark_run_status,
+    mark_stage_complete,
+    prepare_manifest,
+    read_stage_output,
+    record_checks,
+    record_similarity,
+    record_timings,
+    reusable_stages,
+)
+from jobs import get_job, update_job_async
+from retention import read_research, restore_intermediates
+
+# Render seo.md to a preview DOCX while the humanizer runs (a fallback document if it fails)
+SPECULATIVE_SEO_DOCX = os.getenv("SPECULATIVE_SEO_DOCX", "true").lower() in ("true", "1", "yes")
+
+# Briefs that read like an earlier one (MinHash similarity of their terms) are offered its research above
+# SIMILAR_BRIEF_THRESHOLD. "auto" mode also seeds the research prompt with the closest match at
+# RESEARCH_REUSE_THRESHOLD when it shares the RESEARCH_SEED_EXACT_FIELDS; "off" disables both.
+SIMILAR_RESEARCH_MODE = os.getenv("SIMILAR_RESEARCH_MODE", "offer").lower()
+RESEARCH_REUSE_THRESHOLD = float(os.getenv("RESEARCH_REUSE_THRESHOLD", "0.95"))
+# A brief differing only in one of these still scores high, but needs research of its own
+RESEARCH_SEED_EXACT_FIELDS = ("geographic_focus", "target_audience")
+SIMILAR_BRIEF_THRESHOLD = float(os.getenv("SIMILAR_BRIEF_THRESHOLD", "0.5"))
+# Final articles sharing this share of 5-word shingles with an earlier one are flagged as near-duplicates
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.3"))
+
+# (SSE message, console log line) per user-facing stage
+STAGE_MESSAGES = {
+    "research": ("🔍 Gathering insights from the web...", "📡 ResearchAgent starting..."),
+    "writer": ("✍️ Drafting the first cut of the article...", "✍️ WriterAgent starting..."),
+    "seo": ("📈 Optimizing the article...", "📈 SEOAgent starting..."),
+    "humanizer": ("🧠 Adding the human touch...", "🧠 HumanizerAgent starting..."),
+    "output": ("📄 Preparing the final document...", "📄 Generating and saving .docx file..."),
+}
+
+
+async def _noop_emit(status: str, message: str, data: dict = None):
+    return None
+
+
+async def run_dag(nodes: dict, run_node) -> dict:
+    # Start every node whose inputs are ready; independent nodes run concurrently
+    pending = dict(nodes)
+    done = {}
+    running = {}
+    try:
+        while pending or running:
+            for name in list(pending):
+                if all(dep in done for dep in pending[name]["inputs"]):
+                    running[asyncio.create_task(run_node(name))] = name
+                    del pending[name]
+            if not running:
+                raise RuntimeError(f"Pipeline nodes have unsatisfiable inputs: {sorted(pending)}")
+
+            finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                name = running.pop(task)
+                done[name] = task.result()
+    finally:
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+    return done
+
+
+def _same_field(a: dict, b: dict, field: str) -> bool:
+    return " ".join(str(a.get(field) or "").lower().split()) == " ".join(str(b.get(field) or "").lower().split())
+
+
+def find_research_seed(job: dict, similarity: dict) -> dict:
+    # An offer the editor accepted (reuse_research_from) replaces the research call; in auto mode the
+    # closest earlier brief above the threshold, for the same geography and audience, seeds the research prompt
+    user_input = job["user_input"]
+    source_id = user_input.get("reuse_research_from")
+    if source_id:
+        source = get_job(source_id)
+        research = read_research(source["output_dir"]) if source and source.get("output_dir") else None
+        if research is None:
+            raise ValueError(f"No research is available to reuse from job {source_id}")
+        return {"job_id": source_id, "label": source.get("topic") or "", "similarity": None, "research": research,
+                "mode": "reuse"}
+
+    if SIMILAR_RESEARCH_MODE == "off":
+        return None
+    matches = similar_briefs(user_input, limit=5, min_similarity=SIMILAR_BRIEF_THRESHOLD, exclude=job["id"])
+    if matches:
+        similarity["similar_briefs"] = matches
+    if SIMILAR_RESEARCH_MODE != "auto":
+        return None
+    for match in matches:
+        if match["similarity"] < RESEARCH_REUSE_THRESHOLD:
+            break
+        brief = (load_manifest(match["output_dir"]) or {}).get("user_input") or {}
+        if not all(_same_field(user_input, brief, field) for field in RESEARCH_SEED_EXACT_FIELDS):
+            continue
+        research = read_research(match["output_dir"])
+        if research is not None:
+            return {**match, "research": research, "mode": "seed"}
+    return None
+
+
+def check_near_duplicates(job: dict, output_dir: str, article: str, similarity: dict):
+    title = next((line.lstrip("# ").strip() for line in article.splitlines() if line.startswith("# ")), "")
+    matches = similar_articles(article, limit=5, min_similarity=NEAR_DUPLICATE_THRESHOLD, exclude=job["id"])
+    if matches:
+        similarity["near_duplicates"] = matches
+    index_article(job["id"], output_dir, article, title or job["user_input"].get("topic") or "")
+
+
+def summarize_prompt_budget(budget: dict) -> dict:
+    return {
+        "stages": budget,
+        "total_saved_tokens": sum(entry["saved_tokens"] for entry in budget.values()),
+    }
+
+
+async def record_job_totals(job_id: str, timings: dict, calls: list):
+    # Index the run's timings and token usage in the job store
+    await update_job_async(
+        job_id,
+        timings=timings,
+        prompt_tokens=sum(call.get("prompt_tokens") or 0 for call in calls),
+        completion_tokens=sum(call.get("completion_tokens") or 0 for call in calls),
+    )
+
+
+def write_timing_summary(output_dir: str, job_id: str, timings: dict, calls: list, budget: dict, status: str):
+    summary = {
+        "job_id": job_id,
+        "status": status,
+        "nodes": timings,
+        "stages": summarize_calls(calls),
+        "prompt_budget": summarize_prompt_budget(budget),
+        "calls": calls,
+    }
+    with open(os.path.join(output_dir, "timings.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+
+async def run_pipeline(job: dict, emit=None, resume_from: str = None, research_fn=None) -> dict:
+    # research_fn(user_input, output_dir) may supply research from elsewhere (e.g. shared within a batch)
+    emit = emit or _noop_emit
+    user_input = job["user_input"]
+    output_dir = job["output_dir"]
+
+    # Stage outputs of a compacted run are unpacked before deciding what can be reused
+    restore_intermediates(output_dir)
+    manifest = prepare_manifest(job)
+    reusable = reusable_stages(manifest, output_dir, resume_from)
+    outputs = {}
+    timings = {}
+    similarity = {}
+    checks = {}
+    pipeline_started = time.perf_counter()
+
+    def token_emitter(stage: str):
+        async def on_token(delta: str):
+            await emit("token", "", {"stage": stage, "delta": delta})
+        return on_token
+
+    async def research():
+        seed = await asyncio.to_thread(find_research_seed, job, similarity)
+        if similarity.get("similar_briefs"):
+            await emit("similar_briefs", "🔎 Found earlier briefs like this one", {"matches": similarity["similar_briefs"]})
+        if seed is not None and seed["mode"] == "seed":
+            similarity["research_seeded_from"] = {key: seed[key] for key in ("job_id", "label", "similarity")}
+            print(f"🌱 Seeding research with job {seed['job_id']} ({seed['label']})")
+            await emit("research_seeded", f"🌱 Starting research from a similar brief: {seed['label']}",
+                       similarity["research_seeded_from"])
+        if seed is not None and seed["mode"] == "reuse":
+            similarity["research_reused_from"] = {key: seed[key] for key in ("job_id", "label", "similarity")}
+            print(f"♻️ Reusing research from job {seed['job_id']} ({seed['label']})")
+            await emit("research_reused", f"♻️ Reusing research from a similar brief: {seed['label']}",
+                       similarity["research_reused_from"])
+            with open(os.path.join(output_dir, "research.txt"), "w", encoding="utf-8") as f:
+                f.write(seed["research"])
+            result = seed["research"]
+        elif research_fn is not None:
+            result = await research_fn(user_input, output_dir)
+        else:
+            research_seed = seed["research"] if seed is not None else None
+            result = (await run_research_agent_async(user_input, output_dir, seed=research_seed))["result"]
+        # Later paraphrases of this brief can start from this run's research, even once the source is evicted
+        await asyncio.to_thread(index_brief, job["id"], output_dir, user_input)
+        return result
+
+    async def report_checks(name: str, result: dict):
+        # Each LLM stage's output is normalized, measured and gated locally by its agent
+        # (see agents/postprocess.py and agents/quality.py)
+        checks[name] = result["checks"]
+        if result["checks"]["warnings"]:
+            print(f"⚠️ {name} checks: {'; '.join(result['checks']['warnings'])}")
+            await emit("text_checks", f"⚠️ {name} output: {'; '.join(result['checks']['warnings'])}",
+                       {"stage": name, **result["checks"]})
+
+    async def docx_template():
+        # Loading python-docx's default template is pure CPU; do it while research is in flight
+        return await asyncio.to_thread(new_document)
+
+    async def writer():
+        result = await run_writer_agent_async(
+            user_input, outputs["research"], output_dir, on_token=token_emitter("writer")
+        )
+        await report_checks("writer", result)
+        return result["article"]
+
+    async def seo():
+        result = await run_seo_agent_async(user_input, outputs["writer"], output_dir)
+        await report_checks("seo", result)
+        return result["optimized_article"]
+
+    async def seo_preview():
+        preview_path = os.path.join(output_dir, "seo_preview.docx")
+        return await asyncio.to_thread(write_docx_file, outputs["seo"], preview_path)
+
+    async def humanizer():
+        result = await run_humanizer_agent_async(
+            user_input, outputs["seo"], outputs["research"], output_dir, on_token=token_emitter("humanizer")
+        )
+        await report_checks("humanizer", result)
+        return result["final_article"]
+
+    def write_outputs() -> str:
+        # Parse once: DOCX is rendered now, other formats lazily from the saved document on first download
+        tokens = parse_document(outputs["humanizer"])
+        save_document(output_dir, tokens)
+        clear_rendered_formats(output_dir)
+        docx_path = os.path.join(output_dir, "final.docx")
+        return write_docx_file(outputs["humanizer"], docx_path, outputs["docx_template"], tokens)
+
+    async def output():
+        # The document is written once into the run folder and served from there
+        docx_path = await asyncio.to_thread(write_outputs)
+        await asyncio.to_thread(check_near_duplicates, job, output_dir, outputs["humanizer"], similarity)
+        if similarity.get("near_duplicates"):
+            closest = similarity["near_duplicates"][0]
+            print(f"⚠️ Article is a near-duplicate of job {closest['job_id']} ({closest['similarity']:.0%} overlap)")
+            await emit("near_duplicate", f"⚠️ This article overlaps an earlier one: {closest['label']}",
+                       {"matches": similarity["near_duplicates"]})
+        return docx_path
+
+    # Each node declares the nodes whose outputs it consumes
+    nodes = {
+        "research": {"inputs": [], "run": research},
+        "docx_template": {"inputs": [], "run": docx_template},
+        "writer": {"inputs": ["research"], "run": writer},
+        "seo": {"inputs": ["writer"], "run": seo},
+        "humanizer": {"inputs": ["seo", "research"], "run": humanizer},
+        "output": {"inputs": ["humanizer", "docx_template"], "run": output},
+    }
+    if SPECULATIVE_SEO_DOCX and "humanizer" not in reusable:
+        nodes["seo_preview"] = {"inputs": ["seo"], "run": seo_preview}
+
+    async def run_node(name: str):
+        started = time.perf_counter()
+        if name in reusable:
+            outputs[name] = read_stage_output(output_dir, name)
+            print(f"♻️ {name} restored from checkpoint")
+            await emit(f"{name}_restored", f"♻️ Reusing saved {name} output...")
+        else:
+            if name in STAGE_MESSAGES:
+                message, log_line = STAGE_MESSAGES[name]
+                await emit(f"{name}_started", message)
+                print(log_line)
+            outputs[name] = await nodes[name]["run"]()
+            if name in STAGE_FILES:
+                mark_stage_complete(output_dir, name)
+        elapsed = time.perf_counter() - started
+        timings[name] = {
+            "started_at": round(started - pipeline_started, 3),
+            "seconds": round(elapsed, 3),
+            "restored": name in reusable,
+        }
+        if name not in reusable:
+            record_stage(name, elapsed)
+
+    # Provider calls and prompt savings from this run's nodes are collected for the timing summary;
+    # continuation counts feed the agents' truncation gates
+    calls = []
+    budget = {}
+    calls_token = job_calls.set(calls)
+    budget_token = job_prompt_budget.set(budget)
+    truncations_token = job_truncations.set({})
+    try:
+        await run_dag(nodes, run_node)
+    except BaseException as e:
+        record_timings(output_dir, timings)
+        write_timing_summary(output_dir, job["id"], timings, calls, budget, "failed")
+        await record_job_totals(job["id"], timings, calls)
+        mark_run_status(output_dir, "failed", str(e))
+        raise
+    finally:
+        job_calls.reset(calls_token)
+        job_prompt_budget.reset(budget_token)
+        job_truncations.reset(truncations_token)
+
+    timings["total"] = {"seconds": round(time.perf_counter() - pipeline_started, 3)}
+    record_timings(output_dir, timings)
+    if similarity:
+        record_similarity(output_dir, similarity)
+    if checks:
+        record_checks(output_dir, checks)
+    write_timing_summary(output_dir, job["id"], timings, calls, budget, "complete")
+    await record_job_totals(job["id"], timings, calls)
+    mark_run_status(output_dir, "complete")
+    return {
+        "final_article": outputs["humanizer"],
+        "docx_path": outputs["output"],
+        "restored_stages": reusable,
+        "timings": timings,
+        "prompt_budget": summarize_prompt_budget(budget),
+        "similarity": similarity,
+        "checks": checks,
+    }
@@ -0,0 +1,321 @@
+import asyncio
+import gzip
+import hashlib
+import os
+import shutil
+import tarfile
+import time
+from datetime import datetime
+
+from agents.similarity import forget_run
+from checkpoints import MANIFEST_NAME, load_manifest, save_manifest
+from jobs import JOBS, JOB_DB_PATH, OUTPUT_BASE_DIR, active_output_dirs, mark_output_removed
+
+# Storage lifecycle for output/: compact finished runs, expire old ones, keep total size and free space in bounds
+RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", "600"))
+RETENTION_MAX_AGE_DAYS = float(os.getenv("RETENTION_MAX_AGE_DAYS", "30"))
+RETENTION_MAX_BYTES = int(os.getenv("RETENTION_MAX_BYTES", str(5 * 1024 ** 3)))
+RETENTION_MIN_FREE_BYTES = int(os.getenv("RETENTION_MIN_FREE_BYTES", str(1024 ** 3)))
+COMPACT_AFTER = float(os.getenv("RETENTION_COMPACT_AFTER", "3600"))
+# The newest runs are never evicted for size or space, so pressure from elsewhere cannot wipe all history
+MIN_KEEP_RUNS = int(os.getenv("RETENTION_MIN_KEEP_RUNS", "100"))
+
+BUNDLE_NAME = "intermediates.tar.gz"
+BUNDLED_FILES = ("writer.md", "seo.md", "humanizer.md")
+RESEARCH_FILE = "research.txt"
+RESEARCH_BLOB = "research.txt.gz"
+# Scratch files that are worthless once final.docx exists, and formats re-rendered from document.json.gz on demand
+DISPOSABLE_FILES = ("seo_preview.docx", "final.html", "final.pdf", "final_markdown.zip")
+
+# Content-addressed research blobs; run folders hold hard links, so st_nlink == 1 means unreferenced
+BLOB_DIR = os.path.join(OUTPUT_BASE_DIR, ".store", "research")
+
+_stats = {
+    "last_sweep_at": None,
+    "last_sweep_seconds": None,
+    "runs": 0,
+    "total_bytes": 0,
+    "blob_count": 0,
+    "blob_bytes": 0,
+    "free_bytes": None,
+    "compacted_runs": 0,
+    "deduplicated_research": 0,
+    "expired_runs": 0,
+    "evicted_runs": 0,
+    "errors": 0,
+}
+
+
+def _dir_bytes(path: str) -> int:
+    total = 0
+    for entry in os.scandir(path):
+        if entry.is_file(follow_symlinks=False):
+            stat = entry.stat(follow_symlinks=False)
+            # Hard-linked research blobs are counted once, in the blob store
+            if stat.st_nlink == 1:
+                total += stat.st_size
+        elif entry.is_dir(follow_symlinks=False):
+            total += _dir_bytes(entry.path)
+    return total
+
+
+def free_bytes() -> int:
+    return shutil.disk_usage(OUTPUT_BASE_DIR).free
+
+
+def disk_ok() -> bool:
+    # Admission check: refuse new runs rather than fail half-way through writing one
+    try:
+        return free_bytes() >= RETENTION_MIN_FREE_BYTES // 2
+    except OSError:
+        return True
+
+
+def _active_dirs() -> set:
+    # Jobs other workers are running are only visible through the shared job store
+    dirs = [job["output_dir"] for job in list(JOBS.values())] + active_output_dirs()
+    return {os.path.abspath(output_dir) for output_dir in dirs}
+
+
+def _run_time(run_dir: str, mtime: float) -> float:
+    # When the run last did work: its creation and stage completions in the manifest. The folder's
+    # mtime (and the manifest's updated_at) also move when a run is compacted, so they only serve
+    # as a fallback for folders without a manifest.
+    try:
+        manifest = load_manifest(run_dir) or {}
+    except (OSError, ValueError):
+        manifest = {}
+    stamps = [manifest.get("created_at")]
+    stamps += [stage.get("completed_at") for stage in (manifest.get("stages") or {}).values()]
+    times = []
+    for stamp in stamps:
+        try:
+            times.append(datetime.fromisoformat(stamp).timestamp())
+        except (TypeError, ValueError):
+            continue
+    return max(times) if times else mtime
+
+
+def _run_dirs() -> list:
+    # (path, last activity) of every run folder, oldest first
+    runs = []
+    for entry in os.scandir(OUTPUT_BASE_DIR):
+        if entry.name.startswith(".") or not entry.is_dir(follow_symlinks=False):
+            continue
+        runs.append((entry.path, _run_time(entry.path, entry.stat().st_mtime)))
+    runs.sort(key=lambda run: run[1])
+    return runs
+
+
+def _store_research_blob(run_dir: str):
+    source = os.path.join(run_dir, RESEARCH_FILE)
+    with open(source, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    os.makedirs(BLOB_DIR, exist_ok=True)
+    blob_path = os.path.join(BLOB_DIR, f"{digest}.txt.gz")
+    if os.path.exists(blob_path):
+        _stats["deduplicated_research"] += 1
+    else:
+        tmp_path = blob_path + ".tmp"
+        with gzip.open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, blob_path)
+
+    target = os.path.join(run_dir, RESEARCH_BLOB)
+    if os.path.exists(target):
+        os.remove(target)
+    try:
+        os.link(blob_path, target)
+    except OSError:
+        # Filesystems without hard links still get the compressed copy, just not the dedupe
+        shutil.copyfile(blob_path, target)
+    os.remove(source)
+    return digest
+
+
+def compact_run(run_dir: str) -> bool:
+    # Bundle the markdown intermediates into one gzip tarball and move research into the blob store
+    present = [name for name in BUNDLED_FILES if os.path.exists(os.path.join(run_dir, name))]
+    has_research = os.path.exists(os.path.join(run_dir, RESEARCH_FILE))
+    if not present and not has_research:
+        return False
+
+    if present:
+        bundle_path = os.path.join(run_dir, BUNDLE_NAME)
+        tmp_path = bundle_path + ".tmp"
+        with tarfile.open(tmp_path, "w:gz") as bundle:
+            if os.path.exists(bundle_path):
+                # Keep members from an earlier compaction that were not regenerated since
+                with tarfile.open(bundle_path, "r:gz") as previous:
+                    for member in previous.getmembers():
+                        if member.name not in present:
+                            bundle.addfile(member, previous.extractfile(member))
+            for name in present:
+                bundle.add(os.path.join(run_dir, name), arcname=name)
+        os.replace(tmp_path, bundle_path)
+        for name in present:
+            os.remove(os.path.join(run_dir, name))
+
+    digest = _store_research_blob(run_dir) if has_research else None
+    for name in DISPOSABLE_FILES:
+        path = os.path.join(run_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+    manifest = load_manifest(run_dir)
+    if manifest is not None:
+        manifest["compacted_at"] = datetime.now().isoformat()
+        if digest:
+            manifest["research_sha256"] = digest
+        save_manifest(run_dir, manifest)
+    return True
+
+
+def restore_intermediates(run_dir: str):
+    # Unpack compacted stage outputs that are missing on disk (files already present are left alone)
+    research_path = os.path.join(run_dir, RESEARCH_FILE)
+    blob_path = os.path.join(run_dir, RESEARCH_BLOB)
+    if not os.path.exists(research_path) and os.path.exists(blob_path):
+        with gzip.open(blob_path, "rb") as src, open(research_path, "wb") as dest:
+            shutil.copyfileobj(src, dest)
+
+    bundle_path = os.path.join(run_dir, BUNDLE_NAME)
+    if not os.path.exists(bundle_path):
+        return
+    missing = [name for name in BUNDLED_FILES if not os.path.exists(os.path.join(run_dir, name))]
+    if not missing:
+        return
+    with tarfile.open(bundle_path, "r:gz") as bundle:
+        for member in bundle.getmembers():
+            if member.name in missing and member.isfile():
+                with bundle.extractfile(member) as src, open(os.path.join(run_dir, member.name), "wb") as dest:
+                    shutil.copyfileobj(src, dest)
+
+
+def read_research(run_dir: str) -> str:
+    # A run's research, whether or not the run has been compacted; None once it is gone
+    research_path = os.path.join(run_dir, RESEARCH_FILE)
+    blob_path = os.path.join(run_dir, RESEARCH_BLOB)
+    try:
+        if os.path.exists(research_path):
+            with open(research_path, "r", encoding="utf-8") as f:
+                return f.read()
+        if os.path.exists(blob_path):
+            with gzip.open(blob_path, "rt", encoding="utf-8") as f:
+                return f.read()
+    except OSError:
+        pass
+    return None
+
+
+def _remove_run(run_dir: str, reason: str):
+    shutil.rmtree(run_dir, ignore_errors=True)
+    mark_output_removed(run_dir, reason)
+    forget_run(run_dir)
+
+
+def _collect_blobs() -> tuple:
+    # Drop research blobs no run folder links to any more
+    count = 0
+    total = 0
+    if not os.path.isdir(BLOB_DIR):
+        return count, total
+    for entry in os.scandir(BLOB_DIR):
+        stat = entry.stat(follow_symlinks=False)
+        if stat.st_nlink == 1 and not entry.name.endswith(".tmp"):
+            os.remove(entry.path)
+            continue
+        count += 1
+        total += stat.st_size
+    return count, total
+
+
+def sweep(emergency: bool = False) -> dict:
+    started = time.perf_counter()
+    now = time.time()
+    active = _active_dirs()
+    runs = []
+
+    for run_dir, last_active in _run_dirs():
+        if os.path.abspath(run_dir) in active:
+            runs.append((run_dir, last_active))
+            continue
+        try:
+            if RETENTION_MAX_AGE_DAYS and now - last_active > RETENTION_MAX_AGE_DAYS * 86400:
+                _remove_run(run_dir, "expired")
+                _stats["expired_runs"] += 1
+                continue
+            manifest_path = os.path.join(run_dir, MANIFEST_NAME)
+            settled = emergency or now - last_active > COMPACT_AFTER
+            if settled and os.path.exists(manifest_path):
+                manifest = load_manifest(run_dir) or {}
+                if manifest.get("status") == "complete" and compact_run(run_dir):
+                    _stats["compacted_runs"] += 1
+        except OSError as e:
+            _stats["errors"] += 1
+            print(f"⚠️ Retention could not process {run_dir}: {e}")
+        runs.append((run_dir, last_active))
+
+    sizes = {}
+    for run_dir, _ in runs:
+        try:
+            sizes[run_dir] = _dir_bytes(run_dir)
+        except OSError:
+            sizes[run_dir] = 0
+    blob_count, blob_bytes = _collect_blobs()
+    total = sum(sizes.values()) + blob_bytes
+    if os.path.exists(JOB_DB_PATH):
+        total += os.path.getsize(JOB_DB_PATH)
+
+    # Evict the oldest finished runs while over quota or short on free space
+    free = free_bytes()
+    for run_dir, _ in runs[:max(0, len(runs) - MIN_KEEP_RUNS)]:
+        over_quota = RETENTION_MAX_BYTES and total > RETENTION_MAX_BYTES
+        low_space = free < RETENTION_MIN_FREE_BYTES
+        if not over_quota and not low_space:
+            break
+        if os.path.abspath(run_dir) in active:
+            continue
+        _remove_run(run_dir, "evicted")
+        _stats["evicted_runs"] += 1
+        total -= sizes.pop(run_dir, 0)
+        free = free_bytes()
+    if _stats["evicted_runs"]:
+        blob_count, blob_bytes = _collect_blobs()
+
+    _stats.update(
+        last_sweep_at=datetime.now().isoformat(),
+        last_sweep_seconds=round(time.perf_counter() - started, 3),
+        runs=len(sizes),
+        total_bytes=total,
+        blob_count=blob_count,
+        blob_bytes=blob_bytes,
+        free_bytes=free,
+    )
+    return get_storage_stats()
+
+
+def get_storage_stats() -> dict:
+    return {
+        **_stats,
+        "max_age_days": RETENTION_MAX_AGE_DAYS,
+        "max_bytes": RETENTION_MAX_BYTES,
+        "min_free_bytes": RETENTION_MIN_FREE_BYTES,
+        "compact_after_seconds": COMPACT_AFTER,
+        "min_keep_runs": MIN_KEEP_RUNS,
+    }
+
+
+async def retention_loop():
+    # Runs for the life of the app; a failed sweep is logged and retried on the next tick
+    while True:
+        try:
+            emergency = free_bytes() < RETENTION_MIN_FREE_BYTES
+            if emergency:
+                print("⚠️ Low disk space, running an emergency retention sweep")
+            await asyncio.to_thread(sweep, emergency)
+        except Exception as e:
+            _stats["errors"] += 1
+            print(f"⚠️ Retention sweep failed: {e}")
+        await asyncio.sleep(RETENTION_INTERVAL)
@@ -0,0 +1,90 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+# Admission control: how many pipelines run at once and how many may wait
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "4"))
+MAX_QUEUE_SIZE = int(os.getenv("MAX_QUEUE_SIZE", "50"))
+QUEUE_RETRY_AFTER = int(os.getenv("QUEUE_RETRY_AFTER", "30"))
+
+_waiting = []
+_running = set()
+_condition = None
+
+
+class QueueFullError(Exception):
+    pass
+
+
+def _get_condition() -> asyncio.Condition:
+    global _condition
+    if _condition is None:
+        _condition = asyncio.Condition()
+    return _condition
+
+
+def is_full() -> bool:
+    return len(_waiting) >= MAX_QUEUE_SIZE
+
+
+def admit(job_id: str):
+    # Reserve a place in line without awaiting, so callers can reject before streaming
+    if is_full():
+        raise QueueFullError(f"Job queue is full ({MAX_QUEUE_SIZE} waiting)")
+    _waiting.append(job_id)
+
+
+def queue_position(job_id: str) -> int:
+    if job_id in _waiting:
+        return _waiting.index(job_id) + 1
+    return 0
+
+
+async def _acquire(job_id: str, on_position=None):
+    condition = _get_condition()
+    if job_id not in _waiting:
+        admit(job_id)
+    last_position = None
+    try:
+        async with condition:
+            while True:
+                position = queue_position(job_id)
+                if position == 1 and len(_running) < MAX_CONCURRENT_JOBS:
+                    _waiting.remove(job_id)
+                    _running.add(job_id)
+                    return
+                if on_position is not None and position != last_position:
+                    last_position = position
+                    await on_position(position)
+                await condition.wait()
+    except BaseException:
+        if job_id in _waiting:
+            _waiting.remove(job_id)
+            async with condition:
+                condition.notify_all()
+        raise
+
+
+async def _release(job_id: str):
+    condition = _get_condition()
+    async with condition:
+        _running.discard(job_id)
+        condition.notify_all()
+
+
+@asynccontextmanager
+async def job_slot(job_id: str, on_position=None):
+    await _acquire(job_id, on_position)
+    try:
+        yield
+    finally:
+        await _release(job_id)
+
+
+def get_queue_stats() -> dict:
+    return {
+        "running": len(_running),
+        "waiting": len(_waiting),
+        "max_concurrent_jobs": MAX_CONCURRENT_JOBS,
+        "max_queue_size": MAX_QUEUE_SIZE,
+    }
@@ -0,0 +1,125 @@
+import asyncio
+import json
+import os
+import time
+
+from agents.coordination import EVENT_BUFFER_SIZE, CoordinationError, get_coordinator
+
+# Per-job event logs, so a dropped SSE connection can reattach to the running pipeline.
+# The log lives in the coordination backend, so with a shared backend any worker can serve it.
+HEARTBEAT_INTERVAL = float(os.getenv("SSE_HEARTBEAT_INTERVAL", "15"))
+
+# Pipelines started by this worker, keyed by job ID
+_tasks = {}
+_last_run = 0
+_stats = {"streams_opened": 0, "reattached": 0, "replayed_events": 0, "gaps": 0, "subscribers": 0,
+          "publish_errors": 0, "stale_reattaches": 0}
+
+
+def event_id(job_id: str, run: int, seq: int) -> str:
+    # The run epoch keeps a resumed job's ids apart from the ones its earlier run handed out
+    return f"{job_id}:{run}:{seq}"
+
+
+def parse_event_id(value: str) -> tuple:
+    # "jobid:run:seq" -> (job_id, run, seq); an id without a run gets run None; anything else -> (None, None, 0)
+    parts = (value or "").split(":")
+    try:
+        if len(parts) == 3 and parts[0]:
+            return parts[0], int(parts[1]), int(parts[2])
+        if len(parts) == 2 and parts[0]:
+            return parts[0], None, int(parts[1])
+    except ValueError:
+        pass
+    return None, None, 0
+
+
+async def start_stream(job_id: str, run_fn):
+    # run_fn(emit) publishes through emit; the task is owned here, not by any one connection
+    coordinator = get_coordinator()
+    # Millisecond clock: bumped on every (re)start, and ordered across workers
+    global _last_run
+    run = _last_run = max(time.time_ns() // 1_000_000, _last_run + 1)
+    await coordinator.reset_events(job_id, run)
+    seq = 0
+
+    async def emit(payload: dict):
+        nonlocal seq
+        seq += 1
+        try:
+            await coordinator.append_event(job_id, seq, {**payload, "id": event_id(job_id, run, seq)})
+        except (OSError, asyncio.TimeoutError, CoordinationError) as e:
+            # Losing a progress event must not fail the (already paid for) pipeline
+            _stats["publish_errors"] += 1
+            print(f"⚠️ Could not publish event {seq} for job {job_id}: {e}")
+
+    async def runner():
+        try:
+            await run_fn(emit)
+        finally:
+            _tasks.pop(job_id, None)
+            try:
+                await coordinator.end_events(job_id, seq + 1)
+            except (OSError, asyncio.TimeoutError, CoordinationError) as e:
+                _stats["publish_errors"] += 1
+                print(f"⚠️ Could not close the event log for job {job_id}: {e}")
+
+    _tasks[job_id] = asyncio.create_task(runner())
+    _stats["streams_opened"] += 1
+
+
+async def has_stream(job_id: str) -> bool:
+    return await get_coordinator().has_events(job_id)
+
+
+def heartbeat() -> dict:
+    # No id, so the browser keeps the last real event id for its next reconnect
+    return {"data": json.dumps({"status": "ping", "message": "Connection alive"}), "event": "ping"}
+
+
+async def subscribe(job_id: str, last_seq: int = 0, run: int = None):
+    # Replay everything after last_seq, then follow the live log until the job finishes.
+    # A last_seq from an earlier run of the job (before a resume) says nothing about this run: replay it all.
+    coordinator = get_coordinator()
+    if last_seq and run != await coordinator.event_run(job_id):
+        _stats["stale_reattaches"] += 1
+        last_seq = 0
+    if last_seq:
+        _stats["reattached"] += 1
+    _stats["subscribers"] += 1
+    cursor = last_seq
+    try:
+        while True:
+            result = await coordinator.read_events(job_id, cursor, HEARTBEAT_INTERVAL)
+            if result is None:
+                return
+            events, done = result
+            if events and events[0][0] > cursor + 1:
+                # Older events were pushed out of the ring buffer; token previews will be partial
+                _stats["gaps"] += 1
+                yield {"data": json.dumps({
+                    "status": "resync",
+                    "message": "Some live preview events were dropped while disconnected",
+                    "missed": events[0][0] - cursor - 1,
+                }), "event": "message"}
+            if last_seq and events:
+                _stats["replayed_events"] += len(events)
+                last_seq = 0
+            for seq, payload in events:
+                cursor = seq
+                yield payload
+            if done:
+                return
+            if not events:
+                yield heartbeat()
+    finally:
+        _stats["subscribers"] -= 1
+
+
+def get_stream_stats() -> dict:
+    return {
+        **_stats,
+        "live_streams": len(_tasks),
+        "buffer_size": EVENT_BUFFER_SIZE,
+        "coordination": get_coordinator().stats(),
+    }
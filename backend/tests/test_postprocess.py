@@ -0,0 +1,16 @@
+from agents.postprocess import postprocess
+
+
+def test_glued_heading_is_repaired():
+    text, report = postprocess("#Title\n\n##First Section\n\nBody text here.")
+    assert text == "# Title\n\n## First Section\n\nBody text here."
+    assert report["h1"] == 1
+    assert report["h2"] == 1
+
+
+def test_hash_prose_is_not_a_heading():
+    article = "# Title\n\n#1 priority is trust.\n\n#hashtag campaigns still work\n\n#Remote teams need rituals."
+    text, report = postprocess(article)
+    assert text == article
+    assert report["h1"] == 1
+    assert report["h2"] == 0
@@ -0,0 +1,20 @@
+import asyncio
+
+from agents.postprocess import postprocess
+from agents.quality import enforce_gates, keyword_section
+
+
+def test_keyword_section_of_empty_answer():
+    assert keyword_section([]) is None
+    assert keyword_section(["Just an intro"]) == 0
+
+
+def test_keyword_gate_on_empty_answer():
+    async def revise(section, sections, missing_keywords):
+        raise AssertionError("nothing to revise")
+
+    content, checks = postprocess("", "remote teams")
+    content, checks = asyncio.run(enforce_gates("seo", content, checks, "remote teams", revise_fn=revise))
+    assert content == ""
+    assert checks["gates"]["failed"] == ["keywords"]
+    assert checks["gates"]["repairs"] == []
@@ -0,0 +1,125 @@
+import asyncio
+import time
+
+import pytest
+
+from agents import resilience
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, headers: dict = None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.headers = headers or {}
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    # A fresh breaker and bucket for one provider, and backoff sleeps that only record their delay
+    sleeps = []
+
+    async def fake_sleep(delay):
+        sleeps.append(delay)
+
+    monkeypatch.setitem(resilience._breakers, "deepseek", resilience.CircuitBreaker(2, 30))
+    monkeypatch.setitem(resilience._buckets, "deepseek", resilience.TokenBucket(1000, 1000))
+    monkeypatch.setattr(resilience.asyncio, "sleep", fake_sleep)
+    return sleeps
+
+
+def failing(*errors, result="ok"):
+    calls = []
+
+    async def attempt_fn():
+        calls.append(len(calls))
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+    return attempt_fn, calls
+
+
+def test_half_open_breaker_lets_one_probe_through():
+    breaker = resilience.CircuitBreaker(threshold=1, cooldown=30)
+    assert breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    breaker.opened_at = time.monotonic() - 31
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    breaker.end_probe()
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens_the_breaker():
+    breaker = resilience.CircuitBreaker(threshold=1, cooldown=30)
+    breaker.record_failure()
+    breaker.opened_at = time.monotonic() - 31
+    assert breaker.allow()
+
+    assert not breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_retry_after_accepts_seconds_and_http_dates():
+    assert resilience._retry_after({"Retry-After": "7"}) == 7.0
+    assert resilience._retry_after({"retry-after": "-3"}) == 0.0
+    assert 50 < resilience._retry_after({"Retry-After": time.strftime(
+        "%a, %d %b %Y %H:%M:%S GMT", time.gmtime(time.time() + 60))}) <= 60
+    assert resilience._retry_after({"Retry-After": "soon"}) is None
+    assert resilience._retry_after(None) is None
+
+
+def test_backoff_never_undercuts_retry_after_but_stays_capped(monkeypatch):
+    monkeypatch.setattr(resilience, "BACKOFF_MAX", 10.0)
+    for attempt in range(6):
+        assert 0 <= resilience.backoff_delay(attempt) <= min(10.0, resilience.BACKOFF_BASE * 2 ** attempt)
+    assert resilience.backoff_delay(0, retry_after=5) >= 5
+    assert resilience.backoff_delay(0, retry_after=500) == 10.0
+
+
+def test_classify_separates_transient_from_request_errors():
+    assert resilience._classify(HTTPError(429, {"Retry-After": "2"})) == (True, 2.0, False)
+    assert resilience._classify(HTTPError(503)) == (True, None, True)
+    assert resilience._classify(HTTPError(409)) == (False, None, False)
+    assert resilience._classify(HTTPError(400)) == (False, None, False)
+    assert resilience._classify(asyncio.TimeoutError()) == (True, None, True)
+    assert resilience._classify(ValueError("bad json")) == (False, None, False)
+
+
+def test_retryable_errors_are_retried_with_retry_after(provider):
+    attempt_fn, calls = failing(HTTPError(429, {"Retry-After": "4"}), HTTPError(502))
+    call_stats = {}
+
+    assert asyncio.run(resilience.call_with_retries("deepseek", attempt_fn, call_stats)) == "ok"
+    assert len(calls) == 3
+    assert call_stats["retries"] == 2
+    assert provider[0] >= 4
+    assert resilience._breakers["deepseek"].state == "closed"
+
+
+def test_request_errors_fail_without_retrying(provider):
+    attempt_fn, calls = failing(HTTPError(400))
+
+    with pytest.raises(HTTPError):
+        asyncio.run(resilience.call_with_retries("deepseek", attempt_fn))
+    assert len(calls) == 1
+    assert provider == []
+
+
+def test_open_breaker_fails_fast_without_calling(provider):
+    attempt_fn, calls = failing(*[HTTPError(500)] * 10)
+
+    # The second 500 opens the breaker, so the retry after it is rejected before calling
+    with pytest.raises(resilience.CircuitOpenError):
+        asyncio.run(resilience.call_with_retries("deepseek", attempt_fn))
+    assert len(calls) == 2
+    with pytest.raises(resilience.CircuitOpenError):
+        asyncio.run(resilience.call_with_retries("deepseek", attempt_fn))
+    assert len(calls) == 2
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from agents import router
+
+
+def fake_call(behaviour: dict, started: list):
+    # behaviour maps a target model to (delay before the first token, result or exception)
+    async def call_fn(target, on_first_token):
+        started.append(target["name"])
+        delay, result = behaviour[target["model"]]
+        await asyncio.sleep(delay)
+        if isinstance(result, Exception):
+            raise result
+        on_first_token()
+        return result
+    return call_fn
+
+
+def test_failed_target_falls_back_to_the_next():
+    router.register_route("test-fallback", "p:primary,p:backup")
+    started, outcome = [], {}
+    call_fn = fake_call({"primary": (0, RuntimeError("down")), "backup": (0, "from backup")}, started)
+
+    assert asyncio.run(router.call_routed("test-fallback", call_fn, outcome)) == "from backup"
+    assert started == ["p:primary", "p:backup"]
+    assert outcome["target"]["model"] == "backup"
+    assert router._stats["test-fallback"]["fallbacks"] == 1
+
+
+def test_slow_target_is_hedged_and_the_loser_cancelled():
+    router.register_route("test-hedge", "p:slow,p:fast", hedge_after=0.05)
+    started, outcome = [], {}
+    call_fn = fake_call({"slow": (5, "from slow"), "fast": (0, "from fast")}, started)
+
+    assert asyncio.run(router.call_routed("test-hedge", call_fn, outcome)) == "from fast"
+    assert started == ["p:slow", "p:fast"]
+    assert outcome["target"]["model"] == "fast"
+    stats = router._stats["test-hedge"]
+    assert stats["hedges"] == 1
+    assert stats["targets"]["p:slow"]["cancelled"] == 1
+
+
+def test_attempt_timeout_falls_through_and_last_error_is_raised():
+    router.register_route("test-exhausted", "p:hangs,p:broken", attempt_timeout=0.05)
+    call_fn = fake_call({"hangs": (5, "never"), "broken": (0, ValueError("bad answer"))}, [])
+
+    with pytest.raises(ValueError):
+        asyncio.run(router.call_routed("test-exhausted", call_fn))
+    stats = router._stats["test-exhausted"]
+    assert stats["targets"]["p:hangs"]["timeouts"] == 1
+    assert stats["exhausted"] == 1
+
+
+def test_targets_over_the_latency_slo_move_behind_the_rest(monkeypatch):
+    monkeypatch.setattr(router, "MIN_SAMPLES", 2)
+    router.register_route("test-slo", "p:laggy,p:quick", latency_slo=1.0)
+    for _ in range(2):
+        router._record_latency("test-slo", "p:laggy", 3.0, None)
+        router._record_latency("test-slo", "p:quick", 0.5, 0.1)
+
+    assert [target["name"] for target in router.ordered_targets("test-slo")] == ["p:quick", "p:laggy"]
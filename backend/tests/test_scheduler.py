@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+import scheduler
+
+
+@pytest.fixture(autouse=True)
+def fresh_queue(monkeypatch):
+    # Module state is per process; each test gets an empty queue and a condition on its own loop
+    monkeypatch.setattr(scheduler, "_waiting", [])
+    monkeypatch.setattr(scheduler, "_running", set())
+    monkeypatch.setattr(scheduler, "_condition", None)
+    monkeypatch.setattr(scheduler, "MAX_CONCURRENT_JOBS", 1)
+    monkeypatch.setattr(scheduler, "MAX_QUEUE_SIZE", 2)
+
+
+def test_admit_rejects_once_the_queue_is_full():
+    scheduler.admit("a")
+    scheduler.admit("b")
+    assert scheduler.is_full()
+    with pytest.raises(scheduler.QueueFullError):
+        scheduler.admit("c")
+    assert scheduler.queue_position("b") == 2
+    assert scheduler.queue_position("c") == 0
+
+
+def test_jobs_run_in_admission_order_within_the_concurrency_limit():
+    async def scenario():
+        order = []
+        positions = {}
+
+        async def job(job_id):
+            async def on_position(position):
+                positions.setdefault(job_id, []).append(position)
+            async with scheduler.job_slot(job_id, on_position):
+                order.append(job_id)
+                assert len(scheduler._running) == 1
+                await asyncio.sleep(0.01)
+
+        scheduler.admit("first")
+        scheduler.admit("second")
+        await asyncio.gather(job("second"), job("first"))
+        return order, positions
+
+    order, positions = asyncio.run(scenario())
+    assert order == ["first", "second"]
+    assert positions == {"second": [2]}
+    assert scheduler.get_queue_stats()["running"] == 0
+    assert scheduler.get_queue_stats()["waiting"] == 0
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        release = asyncio.Event()
+
+        async def holder():
+            async with scheduler.job_slot("holder"):
+                await release.wait()
+
+        running = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(scheduler._acquire("waiter"))
+        await asyncio.sleep(0)
+        assert scheduler.queue_position("waiter") == 1
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert scheduler.queue_position("waiter") == 0
+        release.set()
+        await running
+
+    asyncio.run(scenario())
+    assert scheduler.get_queue_stats()["running"] == 0
@@ -0,0 +1,90 @@
+import asyncio
+import json
+
+import streams
+from agents import coordination
+
+
+def run_job(count: int, prefix: str):
+    async def run_fn(emit):
+        for index in range(1, count + 1):
+            await emit({"data": f"{prefix}{index}"})
+    return run_fn
+
+
+async def collect(job_id: str, last_seq: int = 0, run: int = None) -> list:
+    return [event async for event in streams.subscribe(job_id, last_seq, run)]
+
+
+async def finish(job_id: str, run_fn):
+    await streams.start_stream(job_id, run_fn)
+    await streams._tasks[job_id]
+
+
+def test_reattach_with_id_from_before_a_resume_replays_the_new_run():
+    async def scenario():
+        await finish("resumed-job", run_job(5, "old"))
+        stale = (await collect("resumed-job"))[-1]["id"]
+        await finish("resumed-job", run_job(2, "new"))
+
+        job_id, run, last_seq = streams.parse_event_id(stale)
+        assert (job_id, last_seq) == ("resumed-job", 5)
+        events = await collect(job_id, last_seq, run)
+        assert [event["data"] for event in events] == ["new1", "new2"]
+
+        # An id from the current run still resumes after it
+        current = events[0]["id"]
+        job_id, run, last_seq = streams.parse_event_id(current)
+        assert [event["data"] for event in await collect(job_id, last_seq, run)] == ["new2"]
+
+    asyncio.run(scenario())
+
+
+def test_reattach_replays_after_the_last_seen_event():
+    async def scenario():
+        await finish("replay-job", run_job(4, "e"))
+        events = await collect("replay-job")
+        assert [event["data"] for event in events] == ["e1", "e2", "e3", "e4"]
+
+        job_id, run, last_seq = streams.parse_event_id(events[1]["id"])
+        assert [event["data"] for event in await collect(job_id, last_seq, run)] == ["e3", "e4"]
+
+    asyncio.run(scenario())
+
+
+def test_subscriber_follows_a_live_job_with_heartbeats(monkeypatch):
+    monkeypatch.setattr(streams, "HEARTBEAT_INTERVAL", 0.01)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def run_fn(emit):
+            await emit({"data": "before"})
+            await release.wait()
+            await emit({"data": "after"})
+
+        await streams.start_stream("live-job", run_fn)
+        reader = asyncio.create_task(collect("live-job"))
+        await asyncio.sleep(0.05)
+        release.set()
+        return await reader
+
+    events = asyncio.run(scenario())
+    assert [event["data"] for event in events if event.get("event") != "ping"] == ["before", "after"]
+    assert any(event.get("event") == "ping" for event in events)
+
+
+def test_events_pushed_out_of_the_buffer_are_reported_as_a_resync(monkeypatch):
+    monkeypatch.setattr(coordination, "EVENT_BUFFER_SIZE", 4)
+
+    async def scenario():
+        await finish("gap-job", run_job(10, "e"))
+        return await collect("gap-job")
+
+    events = asyncio.run(scenario())
+    resync = json.loads(events[0]["data"])
+    assert resync["status"] == "resync"
+    replayed = [event["data"] for event in events[1:]]
+    assert replayed[-1] == "e10"
+    assert resync["missed"] + len(replayed) == 10
+    assert replayed == [f"e{seq}" for seq in range(resync["missed"] + 1, 11)]